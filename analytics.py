@@ -0,0 +1,452 @@
+"""Circulation analytics on NumPy column arrays.
+
+Every loan is loaded once into int32 arrays (student, category, issue /
+due / return day as days since 1970-01-01, fine in cents) with
+``COPY ... TO STDOUT (FORMAT binary)``: every column is a non-NULL int4, so
+each row has the same byte layout and a chunk is decoded in one
+``np.frombuffer`` with a big-endian structured dtype, no per-row Python.
+Chunks are ANALYTICS_LOAD_CHUNK issue ids wide so the raw COPY buffer stays
+bounded. Department names (student.department) and category names are
+mapped to dense codes through small lookup arrays.
+
+The reports are whole-array operations (boolean masks, ``np.bincount``
+with weights, ``np.digitize``) over the selected date range:
+
+- ``issues_per_period``: issues per day or ISO week per category;
+- ``loan_durations``: mean / median / p90 days out, per category;
+- ``lateness_distribution``: days late at return, and open loans overdue;
+- ``department_usage``: loans, active students, duration, lateness and
+  fines per student.department.
+
+``circulation_analytics`` keeps the loaded arrays for ANALYTICS_MAX_AGE
+seconds and reloads in the background after that, serving the old arrays
+meanwhile. NumPy is optional; without it the reports are unavailable.
+
+CLI:
+    python analytics.py departments --from 2024-01-01 --to 2024-12-31
+    python analytics.py issues-per-period --period week
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import threading
+import time
+from datetime import date, datetime, timezone
+
+from loguru import logger
+
+from connection import db_connection
+from query import DEFAULT_LOAN_DAYS
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+ANALYTICS_MAX_AGE = float(os.getenv("ANALYTICS_MAX_AGE", "900"))
+ANALYTICS_LOAD_CHUNK = int(os.getenv("ANALYTICS_LOAD_CHUNK", "2000000"))
+ANALYTICS_TOP_CATEGORIES = 20
+
+EPOCH = date(1970, 1, 1)
+NOT_RETURNED = -1
+
+# days late at return: <= 0, 1-3, 4-7, 8-14, 15-30, 31+
+LATENESS_EDGES = (1, 4, 8, 15, 31)
+LATENESS_LABELS = ("on time", "1-3 days", "4-7 days", "8-14 days", "15-30 days", "31+ days")
+
+LOAN_COLUMNS = ("student_id", "category", "issue_day", "due_day", "return_day", "fine_cents")
+
+LOANS_SQL = """
+SELECT COALESCE(i.student_id, 0),
+       COALESCE(b.category, 0),
+       i.issue_date - DATE '1970-01-01',
+       COALESCE(i.due_date, i.issue_date + %(loan_days)s) - DATE '1970-01-01',
+       COALESCE(r.return_date - DATE '1970-01-01', -1),
+       COALESCE(ROUND(r.fine_amount * 100)::int, 0)
+FROM issues i
+JOIN book_copies bc ON bc.copy_id = i.copy_id
+JOIN books b ON b.book_id = bc.book_id
+LEFT JOIN returns r ON r.issue_id = i.issue_id
+WHERE i.issue_id BETWEEN %(first)s AND %(last)s
+  AND i.issue_date IS NOT NULL
+"""
+
+_COPY_SIGNATURE = b"PGCOPY\n\xff\r\n\x00"
+
+
+class CirculationData:
+    """One array entry per loan, plus the lookups that turn codes back into names."""
+
+    __slots__ = LOAN_COLUMNS + (
+        "category_names", "department_of_student", "department_names", "loaded_at", "load_seconds",
+    )
+
+    def __init__(self, columns, category_names, department_of_student, department_names, load_seconds=0.0):
+        for name in LOAN_COLUMNS:
+            setattr(self, name, columns[name])
+        self.category_names = category_names               # category_id -> name ("" when unknown)
+        self.department_of_student = department_of_student  # student_id -> department code, -1 = none
+        self.department_names = department_names
+        self.loaded_at = time.time()
+        self.load_seconds = load_seconds
+
+    def __len__(self):
+        return len(self.issue_day)
+
+
+# loading
+
+def _copy_int_columns(cur, sql, params, names):
+    """Run ``sql`` (only non-NULL int4 columns) through binary COPY and decode it into int32 arrays."""
+    buffer = io.BytesIO()
+    query = cur.mogrify(sql, params).decode()
+    cur.copy_expert(f"COPY ({query}) TO STDOUT (FORMAT binary)", buffer)
+    raw = buffer.getbuffer()
+    if bytes(raw[:11]) != _COPY_SIGNATURE:
+        raise ValueError("Unexpected COPY BINARY header.")
+    start = 19 + int.from_bytes(raw[15:19], "big")   # signature, flags, header extension length
+    # per row: int16 field count, then (int32 length, int32 value) per column; int16 -1 trailer
+    fields = [("field_count", ">i2")]
+    for name in names:
+        fields += [(f"{name}_length", ">i4"), (name, ">i4")]
+    dtype = np.dtype(fields)
+    count = (len(raw) - start - 2) // dtype.itemsize
+    end = start + count * dtype.itemsize
+    if len(raw) != end + 2 or int.from_bytes(raw[end:end + 2], "big", signed=True) != -1:
+        raise ValueError("COPY BINARY rows do not match the expected fixed-width layout.")
+    rows = np.frombuffer(raw, dtype=dtype, count=count, offset=start)
+    if (rows["field_count"] != len(names)).any():
+        raise ValueError("Unexpected field count in COPY BINARY row.")
+    for name in names:
+        if (rows[f"{name}_length"] != 4).any():
+            raise ValueError(f"Column {name} is NULL or not int4 in COPY BINARY output.")
+    columns = {name: rows[name].astype(np.int32) for name in names}
+    del rows, raw
+    return columns
+
+
+def _lookup(pairs, size_hint=0):
+    """(id -> code array, names) from (id, name) rows; ids without a row get -1."""
+    names = sorted({name for _, name in pairs})
+    codes = {name: i for i, name in enumerate(names)}
+    size = max([size_hint] + [row_id + 1 for row_id, _ in pairs])
+    table = np.full(size, -1, dtype=np.int32)
+    for row_id, name in pairs:
+        table[row_id] = codes[name]
+    return table, names
+
+
+def load_circulation(chunk=ANALYTICS_LOAD_CHUNK):
+    """Read every loan into a CirculationData."""
+    if np is None:
+        raise RuntimeError("numpy is not installed; circulation analytics are unavailable.")
+    started = time.perf_counter()
+    parts = []
+    with db_connection() as conn:
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT category_id, COALESCE(name, '') FROM categories;")
+                categories = cur.fetchall()
+                cur.execute("SELECT student_id, COALESCE(NULLIF(TRIM(department), ''), '(none)') FROM student;")
+                students = cur.fetchall()
+                cur.execute("SELECT COALESCE(MIN(issue_id), 0), COALESCE(MAX(issue_id), -1) FROM issues;")
+                first, last = cur.fetchone()
+                for low in range(first, last + 1, chunk):
+                    params = {"loan_days": DEFAULT_LOAN_DAYS, "first": low, "last": min(low + chunk - 1, last)}
+                    parts.append(_copy_int_columns(cur, LOANS_SQL, params, LOAN_COLUMNS))
+        finally:
+            conn.rollback()
+
+    columns = {
+        name: np.concatenate([part[name] for part in parts]) if parts else np.empty(0, dtype=np.int32)
+        for name in LOAN_COLUMNS
+    }
+    category_ids, category_names = zip(*categories) if categories else ((), ())
+    names = np.full(max(category_ids, default=0) + 1, "", dtype=object)
+    names[list(category_ids)] = category_names
+    max_student = int(columns["student_id"].max()) + 1 if len(columns["student_id"]) else 0
+    department_of_student, department_names = _lookup(students, max_student)
+    data = CirculationData(columns, names, department_of_student, department_names,
+                           round(time.perf_counter() - started, 3))
+    logger.info(f"Circulation analytics loaded {len(data)} loans in {data.load_seconds}s.")
+    return data
+
+
+# reports
+
+def _day_number(value):
+    return None if value is None else (value - EPOCH).days
+
+
+def _iso_days(days):
+    return np.datetime_as_string(np.asarray(days, dtype="int64").astype("datetime64[D]")).tolist()
+
+
+def _selected(data, date_from=None, date_to=None):
+    """Boolean mask of loans issued in [date_from, date_to]."""
+    if date_from and date_to and date_from > date_to:
+        raise ValueError("date_from must not be after date_to.")
+    mask = np.ones(len(data), dtype=bool)
+    if date_from:
+        mask &= data.issue_day >= _day_number(date_from)
+    if date_to:
+        mask &= data.issue_day <= _day_number(date_to)
+    return mask
+
+
+def _top_codes(codes, top):
+    """Dense index per entry for the ``top`` most frequent codes, the rest sharing index ``top``.
+
+    Returns (index array, kept codes, counts of kept codes, count of the rest).
+    """
+    counts = np.bincount(codes)
+    present = np.flatnonzero(counts)
+    kept = present[np.argsort(-counts[present], kind="stable")[:top]]
+    remap = np.full(len(counts), len(kept), dtype=np.int32)
+    remap[kept] = np.arange(len(kept), dtype=np.int32)
+    rest = int(len(codes) - counts[kept].sum())
+    return remap[codes], kept, counts[kept], rest
+
+
+def _category_labels(data, kept, rest):
+    labels = [data.category_names[c] if c < len(data.category_names) else "" for c in kept.tolist()]
+    return labels + (["(other)"] if rest else [])
+
+
+def issues_per_period(data, period="week", date_from=None, date_to=None, top=ANALYTICS_TOP_CATEGORIES):
+    """Issue counts per day or week (weeks start on Monday) for the ``top`` categories, the rest as "(other)"."""
+    if period not in ("day", "week"):
+        raise ValueError("period must be 'day' or 'week'.")
+    mask = _selected(data, date_from, date_to)
+    days = data.issue_day[mask]
+    if not len(days):
+        return {"period": period, "periods": [], "categories": [], "counts": [], "totals": []}
+    # 1970-01-01 was a Thursday: shifting by 3 puts each Monday at a multiple of 7
+    buckets = (days + 3) // 7 if period == "week" else days
+    first = int(buckets.min())
+    span = int(buckets.max()) - first + 1
+    index, kept, _, rest = _top_codes(data.category[mask], top)
+    width = len(kept) + (1 if rest else 0)
+    counts = np.bincount((buckets - first) * width + index, minlength=span * width).reshape(span, width)
+    starts = np.arange(first, first + span)
+    return {
+        "period": period,
+        "periods": _iso_days(starts * 7 - 3 if period == "week" else starts),
+        "categories": _category_labels(data, kept, rest),
+        "counts": counts.tolist(),
+        "totals": counts.sum(axis=1).tolist(),
+    }
+
+
+def loan_durations(data, date_from=None, date_to=None, top=ANALYTICS_TOP_CATEGORIES):
+    """Days from issue to return over returned loans, overall and for the ``top`` categories."""
+    mask = _selected(data, date_from, date_to)
+    returned = mask & (data.return_day != NOT_RETURNED)
+    durations = (data.return_day[returned] - data.issue_day[returned]).astype(np.float64)
+    result = {
+        "returned_loans": int(returned.sum()),
+        "open_loans": int(mask.sum() - returned.sum()),
+        "mean_days": None, "median_days": None, "p90_days": None, "by_category": [],
+    }
+    if not len(durations):
+        return result
+    median, p90 = np.percentile(durations, (50, 90))
+    result.update(mean_days=round(float(durations.mean()), 2), median_days=float(median), p90_days=float(p90))
+    index, kept, counts, rest = _top_codes(data.category[returned], top)
+    sums = np.bincount(index, weights=durations, minlength=len(kept) + 1)
+    loans = np.append(counts, rest)
+    result["by_category"] = [
+        {"category": label, "loans": int(n), "mean_days": round(float(total / n), 2)}
+        for label, n, total in zip(_category_labels(data, kept, rest), loans.tolist(), sums.tolist())
+        if n
+    ]
+    return result
+
+
+def _lateness_buckets(days_late, fines=None):
+    index = np.digitize(days_late, LATENESS_EDGES)
+    counts = np.bincount(index, minlength=len(LATENESS_LABELS))
+    total = int(counts.sum())
+    amounts = np.bincount(index, weights=fines, minlength=len(LATENESS_LABELS)) if fines is not None else None
+    rows = []
+    for i, label in enumerate(LATENESS_LABELS):
+        row = {"bucket": label, "loans": int(counts[i]), "share": round(float(counts[i] / total), 4) if total else None}
+        if amounts is not None:
+            row["fines"] = round(float(amounts[i]) / 100, 2)
+        rows.append(row)
+    return rows
+
+
+def lateness_distribution(data, date_from=None, date_to=None, as_of=None):
+    """Days late at return (with fines charged), and how late every open loan is on ``as_of``.
+
+    Open loans not yet past their due date fall in the "on time" bucket, so
+    each open bucket's share is a fraction of all open loans.
+    """
+    mask = _selected(data, date_from, date_to)
+    returned = mask & (data.return_day != NOT_RETURNED)
+    days_late = data.return_day[returned] - data.due_day[returned]
+    today = _day_number(as_of or date.today())
+    open_ = mask & (data.return_day == NOT_RETURNED)
+    overdue = today - data.due_day[open_]
+    return {
+        "as_of": (as_of or date.today()).isoformat(),
+        "returned_loans": int(returned.sum()),
+        "late_rate": round(float((days_late > 0).mean()), 4) if len(days_late) else None,
+        "mean_days_late": round(float(days_late[days_late > 0].mean()), 2) if (days_late > 0).any() else None,
+        "returned": _lateness_buckets(days_late, data.fine_cents[returned].astype(np.float64)),
+        "open_loans": int(open_.sum()),
+        "overdue_rate": round(float((overdue > 0).mean()), 4) if len(overdue) else None,
+        "open": _lateness_buckets(overdue),
+    }
+
+
+def department_usage(data, date_from=None, date_to=None):
+    """Loans, active students, mean loan length, late share and fines per student.department."""
+    mask = _selected(data, date_from, date_to)
+    students = data.student_id[mask]
+    width = len(data.department_names) + 1      # last slot: students without a department row
+    lookup = np.append(data.department_of_student, -1)    # ids past the lookup read the -1 at the end
+    lookup[lookup < 0] = width - 1
+
+    def department(student_ids):
+        return lookup[np.minimum(student_ids, len(lookup) - 1)]
+
+    codes = department(students)
+
+    returned = data.return_day[mask] != NOT_RETURNED
+    durations = np.where(returned, data.return_day[mask] - data.issue_day[mask], 0)
+    late = returned & (data.return_day[mask] > data.due_day[mask])
+
+    loans = np.bincount(codes, minlength=width)
+    returns = np.bincount(codes, weights=returned.astype(np.float64), minlength=width)
+    days = np.bincount(codes, weights=durations.astype(np.float64), minlength=width)
+    lates = np.bincount(codes, weights=late.astype(np.float64), minlength=width)
+    fines = np.bincount(codes, weights=data.fine_cents[mask].astype(np.float64), minlength=width)
+    # a student has one department, so count each student who borrowed once
+    borrowed = np.zeros(int(students.max()) + 1 if len(students) else 0, dtype=bool)
+    borrowed[students] = True
+    active = np.bincount(department(np.flatnonzero(borrowed)), minlength=width)
+
+    labels = list(data.department_names) + ["(unknown student)"]
+    rows = [
+        {
+            "department": labels[i],
+            "loans": int(loans[i]),
+            "active_students": int(active[i]),
+            "loans_per_student": round(float(loans[i] / active[i]), 2),
+            "mean_loan_days": round(float(days[i] / returns[i]), 2) if returns[i] else None,
+            "late_return_rate": round(float(lates[i] / returns[i]), 4) if returns[i] else None,
+            "fines": round(float(fines[i]) / 100, 2),
+        }
+        for i in np.flatnonzero(loans).tolist()
+    ]
+    rows.sort(key=lambda row: row["loans"], reverse=True)
+    return rows
+
+
+REPORTS = {
+    "issues-per-period": issues_per_period,
+    "loan-durations": loan_durations,
+    "lateness": lateness_distribution,
+    "departments": department_usage,
+}
+
+
+class CirculationAnalytics:
+    """Keeps the loaded arrays for ``max_age`` seconds; a stale copy is served while a reload runs."""
+
+    def __init__(self, max_age=ANALYTICS_MAX_AGE, loader=load_circulation):
+        self.max_age = max_age
+        self._loader = loader
+        self._lock = threading.Lock()
+        self._data = None
+        self._reloading = False
+        self.last_error = None
+
+    def _reload(self):
+        try:
+            data = self._loader()
+            with self._lock:
+                self._data = data
+            self.last_error = None
+        except Exception as e:
+            self.last_error = str(e)
+            logger.error(f"Circulation analytics reload failed: {e}")
+        finally:
+            self._reloading = False
+
+    def data(self):
+        with self._lock:
+            data = self._data
+            stale = data is not None and time.time() - data.loaded_at > self.max_age
+            if stale and not self._reloading:
+                self._reloading = True
+                threading.Thread(target=self._reload, name="analytics-reload", daemon=True).start()
+            if data is not None:
+                return data
+            # first request waits for the load (holding the lock so it happens once)
+            self._data = self._loader()
+            return self._data
+
+    def run(self, report, **params):
+        """Run a REPORTS function on the current arrays, wrapped in the usual status dict."""
+        if np is None:
+            return {"status": "error", "reason": "unavailable",
+                    "message": "numpy is not installed; circulation analytics are unavailable."}
+        try:
+            data = self.data()
+            started = time.perf_counter()
+            result = report(data, **params)
+            return {
+                "status": "success",
+                "data": result,
+                "loans": len(data),
+                "loaded_at": datetime.fromtimestamp(data.loaded_at, timezone.utc).isoformat(),
+                "compute_ms": round((time.perf_counter() - started) * 1000, 3),
+            }
+        except ValueError as e:
+            return {"status": "error", "reason": "invalid", "message": str(e)}
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+
+    def status(self):
+        data = self._data   # no lock: the first load holds it for its whole duration
+        return {
+            "available": np is not None,
+            "loans": len(data) if data is not None else None,
+            "loaded_at": datetime.fromtimestamp(data.loaded_at, timezone.utc).isoformat() if data is not None else None,
+            "load_seconds": data.load_seconds if data is not None else None,
+            "max_age": self.max_age,
+            "reloading": self._reloading,
+            "last_error": self.last_error,
+        }
+
+
+circulation_analytics = CirculationAnalytics()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("report", choices=sorted(REPORTS))
+    parser.add_argument("--from", dest="date_from", type=date.fromisoformat, help="first issue day (inclusive)")
+    parser.add_argument("--to", dest="date_to", type=date.fromisoformat, help="last issue day (inclusive)")
+    parser.add_argument("--period", choices=("day", "week"), default="week", help="issues-per-period only")
+    args = parser.parse_args()
+
+    params = {"date_from": args.date_from, "date_to": args.date_to}
+    if args.report == "issues-per-period":
+        params["period"] = args.period
+    with contextlib.redirect_stdout(sys.stderr):
+        result = circulation_analytics.run(REPORTS[args.report], **params)
+    json.dump(result, sys.stdout, indent=2, default=str)
+    sys.stdout.write("\n")
+    sys.exit(0 if result["status"] == "success" else 1)
+
+
+if __name__ == "__main__":
+    main()
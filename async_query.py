@@ -0,0 +1,637 @@
+from connection import get_async_pool, init_async_connection_pool, close_async_connection_pool
+from refresh_scheduler import view_refresher
+from name_cache import author_cache, category_cache, clear_name_caches, evict_book_names, name_cache_stats
+from query import DEFAULT_FINE_PER_DAY, DEFAULT_LOAN_DAYS, OPEN_LOANS_SQL, POPULARITY_RETENTION_DAYS, STUDENT_HISTORY_SQL
+from export import EXPORT_BATCH_SIZE
+from search import SEARCH_MAX_OFFSET, search_terms, to_prefix_tsquery
+from metrics import instrument_methods
+from batch import batch_arrays, batch_summary, item_results, sub_batches, validate_batch
+from pagination import (
+    BOOKS_KEYSET, FINES_KEYSET, HISTORY_KEYSET, ISSUES_KEYSET, OVERDUE_KEYSET, RETURNS_KEYSET, build_page,
+    clamp_page_size, decode_cursor,
+)
+import asyncpg
+import decimal
+import json
+from datetime import date, timedelta
+
+
+@instrument_methods("async")
+class AsyncLibraryDatabaseManager:
+    """asyncio counterpart of query.LibraryDatabaseManager backed by an asyncpg pool.
+
+    Method names, arguments and return payloads mirror the sync manager so the
+    FastAPI handlers can simply ``await`` them; while one request waits on
+    Postgres the event loop keeps serving the others. Schema setup (tables,
+    triggers, procedures) and offline jobs such as bulk imports stay on the
+    sync manager.
+    """
+
+    async def init(self):
+        await init_async_connection_pool()
+        print("Async connection pool initialized.")
+
+    async def close(self):
+        await close_async_connection_pool()
+
+
+    # PART 1: MATERIALIZED VIEWS
+
+    async def refresh_materialized_view(self, view_name: str, concurrently=True):
+        sql = f"REFRESH MATERIALIZED VIEW {'CONCURRENTLY ' if concurrently else ''}{view_name};"
+        try:
+            async with get_async_pool().acquire() as conn:
+                await conn.execute(sql)
+            return {"status": "success", "message": f"{view_name} refreshed successfully"}
+        except Exception as e:
+            print(f"Error refreshing materialized view {view_name}: {e}")
+            return {"status": "error", "message": str(e)}
+
+    async def _fetch_view(self, sql, *args, view_name=None):
+        # mv_* views are served as-is; view_refresher keeps them fresh in the background
+        try:
+            async with get_async_pool().acquire() as conn:
+                rows = await conn.fetch(sql, *args)
+            result = {"status": "success", "data": [dict(row) for row in rows]}
+            if view_name:
+                result["freshness"] = view_refresher.freshness(view_name)
+            return result
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+
+    async def get_materialized_view_popular_books(self):
+        return await self._fetch_view("SELECT * FROM mv_popular_books ORDER BY total_issues DESC;", view_name='mv_popular_books')
+
+    async def get_popular_books(self, limit=10, window_days=None):
+        """Top-N books by issue count from the popularity counters (folded in by counter_deltas)."""
+        if window_days is None:
+            sql = """
+            SELECT p.book_id, b.title, p.total_issues, p.last_issued
+            FROM book_popularity p
+            JOIN books b ON b.book_id = p.book_id
+            ORDER BY p.total_issues DESC
+            LIMIT $1;
+            """
+            args = (limit,)
+        elif 0 < window_days <= POPULARITY_RETENTION_DAYS:
+            sql = """
+            SELECT d.book_id, b.title, SUM(d.issues) AS total_issues, MAX(d.issue_day) AS last_issued
+            FROM book_popularity_daily d
+            JOIN books b ON b.book_id = d.book_id
+            WHERE d.issue_day > CURRENT_DATE - $1::int
+            GROUP BY d.book_id, b.title
+            ORDER BY total_issues DESC
+            LIMIT $2;
+            """
+            args = (window_days, limit)
+        else:
+            return {"status": "error", "message": f"window_days must be between 1 and {POPULARITY_RETENTION_DAYS}"}
+
+        result = await self._fetch_view(sql, *args)
+        if result["status"] == "success":
+            result["window_days"] = window_days
+        return result
+
+    async def get_materialized_view_overdue_transactions(self):
+        return await self._fetch_view("SELECT * FROM mv_overdue_transactions WHERE status = 'Overdue';", view_name='mv_overdue_transactions')
+
+    async def _open_loans_page(self, condition, day, limit, cursor, as_of):
+        page = await self._keyset_page(
+            OVERDUE_KEYSET, OPEN_LOANS_SQL, limit, cursor, ["i.returned = 'no'", condition], [day],
+        )
+        if page["status"] == "success":
+            for row in page["data"]:
+                row["days_overdue"] = max(0, (as_of - row["due_date"]).days)
+            page["as_of"] = as_of.isoformat()
+        return page
+
+    async def get_overdue_loans(self, as_of=None, limit=None, cursor=None):
+        """Open loans past their due date on ``as_of`` (default today), most overdue first."""
+        as_of = as_of or date.today()
+        return await self._open_loans_page("i.due_date < $1", as_of, limit, cursor, as_of)
+
+    async def get_loans_becoming_overdue(self, day=None, limit=None, cursor=None):
+        """Open loans that turn overdue on ``day`` (default tomorrow), i.e. are due the day before."""
+        day = day or date.today() + timedelta(days=1)
+        return await self._open_loans_page("i.due_date = $1", day - timedelta(days=1), limit, cursor, day)
+
+    async def get_loan_policies(self):
+        result = await self._fetch_view("""
+            SELECT c.category_id, c.name AS category_name, lp.loan_days, lp.fine_per_day, lp.max_fine
+            FROM loan_policies lp
+            JOIN categories c ON c.category_id = lp.category_id
+            ORDER BY c.name;
+        """)
+        if result["status"] == "success":
+            result["default_loan_days"] = DEFAULT_LOAN_DAYS
+            result["default_fine_per_day"] = DEFAULT_FINE_PER_DAY
+        return result
+
+    async def set_loan_policy(self, category_id, loan_days=None, fine_per_day=None, max_fine=None):
+        """Set a category's loan period and fine rules; ``None`` falls back to the defaults. Applies to new loans."""
+        try:
+            if loan_days is None and fine_per_day is None and max_fine is None:
+                await self._call("DELETE FROM loan_policies WHERE category_id = $1;", category_id)
+            else:
+                await self._call("""
+                    INSERT INTO loan_policies (category_id, loan_days, fine_per_day, max_fine) VALUES ($1, $2, $3, $4)
+                    ON CONFLICT (category_id) DO UPDATE
+                    SET loan_days = EXCLUDED.loan_days, fine_per_day = EXCLUDED.fine_per_day, max_fine = EXCLUDED.max_fine;
+                """, category_id, loan_days,
+                    None if fine_per_day is None else decimal.Decimal(str(fine_per_day)),
+                    None if max_fine is None else decimal.Decimal(str(max_fine)))
+            days = DEFAULT_LOAN_DAYS if loan_days is None else loan_days
+            return {"status": "success", "message": f"Category {category_id} loan period is {days} days"}
+        except asyncpg.exceptions.ForeignKeyViolationError:
+            return {"status": "error", "reason": "not_found", "message": f"No category with ID {category_id}"}
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+
+    # fines are accrued by the nightly job through the sync manager (fines.py); these only read
+
+    async def get_fine_balances(self, limit=None, cursor=None):
+        """Students with a non-zero balance, largest first, from the pre-aggregated balances."""
+        sql = """
+        SELECT f.student_id, s.name AS student_name, f.charged, f.accruing, f.balance, f.accrued_through
+        FROM student_fine_balances f
+        JOIN student s ON s.student_id = f.student_id
+        """
+        return await self._keyset_page(FINES_KEYSET, sql, limit, cursor, ["f.balance > 0"])
+
+    async def get_student_fine_balance(self, student_id):
+        try:
+            async with get_async_pool().acquire() as conn:
+                row = await conn.fetchrow("""
+                    SELECT f.student_id, f.charged, f.accruing, f.balance, f.accrued_through,
+                           COALESCE(json_agg(json_build_object('issue_id', a.issue_id, 'amount', a.amount))
+                                    FILTER (WHERE a.issue_id IS NOT NULL), '[]') AS accruing_loans
+                    FROM student_fine_balances f
+                    LEFT JOIN fine_accruals a ON a.student_id = f.student_id
+                    WHERE f.student_id = $1
+                    GROUP BY f.student_id;
+                """, student_id)
+            if row is None:
+                data = {"student_id": student_id, "charged": 0, "accruing": 0, "balance": 0,
+                        "accrued_through": None, "accruing_loans": []}
+            else:
+                data = dict(row)
+                data["accruing_loans"] = json.loads(data["accruing_loans"])
+            return {"status": "success", "data": data}
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+
+    async def get_all_books_from_materialized_view(self):
+        return await self._fetch_view("SELECT * FROM mv_all_books_summary;", view_name='mv_all_books_summary')
+
+    async def get_user_borrowing_history(self, user_id):
+        return await self._fetch_view(
+            "SELECT * FROM mv_user_borrowing_history WHERE student_id = $1;", user_id,
+            view_name='mv_user_borrowing_history',
+        )
+
+    async def get_issued_report(self):
+        # Decimal / date stay as fetched; serialization.dumps encodes them
+        return await self._fetch_view("SELECT * FROM mv_issued_report", view_name='mv_issued_report')
+
+
+    # PART 2: BOOK INSERT / DELETE
+
+    async def _resolve_name_id(self, conn, cache, name, select_sql, insert_sql, pending):
+        # cached ids are only ever ones that were committed; new ids wait in `pending`
+        cached = cache.get(name)
+        if cached is not None:
+            return cached
+        value = await conn.fetchval(select_sql, name)
+        if value is None:
+            value = await conn.fetchval(insert_sql, name)
+        pending.append((cache, name, value))
+        return value
+
+    async def insert_book(self, title, author_name, category_name, isbn, total_copies, shelf_location):
+        for attempt in range(2):
+            pending = []
+            try:
+                async with get_async_pool().acquire() as conn:
+                    async with conn.transaction():
+                        # resolve author
+                        author_id = await self._resolve_name_id(
+                            conn, author_cache, author_name,
+                            "SELECT author_id FROM author WHERE LOWER(name)=LOWER($1)",
+                            "INSERT INTO author (name, bio) VALUES ($1, 'Bio not provided') RETURNING author_id;",
+                            pending,
+                        )
+
+                        # resolve category
+                        category_id = await self._resolve_name_id(
+                            conn, category_cache, category_name,
+                            "SELECT category_id FROM categories WHERE LOWER(name)=LOWER($1)",
+                            "INSERT INTO categories (name) VALUES ($1) RETURNING category_id;",
+                            pending,
+                        )
+
+                        # insert book
+                        book_id = await conn.fetchval("""
+                            INSERT INTO books (title, author, category, isbn, total_copies)
+                            VALUES ($1, $2, $3, $4, $5)
+                            RETURNING book_id
+                        """, title, author_id, category_id, isbn, int(total_copies))
+
+                        # insert copies and capture their ids
+                        rows = await conn.fetch("""
+                            INSERT INTO book_copies (book_id, status, shelf_location)
+                            SELECT $1, 'available', $2 FROM generate_series(1, $3)
+                            RETURNING copy_id
+                        """, book_id, shelf_location, int(total_copies))
+                        inserted_copy_ids = [row["copy_id"] for row in rows]
+
+                for cache, name, value in pending:
+                    cache.put(name, value)
+                view_refresher.mark_dirty("books")
+                return {
+                    "status": "success",
+                    "message": f"Book '{title}' inserted successfully with Book ID: {book_id} and Copy ID: {inserted_copy_ids[0]}.",
+                    "book_id": book_id,
+                    "copy_ids": inserted_copy_ids
+                }
+            except asyncpg.exceptions.ForeignKeyViolationError as e:
+                # a cached author/category was deleted elsewhere; drop the caches and retry once
+                clear_name_caches()
+                if attempt:
+                    return {"status": "error", "message": str(e)}
+            except Exception as e:
+                return {"status": "error", "message": str(e)}
+
+    async def delete_book(self, book_id):
+        try:
+            async with get_async_pool().acquire() as conn:
+                async with conn.transaction():
+                    # Check if book exists by ID
+                    found = await conn.fetchrow("SELECT book_id, author, category FROM books WHERE book_id = $1;", book_id)
+                    if not found:
+                        return {"status": "error", "message": f"No book found with ID {book_id}."}
+
+                    await conn.execute("DELETE FROM books WHERE book_id = $1;", book_id)
+
+            # handle_book_delete may have dropped the now-orphaned author/category
+            evict_book_names(found["author"], found["category"])
+            view_refresher.mark_dirty("books")
+            return {"status": "success", "message": f"Book with ID {book_id} deleted successfully."}
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+
+
+    async def get_name_cache_stats(self):
+        return {"status": "success", "data": name_cache_stats()}
+
+
+    # PART 3: STORED PROCEDURES
+
+    async def _call(self, sql, *args):
+        async with get_async_pool().acquire() as conn:
+            await conn.execute(sql, *args)
+
+    async def stored_procedure_insert_book(self, title, author, category, isbn, total_copies):
+        try:
+            await self._call("CALL insert_book($1, $2, $3, $4, $5);", title, author, category, isbn, total_copies)
+            view_refresher.mark_dirty("books")
+            return {"status": "success", "message": f"Book '{title}' inserted successfully!"}
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+
+    async def stored_procedure_delete_book(self, book_id):
+        try:
+            async with get_async_pool().acquire() as conn:
+                names = await conn.fetchrow("SELECT author, category FROM books WHERE book_id = $1;", book_id)
+                await conn.execute("CALL delete_book($1);", book_id)
+            if names:
+                evict_book_names(names["author"], names["category"])
+            view_refresher.mark_dirty("books")
+            return {"status": "success", "message": f"Book with ID {book_id} deleted successfully!"}
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+
+    async def stored_procedure_issue_book(self, student_id, copy_id, issue_date):
+        try:
+            await self._call("CALL issue_book($1::int, $2::int, $3::date);", student_id, copy_id, issue_date)
+            view_refresher.mark_dirty("issues")
+            return {"status": "success", "message": f"Book issued successfully to student ID {student_id}!"}
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+
+    async def stored_procedure_return_book(self, issue_id, return_date, fine=None):
+        try:
+            fine = None if fine is None else decimal.Decimal(str(fine))
+            await self._call("CALL return_book($1, $2, $3);", issue_id, return_date, fine)
+            view_refresher.mark_dirty("returns")
+            return {"status": "success", "message": f"Book returned successfully for issue ID {issue_id}!"}
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+
+    async def issue_book(self, book_id, student_id):
+        try:
+            await self._call("CALL issue_book($1::int, $2::int);", book_id, student_id)
+            view_refresher.mark_dirty("issues")
+            return {"status": "success", "message": f"Book {book_id} issued successfully to student {student_id}."}
+        except Exception as e:
+            print(f"Error issuing book: {e}")
+            return {"status": "error", "message": str(e)}
+
+    async def allocate_issue(self, book_id, student_id, issue_date=None):
+        try:
+            async with get_async_pool().acquire() as conn:
+                row = await conn.fetchrow(
+                    "SELECT issue_id, copy_id FROM allocate_copy($1, $2, $3);", book_id, student_id, issue_date
+                )
+            view_refresher.mark_dirty("issues")
+            return {
+                "status": "success",
+                "data": {"issue_id": row["issue_id"], "copy_id": row["copy_id"], "book_id": book_id, "student_id": student_id},
+            }
+        except asyncpg.exceptions.NoDataFoundError as e:
+            return {"status": "error", "reason": "unavailable", "message": str(e)}
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+
+    async def insert_return_and_update_book(self, copy_id, student_id):
+        try:
+            await self._call("CALL insert_return_and_update_book($1, $2);", copy_id, student_id)
+            view_refresher.mark_dirty("returns")
+            return {"status": "success", "message": f"Book copy {copy_id} returned successfully by student {student_id}."}
+        except Exception as e:
+            print(f"Error returning book: {e}")
+            return {"status": "error", "message": str(e)}
+
+
+    async def _run_batch(self, sql, items, extra_params, atomic):
+        try:
+            validate_batch(items)
+        except ValueError as e:
+            return {"status": "error", "reason": "invalid", "message": str(e), "data": batch_summary([], 0, atomic)}
+        results = []
+        transactions = 0
+        try:
+            async with get_async_pool().acquire() as conn:
+                for offset, chunk in sub_batches(items, atomic):
+                    tx = conn.transaction()
+                    await tx.start()
+                    try:
+                        rows = await conn.fetch(sql, *batch_arrays(chunk), *extra_params)
+                    except Exception:
+                        await tx.rollback()
+                        raise
+                    results.extend(item_results(rows, offset))
+                    if atomic and any(r["status"] != "ok" for r in results):
+                        await tx.rollback()
+                        return {"status": "success", "data": batch_summary(results, transactions, atomic)}
+                    await tx.commit()
+                    transactions += 1
+        except Exception as e:
+            return {"status": "error", "message": str(e), "data": batch_summary(results, transactions, atomic)}
+        return {"status": "success", "data": batch_summary(results, transactions, atomic)}
+
+    async def batch_issue_books(self, items, issue_date=None, atomic=False):
+        result = await self._run_batch(
+            "SELECT * FROM issue_books_batch($1::int[], $2::int[], $3::date);", items, (issue_date,), atomic
+        )
+        if result["data"]["succeeded"]:
+            view_refresher.mark_dirty("issues")
+        return result
+
+    async def batch_return_books(self, items, atomic=False):
+        result = await self._run_batch("SELECT * FROM return_books_batch($1::int[], $2::int[]);", items, (), atomic)
+        if result["data"]["succeeded"]:
+            view_refresher.mark_dirty("returns")
+        return result
+
+
+    # PART 4: BACKUP AND RESTORE
+
+    async def insert_backup_audit_log(self, action_type, table_name, record_id):
+        try:
+            await self._call(
+                "INSERT INTO backup_audit_log(action_type, table_name, record_id) VALUES ($1, $2, $3);",
+                action_type, table_name, record_id,
+            )
+        except Exception as e:
+            print(f"Error creating backup audit log entry: {e}")
+
+    async def get_backup_audit_logs(self):
+        return await self._fetch_view("SELECT * FROM backup_audit_log ORDER BY timestamp DESC;")
+
+
+    # PART 5: SEARCH AND VIEWS
+
+    async def execute_query(self, sql, *params, fetch=False):
+        try:
+            async with get_async_pool().acquire() as conn:
+                if fetch:
+                    rows = await conn.fetch(sql, *params)
+                    return [dict(row) for row in rows]
+                await conn.execute(sql, *params)
+                return None
+        except Exception as e:
+            print(f"Database error: {e}")
+            return None
+
+    async def get_relation_columns(self, relation):
+        try:
+            async with get_async_pool().acquire() as conn:
+                rows = await conn.fetch("""
+                    SELECT attname FROM pg_attribute
+                    WHERE attrelid = to_regclass($1) AND attnum > 0 AND NOT attisdropped
+                    ORDER BY attnum;
+                """, relation)
+            return {"status": "success", "data": [row["attname"] for row in rows]}
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+
+    async def stream_query(self, sql, *params, batch_size=EXPORT_BATCH_SIZE):
+        """Async generator of row batches read through a server-side cursor."""
+        async with get_async_pool().acquire() as conn:
+            async with conn.transaction():
+                cur = await conn.cursor(sql, *params)
+                while True:
+                    rows = await cur.fetch(batch_size)
+                    if not rows:
+                        break
+                    yield [dict(row) for row in rows]
+
+    async def _list(self, sql, *params, empty_message):
+        try:
+            rows = await self.execute_query(sql, *params, fetch=True)
+            if rows:
+                return {"status": "success", "data": rows}
+            return {"status": "success", "data": [], "message": empty_message}
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+
+    async def view_all_books(self):
+        sql = """
+        SELECT
+            b.book_id,
+            b.title,
+            a.name AS author_name,
+            c.name AS category_name,
+            b.isbn,
+            COALESCE(av.total_copies, 0) AS total_copies,
+            COALESCE(av.available_copies, 0) AS available_copies,
+            COALESCE(av.issued_copies, 0) AS issued_copies
+        FROM books b
+        JOIN author a ON b.author = a.author_id
+        JOIN categories c ON b.category = c.category_id
+        LEFT JOIN book_availability av ON av.book_id = b.book_id
+        ORDER BY b.title;
+        """
+        return await self._list(sql, empty_message="No books found")
+
+    async def view_all_issues(self):
+        return await self._list("SELECT * FROM issues ORDER BY issue_date DESC;", empty_message="No issues found")
+
+    async def view_all_returns(self):
+        return await self._list("SELECT * FROM returns ORDER BY return_date DESC;", empty_message="No returns found")
+
+    async def _keyset_page(self, spec, select_sql, limit, cursor, conditions=(), args=()):
+        # ``conditions`` are extra WHERE terms numbered $1..$n for ``args``
+        limit = clamp_page_size(limit)
+        conditions = list(conditions)
+        args = list(args)
+        if cursor:
+            try:
+                keys = decode_cursor(spec, cursor)
+            except ValueError as e:
+                return {"status": "error", "reason": "invalid", "message": str(e)}
+            conditions.append(spec.where([f"${i}" for i in range(len(args) + 1, len(args) + len(keys) + 1)]))
+            args.extend(keys)
+        where = "WHERE " + " AND ".join(conditions) if conditions else ""
+        args.append(limit + 1)
+        sql = f"{select_sql} {where} ORDER BY {spec.order_by} LIMIT ${len(args)};"
+        try:
+            async with get_async_pool().acquire() as conn:
+                rows = await conn.fetch(sql, *args)
+            return build_page(spec, [dict(row) for row in rows], limit)
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+
+    async def get_book_availability(self, book_id):
+        try:
+            async with get_async_pool().acquire() as conn:
+                row = await conn.fetchrow("""
+                    SELECT b.book_id,
+                           COALESCE(av.total_copies, 0) + COALESCE(d.total, 0) AS total_copies,
+                           COALESCE(av.available_copies, 0) + COALESCE(d.available, 0) AS available_copies,
+                           COALESCE(av.issued_copies, 0) + COALESCE(d.total, 0) - COALESCE(d.available, 0)
+                               AS issued_copies
+                    FROM books b
+                    LEFT JOIN book_availability av ON av.book_id = b.book_id
+                    LEFT JOIN LATERAL (
+                        SELECT SUM(total_delta) AS total, SUM(available_delta) AS available
+                        FROM book_availability_deltas
+                        WHERE book_id = b.book_id
+                    ) d ON true
+                    WHERE b.book_id = $1;
+                """, book_id)
+            if row is None:
+                return {"status": "error", "reason": "not_found", "message": f"No book found with ID {book_id}."}
+            return {"status": "success", "data": dict(row)}
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+
+    async def view_books_page(self, limit=None, cursor=None):
+        sql = """
+        SELECT
+            b.book_id,
+            b.title,
+            a.name AS author_name,
+            c.name AS category_name,
+            b.isbn,
+            COALESCE(av.total_copies, 0) AS total_copies,
+            COALESCE(av.available_copies, 0) AS available_copies,
+            COALESCE(av.issued_copies, 0) AS issued_copies
+        FROM books b
+        JOIN author a ON b.author = a.author_id
+        JOIN categories c ON b.category = c.category_id
+        LEFT JOIN book_availability av ON av.book_id = b.book_id
+        """
+        return await self._keyset_page(BOOKS_KEYSET, sql, limit, cursor)
+
+    async def view_issues_page(self, limit=None, cursor=None):
+        return await self._keyset_page(ISSUES_KEYSET, "SELECT * FROM issues", limit, cursor)
+
+    async def view_returns_page(self, limit=None, cursor=None):
+        return await self._keyset_page(RETURNS_KEYSET, "SELECT * FROM returns", limit, cursor)
+
+    async def get_student_history(self, student_id, limit=None, cursor=None, date_from=None, date_to=None):
+        """One page of a student's loans, newest first, optionally limited to issue dates in [date_from, date_to]."""
+        if date_from and date_to and date_from > date_to:
+            return {"status": "error", "message": "date_from must not be after date_to"}
+        conditions, args = ["i.student_id = $1"], [student_id]
+        if date_from:
+            args.append(date_from)
+            conditions.append(f"i.issue_date >= ${len(args)}")
+        if date_to:
+            args.append(date_to)
+            conditions.append(f"i.issue_date <= ${len(args)}")
+        return await self._keyset_page(HISTORY_KEYSET, STUDENT_HISTORY_SQL, limit, cursor, conditions, args)
+
+    async def search_books_by_title(self, title):
+        sql = "SELECT * FROM books WHERE LOWER(title) LIKE LOWER('%' || $1 || '%');"
+        return await self._list(sql, title, empty_message="No books found with that title")
+
+    async def search_books_by_author(self, author_name):
+        sql = """
+        SELECT b.* FROM books b
+        JOIN author a ON b.author = a.author_id
+        WHERE LOWER(a.name) LIKE LOWER('%' || $1 || '%');
+        """
+        return await self._list(sql, author_name, empty_message="No books found by that author")
+
+    async def search_books_by_category(self, category_name):
+        sql = """
+        SELECT b.* FROM books b
+        JOIN categories c ON b.category = c.category_id
+        WHERE LOWER(c.name) LIKE LOWER('%' || $1 || '%');
+        """
+        return await self._list(sql, category_name, empty_message="No books found in that category")
+
+    async def search_books(self, term, limit=None, offset=0):
+        """Ranked prefix + trigram search over title, author, category and ISBN."""
+        tsquery = to_prefix_tsquery(term)
+        if not tsquery:
+            return {"status": "success", "data": [], "message": "Empty search term"}
+        limit = clamp_page_size(limit)
+        offset = max(0, min(int(offset), SEARCH_MAX_OFFSET))
+        raw = " ".join(search_terms(term))
+        sql = """
+        SELECT
+            b.book_id,
+            b.title,
+            a.name AS author_name,
+            c.name AS category_name,
+            b.isbn,
+            COALESCE(av.total_copies, 0) AS total_copies,
+            COALESCE(av.available_copies, 0) AS available_copies,
+            COALESCE(av.issued_copies, 0) AS issued_copies,
+            ts_rank(s.document, to_tsquery('simple', $1)) + word_similarity($2, s.search_text) AS rank
+        FROM book_search s
+        JOIN books b ON b.book_id = s.book_id
+        LEFT JOIN author a ON b.author = a.author_id
+        LEFT JOIN categories c ON b.category = c.category_id
+        LEFT JOIN book_availability av ON av.book_id = b.book_id
+        WHERE s.document @@ to_tsquery('simple', $1)
+           OR $2 <% s.search_text
+        ORDER BY rank DESC, b.book_id
+        LIMIT $3 OFFSET $4;
+        """
+        try:
+            async with get_async_pool().acquire() as conn:
+                rows = await conn.fetch(sql, tsquery, raw, limit + 1, offset)
+            rows = [dict(row) for row in rows]
+            return {
+                "status": "success",
+                "data": rows[:limit],
+                "limit": limit,
+                "offset": offset,
+                "next_offset": offset + limit if len(rows) > limit else None,
+            }
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
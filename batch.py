@@ -0,0 +1,62 @@
+"""Batch checkout / return helpers shared by the sync and async managers.
+
+A batch of (student_id, copy_id) pairs is sent to issue_books_batch() /
+return_books_batch() as two arrays, BATCH_TRANSACTION_SIZE pairs per call
+and per commit. Each pair runs in its own plpgsql exception block, so a bad
+pair is reported in its result row without aborting the others; with
+``atomic`` the whole batch is one transaction that is rolled back if any
+pair fails.
+"""
+import os
+
+
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "1000"))
+BATCH_TRANSACTION_SIZE = int(os.getenv("BATCH_TRANSACTION_SIZE", "200"))
+
+
+def validate_batch(items):
+    if not items:
+        raise ValueError("batch is empty")
+    if len(items) > BATCH_MAX_ITEMS:
+        raise ValueError(f"batch has {len(items)} items; the limit is {BATCH_MAX_ITEMS}")
+
+
+def sub_batches(items, atomic=False, size=None):
+    """Yield (offset, chunk) pairs; one chunk per transaction."""
+    size = len(items) if atomic else (size or BATCH_TRANSACTION_SIZE)
+    for offset in range(0, len(items), size):
+        yield offset, items[offset:offset + size]
+
+
+def batch_arrays(chunk):
+    return [student_id for student_id, _ in chunk], [copy_id for _, copy_id in chunk]
+
+
+def item_results(rows, offset):
+    """Function rows (item, student_id, copy_id, issue_id, error) -> per-item dicts, item is 0-based."""
+    return [
+        {
+            "item": offset + row["item"] - 1,
+            "student_id": row["student_id"],
+            "copy_id": row["copy_id"],
+            "issue_id": row["issue_id"],
+            "status": "error" if row["error"] else "ok",
+            **({"error": row["error"]} if row["error"] else {}),
+        }
+        for row in rows
+    ]
+
+
+def batch_summary(results, transactions, atomic):
+    failed = sum(1 for r in results if r["status"] != "ok")
+    if atomic and failed:
+        for r in results:
+            if r["status"] == "ok":
+                r["status"] = "rolled_back"
+    return {
+        "succeeded": 0 if atomic and failed else len(results) - failed,
+        "failed": failed,
+        "transactions": transactions,
+        "atomic": atomic,
+        "results": results,
+    }
@@ -0,0 +1,100 @@
+"""Circulation analytics at scale: every report over N loans.
+
+By default builds N synthetic loans in memory (skewed categories, 90%
+returned, a week-to-a-month loan length) so the vectorised reports can be
+timed at 10M rows without a database of that size. ``--database`` times
+load_circulation() (binary COPY into arrays) against the configured
+database instead, then the same reports:
+
+    python benchmarks/analytics_bench.py --rows 10000000
+    python datagen.py --books 200000 --students 100000 --issues 10000000
+    python benchmarks/analytics_bench.py --database
+"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+import time
+from datetime import date
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analytics import (
+    CirculationData, _lookup, department_usage, issues_per_period, lateness_distribution, load_circulation,
+    loan_durations,
+)
+
+
+def synthetic(rows, students, categories, departments, seed):
+    rng = np.random.default_rng(seed)
+    first_day = (date(2022, 1, 1) - date(1970, 1, 1)).days
+    issue = rng.integers(first_day, first_day + 3 * 365, rows, dtype=np.int32)
+    due = issue + 14
+    returned = np.where(rng.random(rows) < 0.9, issue + rng.integers(1, 40, rows, dtype=np.int32), -1)
+    fines = np.where(returned > due, (returned - due) * 100, 0)
+    columns = {
+        "student_id": rng.integers(1, students + 1, rows, dtype=np.int32),
+        "category": rng.zipf(1.5, rows).clip(1, categories).astype(np.int32),
+        "issue_day": issue,
+        "due_day": due,
+        "return_day": returned.astype(np.int32),
+        "fine_cents": fines.astype(np.int32),
+    }
+    names = np.array([""] + [f"Category {i}" for i in range(1, categories + 1)], dtype=object)
+    department_of_student, department_names = _lookup(
+        [(i, f"Department {i % departments}") for i in range(1, students + 1)])
+    return CirculationData(columns, names, department_of_student, department_names)
+
+
+def best_of(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return round(best, 4)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--students", type=int, default=200_000)
+    parser.add_argument("--categories", type=int, default=300)
+    parser.add_argument("--departments", type=int, default=12)
+    parser.add_argument("--database", action="store_true", help="load real loans instead of synthetic ones")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    if args.database:
+        with contextlib.redirect_stdout(sys.stderr):
+            data = load_circulation()
+    else:
+        data = synthetic(args.rows, args.students, args.categories, args.departments, args.seed)
+    load_seconds = round(time.perf_counter() - started, 3)
+
+    year = {"date_from": date(2023, 1, 1), "date_to": date(2023, 12, 31)}
+    reports = {
+        "issues_per_week": lambda: issues_per_period(data, "week"),
+        "issues_per_day_one_year": lambda: issues_per_period(data, "day", **year),
+        "loan_durations": lambda: loan_durations(data),
+        "lateness_distribution": lambda: lateness_distribution(data),
+        "department_usage": lambda: department_usage(data),
+    }
+    print(json.dumps({
+        "source": "database" if args.database else "synthetic",
+        "loans": len(data),
+        "load_seconds": load_seconds,
+        "array_mb": round(sum(getattr(data, name).nbytes for name in (
+            "student_id", "category", "issue_day", "due_day", "return_day", "fine_cents")) / 2**20, 1),
+        "report_seconds": {name: best_of(fn, args.repeat) for name, fn in reports.items()},
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
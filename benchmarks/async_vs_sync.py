@@ -0,0 +1,123 @@
+"""Load benchmark: blocking psycopg2 manager vs asyncpg manager inside an event loop.
+
+Each round fires ``--concurrency`` simultaneous "requests" at the same coroutine
+entry point FastAPI would use. The sync path calls LibraryDatabaseManager
+directly from the coroutine (what the handlers did before), so every call blocks
+the loop; the async path awaits AsyncLibraryDatabaseManager. Latency is measured
+from the start of the round, so queueing behind a blocked loop is included.
+
+Scenarios mirror the hot routes:
+    all-books     -> /all-books/       (view_all_books)
+    issue-return  -> /add_issue/ + /return-book/ on one copy per worker
+
+Usage (needs DATABASE_URL pointing at a local Postgres with the library schema):
+    python benchmarks/async_vs_sync.py --scenario all-books --concurrency 20 --rounds 50
+    python benchmarks/async_vs_sync.py --scenario issue-return --student-id 1 --copy-ids 1,2,3,4
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from query import LibraryDatabaseManager
+from async_query import AsyncLibraryDatabaseManager
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def make_calls(manager, scenario, concurrency, student_id, copy_ids, is_async):
+    """Build one zero-argument coroutine factory per concurrent worker."""
+    calls = []
+    for worker in range(concurrency):
+        if scenario == "all-books":
+            if is_async:
+                async def call():
+                    await manager.view_all_books()
+            else:
+                async def call():
+                    manager.view_all_books()
+        else:
+            copy_id = copy_ids[worker % len(copy_ids)]
+            if is_async:
+                async def call(copy_id=copy_id):
+                    await manager.stored_procedure_issue_book(student_id, copy_id, date.today())
+                    await manager.insert_return_and_update_book(copy_id, student_id)
+            else:
+                async def call(copy_id=copy_id):
+                    manager.stored_procedure_issue_book(student_id, copy_id, date.today())
+                    manager.insert_return_and_update_book(copy_id, student_id)
+        calls.append(call)
+    return calls
+
+
+async def run_path(manager, calls, rounds):
+    latencies = []
+
+    async def timed(call, round_start):
+        await call()
+        latencies.append(time.perf_counter() - round_start)
+
+    started = time.perf_counter()
+    for _ in range(rounds):
+        round_start = time.perf_counter()
+        await asyncio.gather(*(timed(call, round_start) for call in calls))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "requests": len(latencies),
+        "seconds": round(elapsed, 4),
+        "requests_per_sec": round(len(latencies) / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+    }
+
+
+async def main(args):
+    copy_ids = [int(c) for c in args.copy_ids.split(",")] if args.copy_ids else []
+    if args.scenario == "issue-return" and (not copy_ids or args.student_id is None):
+        raise SystemExit("issue-return needs --student-id and --copy-ids")
+    if args.scenario == "issue-return" and len(copy_ids) < args.concurrency:
+        # workers sharing a copy would fail the issue; keep one copy per worker
+        args.concurrency = len(copy_ids)
+
+    sync_manager = LibraryDatabaseManager()
+    async_manager = AsyncLibraryDatabaseManager()
+    await async_manager.init()
+
+    try:
+        results = {}
+        for name, manager, is_async in (("sync", sync_manager, False), ("async", async_manager, True)):
+            calls = make_calls(manager, args.scenario, args.concurrency, args.student_id, copy_ids, is_async)
+            # warm up pools and plans before measuring
+            await run_path(manager, calls, 1)
+            results[name] = await run_path(manager, calls, args.rounds)
+    finally:
+        await async_manager.close()
+
+    report = {
+        "scenario": args.scenario,
+        "concurrency": args.concurrency,
+        "rounds": args.rounds,
+        "results": results,
+        "speedup_rps": round(results["async"]["requests_per_sec"] / results["sync"]["requests_per_sec"], 2),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", choices=["all-books", "issue-return"], default="all-books")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=50)
+    parser.add_argument("--student-id", type=int)
+    parser.add_argument("--copy-ids", help="comma separated copy ids, one per concurrent worker")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,105 @@
+"""Catalog serving: in-memory snapshot vs the database path.
+
+Reports memory per book for the snapshot (``__slots__`` records, interned
+names, sorted key list) next to the RealDictCursor rows view_all_books()
+builds, and requests/sec for first pages, pages from a cursor mid-catalog
+and a category filter. Load a large library first, e.g.
+
+    python datagen.py --books 200000 --issues 1000000
+    python benchmarks/catalog_bench.py --seconds 5
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from catalog_snapshot import CatalogSnapshot
+from pagination import BOOKS_KEYSET, encode_cursor
+from query import LibraryDatabaseManager
+
+
+def traced(fn):
+    """(result, bytes still allocated once ``fn`` returns)."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = fn()
+        gc.collect()
+        return result, tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+
+def throughput(fn, seconds):
+    calls = 0
+    started = time.perf_counter()
+    deadline = started + seconds
+    while time.perf_counter() < deadline:
+        fn()
+        calls += 1
+    return round(calls / (time.perf_counter() - started), 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=5.0, help="time per throughput case")
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    db = LibraryDatabaseManager()
+    snapshot = CatalogSnapshot()
+    started = time.perf_counter()
+    books, snapshot_bytes = traced(snapshot.reload)
+    load_seconds = time.perf_counter() - started
+    rows, rows_bytes = traced(lambda: db.view_all_books()["data"])
+    if not books:
+        sys.exit("No books loaded; run datagen.py first.")
+
+    rng = random.Random(args.seed)
+    cursors = [encode_cursor(BOOKS_KEYSET, rng.choice(rows)) for _ in range(256)]
+    category = rng.choice(rows)["category_name"]
+    limit = args.limit
+
+    cases = {
+        "first_page": (
+            lambda: snapshot.page(limit),
+            lambda: db.view_books_page(limit),
+        ),
+        "page_from_cursor": (
+            lambda: snapshot.page(limit, rng.choice(cursors)),
+            lambda: db.view_books_page(limit, rng.choice(cursors)),
+        ),
+        "category_filter": (
+            lambda: snapshot.page(limit, category=category),
+            None,   # the database path has no category listing to compare with
+        ),
+    }
+    report = {
+        "books": books,
+        "snapshot_load_seconds": round(load_seconds, 3),
+        "snapshot_bytes_per_book": round(snapshot_bytes / books, 1),
+        "dict_rows_bytes_per_book": round(rows_bytes / len(rows), 1),
+        "poll_ms": None,
+        "requests_per_sec": {},
+    }
+    del rows
+    started = time.perf_counter()
+    snapshot.poll()
+    report["poll_ms"] = round((time.perf_counter() - started) * 1000, 3)
+    for name, (from_snapshot, from_db) in cases.items():
+        report["requests_per_sec"][name] = {
+            "snapshot": throughput(from_snapshot, args.seconds),
+            "database": throughput(from_db, args.seconds) if from_db else None,
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Export cost by format: NDJSON vs Arrow IPC vs Parquet for a date range.
+
+Exports ``--source`` between ``--from`` and ``--to`` through each format's
+full path (server-side cursor + encoder), discarding the output, and
+reports seconds, bytes and rows/sec. Load a few years of circulation first:
+
+    python datagen.py --books 200000 --issues 5000000 --days 1095
+    python benchmarks/export_bench.py --from 2024-01-01 --to 2024-12-31
+"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from columnar_export import stream_columnar
+from connection import db_connection
+from export import EXPORT_SOURCES, encode_ndjson, export_query, parse_columns
+from query import LibraryDatabaseManager
+
+
+def count_rows(sql, params):
+    with db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(f"SELECT COUNT(*) FROM ({sql}) AS q;", params)
+            rows = cur.fetchone()[0]
+            conn.rollback()
+    return rows
+
+
+def timed(chunks):
+    started = time.perf_counter()
+    size = sum(len(chunk) for chunk in chunks)
+    return time.perf_counter() - started, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", choices=sorted(EXPORT_SOURCES), default="issues")
+    parser.add_argument("--from", dest="date_from", type=date.fromisoformat)
+    parser.add_argument("--to", dest="date_to", type=date.fromisoformat)
+    parser.add_argument("--columns", help="comma-separated columns to keep (default all)")
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(sys.stderr):
+        db = LibraryDatabaseManager()
+    columns = parse_columns(args.columns)
+    ordered_sql, params = export_query(args.source, columns, args.date_from, args.date_to)
+    sql, _ = export_query(args.source, columns, args.date_from, args.date_to, ordered=False)
+    rows = count_rows(sql, params)
+
+    paths = {
+        "ndjson": lambda: (encode_ndjson(batch).encode() for batch in db.stream_query(ordered_sql, params)),
+        "arrow": lambda: stream_columnar(sql, params, "arrow"),
+        "parquet": lambda: stream_columnar(sql, params, "parquet"),
+    }
+    report = {"source": args.source, "rows": rows, "formats": {}}
+    for fmt, chunks in paths.items():
+        seconds, size = timed(chunks())
+        report["formats"][fmt] = {
+            "seconds": round(seconds, 3),
+            "bytes": size,
+            "rows_per_sec": round(rows / seconds) if seconds else None,
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
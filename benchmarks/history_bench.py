@@ -0,0 +1,66 @@
+"""Profile-page cost: refresh mv_user_borrowing_history + read vs get_student_history.
+
+The view covers every student's loans, so keeping it current costs a full
+REFRESH per write burst however small the student's history is.
+get_student_history() reads one page straight from issues through
+idx_issues_student_date. Students are sampled across history sizes (the
+heaviest readers and a median one); load a large library first, e.g.
+
+    python datagen.py --books 200000 --students 50000 --issues 2000000
+    python benchmarks/history_bench.py --repeat 20
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from connection import db_connection
+from issue_report_bench import time_call
+from query import LibraryDatabaseManager
+
+
+def sample_students():
+    with db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                WITH counts AS (SELECT student_id, COUNT(*) AS loans FROM issues GROUP BY student_id)
+                (SELECT student_id, loans FROM counts ORDER BY loans DESC LIMIT 1)
+                UNION ALL
+                (SELECT student_id, loans FROM counts
+                 ORDER BY ABS(loans - (SELECT percentile_disc(0.5) WITHIN GROUP (ORDER BY loans) FROM counts))
+                 LIMIT 1);
+            """)
+            rows = cur.fetchall()
+            conn.rollback()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--refresh-repeat", type=int, default=3, help="the refresh path is slow; fewer samples")
+    parser.add_argument("--limit", type=int, default=50)
+    args = parser.parse_args()
+
+    db = LibraryDatabaseManager()
+    report = []
+    for student_id, loans in sample_students():
+        def refresh_then_read():
+            db.refresh_materialized_view("mv_user_borrowing_history")
+            db.get_user_borrowing_history(student_id)
+
+        report.append({
+            "student_id": student_id,
+            "loans": loans,
+            "refresh_view_then_read": time_call(refresh_then_read, args.refresh_repeat),
+            "view_read_only": time_call(lambda: db.get_user_borrowing_history(student_id), args.repeat),
+            "student_history_page": time_call(
+                lambda: db.get_student_history(student_id, limit=args.limit), args.repeat),
+        })
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""/issue-report/ request-path cost: old DDL + refresh + read vs read only.
+
+The old handler ran create_materialized_view_issued_report() (CREATE
+MATERIALIZED VIEW / CREATE UNIQUE INDEX IF NOT EXISTS) and a REFRESH before
+every SELECT. Since the schema bootstrap owns the DDL and view_refresher
+owns the refresh, a request is just get_issued_report(). Run against a
+database that has had ``python schema.py`` applied:
+
+    python benchmarks/issue_report_bench.py --repeat 50
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from query import LibraryDatabaseManager
+
+
+def time_call(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        "p50_ms": round(statistics.median(samples), 3),
+        "p99_ms": round(samples[min(len(samples) - 1, int(0.99 * len(samples)))], 3),
+        "mean_ms": round(statistics.fmean(samples), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    db = LibraryDatabaseManager()
+
+    def legacy_request():
+        db.create_materialized_view_issued_report()
+        db.refresh_materialized_view("mv_issued_report")
+        db.get_issued_report()
+
+    rows = len(db.get_issued_report().get("data", []))
+    report = {
+        "rows": rows,
+        "legacy_ddl_refresh_read": time_call(legacy_request, args.repeat),
+        "read_only": time_call(db.get_issued_report, args.repeat),
+    }
+    report["p50_speedup"] = round(
+        report["legacy_ddl_refresh_read"]["p50_ms"] / max(report["read_only"]["p50_ms"], 1e-6), 1
+    )
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
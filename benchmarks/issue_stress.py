@@ -0,0 +1,275 @@
+"""Concurrent checkout stress test: thousands of simultaneous issues of one book.
+
+Creates a scratch book with ``--copies`` copies and ``--students`` students,
+fires ``--requests`` checkouts at it at once through the asyncpg pool and
+then checks the database: every successful checkout must hold a distinct
+copy, exactly min(requests, copies) must succeed and the rest must fail
+cleanly as "no available copies".
+
+It then measures whether checkouts of one title actually run in parallel:
+``--scaling-requests`` checkouts of a fresh book, first one at a time and
+then ``--concurrency`` at a time, each transaction kept open ``--hold-ms``
+after allocating (the rest of a request's work before commit). Any per-title
+row lock on the checkout path serialises the second run, so its throughput
+must be at least ``--min-speedup`` times the first.
+
+Prints throughput / latency as JSON and exits non-zero if a check fails.
+
+    python benchmarks/issue_stress.py --requests 5000 --copies 2000
+    python benchmarks/issue_stress.py --mode naive     # old SELECT ... LIMIT 1 allocation; fails the scaling check
+
+Scratch rows are removed afterwards unless --keep is given.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+import uuid
+from collections import Counter
+
+import asyncpg
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from async_query import AsyncLibraryDatabaseManager
+from connection import ASYNC_POOL_MAX_SIZE, db_connection, get_async_pool, init_connection_pool
+
+
+def create_fixture(copies, students):
+    tag = uuid.uuid4().hex[:8]
+    with db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("INSERT INTO author (name, bio) VALUES (%s, 'Bio not provided') RETURNING author_id;",
+                        (f"Stress Author {tag}",))
+            author_id = cur.fetchone()[0]
+            cur.execute("INSERT INTO categories (name) VALUES (%s) RETURNING category_id;", (f"Stress {tag}",))
+            category_id = cur.fetchone()[0]
+            cur.execute(
+                "INSERT INTO books (title, author, category, isbn, total_copies) "
+                "VALUES (%s, %s, %s, %s, %s) RETURNING book_id;",
+                (f"Stress Book {tag}", author_id, category_id, f"STRESS-{tag}", copies),
+            )
+            book_id = cur.fetchone()[0]
+            cur.execute(
+                "INSERT INTO book_copies (book_id, status, shelf_location) "
+                "SELECT %s, 'available', 'STRESS' FROM generate_series(1, %s);",
+                (book_id, copies),
+            )
+            cur.execute(
+                "INSERT INTO student (name, department, email) "
+                "SELECT 'Stress Student ' || g, 'Stress', 'stress-' || %s || '-' || g || '@example.invalid' "
+                "FROM generate_series(1, %s) g RETURNING student_id;",
+                (tag, students),
+            )
+            student_ids = [r[0] for r in cur.fetchall()]
+            conn.commit()
+    return book_id, student_ids
+
+
+def drop_fixture(book_id, student_ids):
+    with db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM issues WHERE copy_id IN (SELECT copy_id FROM book_copies WHERE book_id = %s);",
+                        (book_id,))
+            cur.execute("DELETE FROM books WHERE book_id = %s;", (book_id,))
+            cur.execute("DELETE FROM student WHERE student_id = ANY(%s);", (student_ids,))
+            conn.commit()
+
+
+class Unavailable(Exception):
+    pass
+
+
+async def skip_locked_checkout(conn, book_id, student_id):
+    try:
+        row = await conn.fetchrow("SELECT issue_id, copy_id FROM allocate_copy($1, $2, CURRENT_DATE);",
+                                  book_id, student_id)
+    except asyncpg.exceptions.NoDataFoundError:
+        raise Unavailable
+    return row["copy_id"]
+
+
+async def naive_checkout(conn, book_id, student_id):
+    # the pre-SKIP LOCKED procedure body, statement for statement, including
+    # the per-title books row update that serialised checkouts of one title
+    copy_id = await conn.fetchval(
+        "SELECT copy_id FROM book_copies WHERE book_id = $1 AND status = 'available' LIMIT 1;", book_id
+    )
+    if copy_id is None:
+        raise Unavailable
+    await conn.execute(
+        "INSERT INTO issues (student_id, copy_id, issue_date) VALUES ($1, $2, CURRENT_DATE);",
+        student_id, copy_id,
+    )
+    await conn.execute("UPDATE books SET total_copies = total_copies - 1 WHERE book_id = $1;", book_id)
+    await conn.execute("UPDATE book_copies SET status = 'issue' WHERE copy_id = $1;", copy_id)
+    return copy_id
+
+
+CHECKOUTS = {"skip-locked": skip_locked_checkout, "naive": naive_checkout}
+
+
+async def held_checkout(checkout, book_id, student_id, hold_ms):
+    """One checkout transaction, kept open ``hold_ms`` after allocating before it commits."""
+    try:
+        async with get_async_pool().acquire() as conn:
+            async with conn.transaction():
+                copy_id = await checkout(conn, book_id, student_id)
+                if hold_ms:
+                    await conn.execute("SELECT pg_sleep($1::float8 / 1000);", hold_ms)
+    except Unavailable:
+        return {"status": "error", "reason": "unavailable", "message": "No available copies"}
+    return {"status": "success", "data": {"copy_id": copy_id}}
+
+
+async def naive_allocate(book_id, student_id):
+    return await held_checkout(naive_checkout, book_id, student_id, 0)
+
+
+async def fire(allocate, book_id, student_ids, requests, concurrency=None):
+    latencies = []
+    # no limit: every request at once, queueing on the pool
+    gate = asyncio.Semaphore(concurrency or requests)
+
+    async def one(n):
+        async with gate:
+            started = time.perf_counter()
+            try:
+                result = await allocate(book_id, student_ids[n % len(student_ids)])
+            except Exception as e:
+                result = {"status": "error", "message": str(e)}
+            latencies.append((time.perf_counter() - started) * 1000)
+        return result
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(one(n) for n in range(requests)))
+    return results, time.perf_counter() - started, sorted(latencies)
+
+
+async def measure_scaling(args, student_ids):
+    """Same-title checkout throughput one at a time vs ``--concurrency`` at a time."""
+    checkout = CHECKOUTS[args.mode]
+    concurrency = min(args.concurrency, ASYNC_POOL_MAX_SIZE)
+    levels = {}
+    for level in (1, concurrency):
+        book_id, _ = create_fixture(args.scaling_requests, 0)
+        try:
+            results, elapsed, _ = await fire(
+                lambda book, student: held_checkout(checkout, book, student, args.hold_ms),
+                book_id, student_ids, args.scaling_requests, level,
+            )
+        finally:
+            drop_fixture(book_id, [])
+        levels[level] = {
+            "requests_per_sec": round(args.scaling_requests / elapsed, 1),
+            "successes": sum(1 for r in results if r["status"] == "success"),
+        }
+    speedup = levels[concurrency]["requests_per_sec"] / levels[1]["requests_per_sec"]
+    checks = {
+        "scaling_all_succeeded": all(level["successes"] == args.scaling_requests for level in levels.values()),
+        "same_title_throughput_scales": speedup >= args.min_speedup,
+    }
+    return {
+        "hold_ms": args.hold_ms,
+        "requests": args.scaling_requests,
+        "concurrency": concurrency,
+        "levels": {str(level): data for level, data in levels.items()},
+        "speedup": round(speedup, 2),
+        "min_speedup": args.min_speedup,
+    }, checks
+
+
+def verify(book_id, results, copies):
+    with db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT i.copy_id FROM issues i JOIN book_copies c ON c.copy_id = i.copy_id
+                WHERE c.book_id = %s AND i.returned = 'no'
+                GROUP BY i.copy_id HAVING COUNT(*) > 1;
+            """, (book_id,))
+            double_issued = [r[0] for r in cur.fetchall()]
+            cur.execute("SELECT COUNT(*) FROM book_copies WHERE book_id = %s AND status = 'issue';", (book_id,))
+            copies_marked_issued = cur.fetchone()[0]
+            cur.execute("""
+                SELECT COUNT(*) FROM issues i JOIN book_copies c ON c.copy_id = i.copy_id WHERE c.book_id = %s;
+            """, (book_id,))
+            issue_rows = cur.fetchone()[0]
+
+    successes = sum(1 for r in results if r["status"] == "success")
+    expected = min(len(results), copies)
+    checks = {
+        "no_double_issues": not double_issued,
+        "expected_successes": successes == expected,
+        "issue_rows_match_successes": issue_rows == successes,
+        "copies_marked_match_issue_rows": copies_marked_issued == issue_rows,
+        "failures_are_unavailable": all(r.get("reason") == "unavailable" for r in results if r["status"] != "success"),
+    }
+    return {
+        "successes": successes,
+        "expected_successes": expected,
+        "issue_rows": issue_rows,
+        "copies_marked_issued": copies_marked_issued,
+        "double_issued_copies": len(double_issued),
+        "checks": checks,
+        "ok": all(checks.values()),
+    }
+
+
+async def run(args):
+    manager = AsyncLibraryDatabaseManager()
+    await manager.init()
+    book_id, student_ids = create_fixture(args.copies, args.students)
+    try:
+        allocate = manager.allocate_issue if args.mode == "skip-locked" else naive_allocate
+        results, elapsed, latencies = await fire(allocate, book_id, student_ids, args.requests)
+        report = {
+            "mode": args.mode,
+            "requests": args.requests,
+            "copies": args.copies,
+            "seconds": round(elapsed, 3),
+            "requests_per_sec": round(args.requests / elapsed, 1),
+            "p50_ms": round(statistics.median(latencies), 3),
+            "p99_ms": round(latencies[min(len(latencies) - 1, int(0.99 * len(latencies)))], 3),
+            "outcomes": dict(Counter(r["status"] if r["status"] == "success" else r.get("reason", "error")
+                                     for r in results)),
+        }
+        report.update(verify(book_id, results, args.copies))
+        if args.scaling_requests:
+            report["scaling"], checks = await measure_scaling(args, student_ids)
+            report["checks"].update(checks)
+            report["ok"] = all(report["checks"].values())
+    finally:
+        if not args.keep:
+            drop_fixture(book_id, student_ids)
+        await manager.close()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--copies", type=int, default=1000)
+    parser.add_argument("--students", type=int, default=500)
+    parser.add_argument("--mode", choices=sorted(CHECKOUTS), default="skip-locked")
+    parser.add_argument("--scaling-requests", type=int, default=400,
+                        help="checkouts per run of the same-title scaling check (0 skips it)")
+    parser.add_argument("--concurrency", type=int, default=8,
+                        help="concurrent checkouts in the scaling check (capped at ASYNC_POOL_MAX_SIZE)")
+    parser.add_argument("--hold-ms", type=float, default=20, help="time each scaling checkout stays open")
+    parser.add_argument("--min-speedup", type=float, default=4.0,
+                        help="required throughput ratio, --concurrency vs one at a time")
+    parser.add_argument("--keep", action="store_true", help="leave the scratch book, copies and students in place")
+    args = parser.parse_args()
+
+    init_connection_pool()
+    report = asyncio.run(run(args))
+    print(json.dumps(report, indent=2))
+    if not report["ok"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Per-call latency of the hot read statements: plain execute vs prepared EXECUTE.
+
+Runs each read-only HOT_STATEMENTS entry ``--repeat`` times on one pooled
+connection, once through a registry with preparation disabled (text SQL,
+parsed and planned per call) and once through a prepared one.
+
+    python benchmarks/prepared_bench.py --repeat 2000 --student-id 1
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from connection import db_connection, init_connection_pool
+from prepared import HOT_STATEMENTS, PreparedStatementRegistry
+
+
+def bench_params(args):
+    # read-only statements only, so repeated runs leave the database unchanged
+    return {
+        "author_id_by_name": (args.author,),
+        "category_id_by_name": (args.category,),
+        "book_names_by_id": (args.book_id,),
+        "popular_books_all_time": (10,),
+        "popular_books_window": (30, 10),
+        "mv_user_borrowing_history": (args.student_id,),
+        "mv_issued_report": (),
+    }
+
+
+def time_statement(registry, cur, name, params, repeat):
+    registry.execute(cur, name, params)  # warm-up (and PREPARE for the prepared registry)
+    cur.fetchall()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        registry.execute(cur, name, params)
+        cur.fetchall()
+        samples.append((time.perf_counter() - started) * 1_000_000)
+    samples.sort()
+    return {
+        "p50_us": round(statistics.median(samples), 1),
+        "p99_us": round(samples[min(len(samples) - 1, int(0.99 * len(samples)))], 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=1000)
+    parser.add_argument("--author", default="Thomas Cormen")
+    parser.add_argument("--category", default="Computer Science")
+    parser.add_argument("--book-id", type=int, default=1)
+    parser.add_argument("--student-id", type=int, default=1)
+    args = parser.parse_args()
+
+    init_connection_pool()
+    plain = PreparedStatementRegistry(HOT_STATEMENTS, enabled=False)
+    prepared = PreparedStatementRegistry(HOT_STATEMENTS, enabled=True)
+
+    report = []
+    with db_connection() as conn:
+        with conn.cursor() as cur:
+            for name, params in bench_params(args).items():
+                before = time_statement(plain, cur, name, params, args.repeat)
+                after = time_statement(prepared, cur, name, params, args.repeat)
+                report.append({
+                    "statement": name,
+                    "plain": before,
+                    "prepared": after,
+                    "p50_speedup": round(before["p50_us"] / max(after["p50_us"], 0.1), 2),
+                })
+            conn.rollback()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
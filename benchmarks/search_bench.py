@@ -0,0 +1,124 @@
+"""Search latency benchmark: LIKE '%term%' methods vs the ranked search_books index.
+
+Run against a scratch database that already has the schema and
+create_book_search_index() applied. ``--seed N`` first adds N synthetic books
+(set-based INSERT ... SELECT generate_series, in chunks), so a 100k and a 1M
+run look like:
+
+    python benchmarks/search_bench.py --seed 100000
+    python benchmarks/search_bench.py --seed 900000     # now ~1M books
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from connection import db_connection
+from query import LibraryDatabaseManager
+
+
+WORDS = [
+    "history", "quantum", "garden", "algorithms", "shadow", "river", "empire", "machine",
+    "silent", "kingdom", "ocean", "theory", "winter", "dragon", "network", "modern",
+    "ancient", "journey", "physics", "secret", "storm", "language", "mountain", "data",
+    "poetry", "economics", "night", "crystal", "biology", "forest", "glass", "engine",
+]
+SEED_CHUNK = 100_000
+
+# (label, term, legacy method) - legacy is the LIKE-based method the term maps to
+QUERIES = [
+    ("word", "quantum", "search_books_by_title"),
+    ("prefix", "algor", "search_books_by_title"),
+    ("two words", "silent river", "search_books_by_title"),
+    ("typo", "quantm gardn", "search_books_by_title"),
+    ("author", "Bench Author 42", "search_books_by_author"),
+    ("category", "Bench Category 7", "search_books_by_category"),
+]
+
+
+def seed_books(count, authors=5000, categories=50):
+    with db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT COALESCE(MAX(book_id), 0) FROM books;")
+            offset = cur.fetchone()[0]
+            cur.execute(
+                "INSERT INTO author (name, bio) SELECT 'Bench Author ' || g, 'Bio not provided' "
+                "FROM generate_series(1, %s) g RETURNING author_id;", (authors,))
+            author_ids = [r[0] for r in cur.fetchall()]
+            cur.execute(
+                "INSERT INTO categories (name) SELECT 'Bench Category ' || g || '-' || %s "
+                "FROM generate_series(1, %s) g RETURNING category_id;", (offset, categories))
+            category_ids = [r[0] for r in cur.fetchall()]
+            conn.commit()
+
+            for start in range(1, count + 1, SEED_CHUNK):
+                stop = min(count, start + SEED_CHUNK - 1)
+                cur.execute("""
+                    INSERT INTO books (title, author, category, isbn, total_copies)
+                    SELECT
+                        INITCAP(w[1 + ABS(HASHTEXT(g || 'a')) %% n] || ' ' ||
+                                w[1 + ABS(HASHTEXT(g || 'b')) %% n] || ' ' ||
+                                w[1 + ABS(HASHTEXT(g || 'c')) %% n]),
+                        (%(authors)s::int[])[1 + ABS(HASHTEXT(g || 'd')) %% cardinality(%(authors)s::int[])],
+                        (%(categories)s::int[])[1 + ABS(HASHTEXT(g || 'e')) %% cardinality(%(categories)s::int[])],
+                        'BENCH' || LPAD((%(offset)s + g)::text, 12, '0'),
+                        1
+                    FROM generate_series(%(start)s, %(stop)s) g,
+                         (SELECT %(words)s::text[] AS w, cardinality(%(words)s::text[]) AS n) words;
+                """, {
+                    "authors": author_ids, "categories": category_ids, "words": WORDS,
+                    "offset": offset, "start": start, "stop": stop,
+                })
+                conn.commit()
+                print(f"seeded {stop}/{count} books", file=sys.stderr)
+        with conn.cursor() as cur:
+            cur.execute("ANALYZE books; ANALYZE author; ANALYZE categories; ANALYZE book_search;")
+            conn.commit()
+
+
+def time_call(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        "p50_ms": round(statistics.median(samples), 3),
+        "p99_ms": round(samples[min(len(samples) - 1, int(0.99 * len(samples)))], 3),
+        "rows": len(result.get("data", [])),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seed", type=int, default=0, help="synthetic books to add before measuring")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    db = LibraryDatabaseManager()
+    if args.seed:
+        seed_books(args.seed)
+
+    with db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT COUNT(*) FROM books;")
+            total_books = cur.fetchone()[0]
+
+    report = {"books": total_books, "queries": []}
+    for label, term, legacy in QUERIES:
+        report["queries"].append({
+            "query": label,
+            "term": term,
+            "like": time_call(lambda: getattr(db, legacy)(term), args.repeat),
+            "search_books": time_call(lambda: db.search_books(term, limit=20), args.repeat),
+        })
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
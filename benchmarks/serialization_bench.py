@@ -0,0 +1,140 @@
+"""Result serialization: per-cell conversion + jsonable_encoder vs serialization.dumps.
+
+Encodes a synthetic payload shaped like /issue-report/ and the
+mv_user_borrowing_history rows (ints, text, dates, NULLs and Decimal
+fines), starting from cursor tuples, both ways:
+
+- ``before``: the old manager loop (Decimal -> float, date -> isoformat per
+  cell), then FastAPI's jsonable_encoder and JSONResponse's json.dumps;
+- ``after``: dict(zip()) per row and one serialization.dumps() to bytes.
+
+Reports CPU seconds (best of --repeat) and peak traced memory. No database
+needed:
+
+    python benchmarks/serialization_bench.py --rows 100000
+"""
+import argparse
+import decimal
+import gc
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+
+import serialization
+from serialization import dumps
+
+
+ISSUED_REPORT_COLUMNS = (
+    "student_id", "student_name", "issue_id", "copy_id", "fine_charged", "fine_accruing", "total_fines", "returned",
+    "student_charged", "student_accruing", "student_balance",
+)
+HISTORY_COLUMNS = ("student_id", "student_name", "book_title", "issue_date", "return_date", "fine_amount")
+
+
+def issued_report_rows(count, rng):
+    rows = []
+    for i in range(count):
+        returned = rng.choice(("yes", "no"))
+        fine = decimal.Decimal(rng.randrange(0, 5000)) / 100
+        charged, accruing = (fine, decimal.Decimal("0.00")) if returned == "yes" else (decimal.Decimal("0.00"), fine)
+        student_charged = decimal.Decimal(rng.randrange(0, 20000)) / 100
+        student_accruing = decimal.Decimal(rng.randrange(0, 5000)) / 100
+        rows.append((rng.randrange(1, 50000), f"Student {i % 50000}", i, rng.randrange(1, 400000),
+                     charged, accruing, charged + accruing, returned,
+                     student_charged, student_accruing, student_charged + student_accruing))
+    return rows
+
+
+def history_rows(count, rng):
+    start = date(2020, 1, 1)
+    rows = []
+    for i in range(count):
+        issued = start + timedelta(days=rng.randrange(0, 1500))
+        returned = issued + timedelta(days=rng.randrange(1, 40)) if rng.random() < 0.9 else None
+        fine = decimal.Decimal(rng.randrange(0, 3000)) / 100 if returned else None
+        rows.append((i % 50000, f"Student {i % 50000}", f"Title {rng.randrange(200000)}", issued, returned, fine))
+    return rows
+
+
+def before(columns, rows):
+    data = []
+    for row in rows:
+        record = {}
+        for col, val in zip(columns, row):
+            if isinstance(val, decimal.Decimal):
+                record[col] = float(val)
+            elif isinstance(val, date):
+                record[col] = val.isoformat()
+            else:
+                record[col] = val
+        data.append(record)
+    content = jsonable_encoder({"status": "success", "data": data})
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode()
+
+
+def after(columns, rows):
+    return dumps({"status": "success", "data": [dict(zip(columns, row)) for row in rows]})
+
+
+def cpu_seconds(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        started = time.process_time()
+        fn()
+        elapsed = time.process_time() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return round(best, 4)
+
+
+def peak_bytes(fn):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    payloads = {
+        "issued_report": (ISSUED_REPORT_COLUMNS, issued_report_rows(args.rows, rng)),
+        "borrowing_history": (HISTORY_COLUMNS, history_rows(args.rows, rng)),
+    }
+    report = {"rows": args.rows, "encoder": "orjson" if serialization.orjson else "json", "payloads": {}}
+    for name, (columns, rows) in payloads.items():
+        old_body, new_body = before(columns, rows), after(columns, rows)
+        if json.loads(old_body) != json.loads(new_body):
+            sys.exit(f"{name}: encoders disagree")
+        report["payloads"][name] = {
+            "body_bytes": len(new_body),
+            "before": {
+                "cpu_seconds": cpu_seconds(lambda: before(columns, rows), args.repeat),
+                "peak_mb": round(peak_bytes(lambda: before(columns, rows)) / 2**20, 1),
+            },
+            "after": {
+                "cpu_seconds": cpu_seconds(lambda: after(columns, rows), args.repeat),
+                "peak_mb": round(peak_bytes(lambda: after(columns, rows)) / 2**20, 1),
+            },
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
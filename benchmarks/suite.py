@@ -0,0 +1,444 @@
+"""Benchmark suite: every FastAPI route and LibraryDatabaseManager method, with regression check.
+
+Steps:
+1. ``--seed``: apply the schema bootstrap and load a synthetic library with
+   datagen.generate_library (Zipfian popularity, open and overdue loans,
+   fixed ``--random-seed`` so runs are comparable). Skip it to measure
+   whatever the database already holds.
+2. Create a scratch checkout book and students (removed at the end) so the
+   write cases can issue and return copies without changing the dataset.
+3. Time each case (``--iterations`` calls spread over ``--concurrency``
+   threads): manager cases call LibraryDatabaseManager in-process, route
+   cases hit a running API at ``--base-url`` (``--skip-routes`` to omit).
+   Write cases are issue+return / insert+delete round trips.
+4. Write JSON to benchmarks/results/ and, given ``--baseline``, flag every
+   case whose p50/p99 grew or whose throughput fell by more than
+   ``--threshold`` (exit status 1).
+
+    python benchmarks/suite.py --seed --books 20000 --issues 200000
+    uvicorn fast_endpoints:app &  python benchmarks/suite.py --save-baseline
+    python benchmarks/suite.py --baseline benchmarks/baseline.json
+
+Not timed: the create_* DDL methods (see schema.py) and the offline jobs
+(bulk_insert_books, backfill_book_popularity, prune_book_popularity_daily,
+backfill_due_dates, rebuild_fine_balances; accrue_fines is a heavy case),
+nor POST /books/, whose stored procedure returns no book id to clean up.
+"""
+import argparse
+import contextlib
+import http.client
+import itertools
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from urllib.parse import urlencode, urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from connection import db_connection
+from datagen import generate_library
+from issue_stress import create_fixture, drop_fixture
+from query import LibraryDatabaseManager
+from refresh_scheduler import MATERIALIZED_VIEWS
+from schema import bootstrap_schema
+
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+BATCH_PAIRS = 10
+
+
+# fixtures
+
+def load_fixtures(concurrency):
+    """Sample ids/names for read cases plus a scratch book with enough copies for the write cases."""
+    copies = concurrency * (1 + BATCH_PAIRS) + 10
+    book_id, student_ids = create_fixture(copies, max(concurrency, 1))
+    with db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT copy_id FROM book_copies WHERE book_id = %s ORDER BY copy_id;", (book_id,))
+            copy_ids = [r[0] for r in cur.fetchall()]
+            cur.execute("SELECT student_id FROM issues ORDER BY issue_id DESC LIMIT 1;")
+            row = cur.fetchone()
+            cur.execute("""
+                SELECT b.title, a.name, c.name FROM books b
+                JOIN author a ON a.author_id = b.author JOIN categories c ON c.category_id = b.category
+                WHERE b.book_id <> %s ORDER BY b.book_id LIMIT 1;
+            """, (book_id,))
+            sample = cur.fetchone() or ("history", "Suite Author", "Suite Category")
+            conn.rollback()
+    return {
+        "checkout_book_id": book_id,
+        "student_ids": student_ids,
+        "copy_ids": copy_ids,
+        "history_student_id": row[0] if row else student_ids[0],
+        "term": sample[0].split()[0],
+        "author": sample[1],
+        "category": sample[2],
+    }
+
+
+# cases
+
+class Case:
+    def __init__(self, name, kind, fn, heavy=False):
+        self.name = name
+        self.kind = kind      # "manager" or "route"
+        self.fn = fn          # fn(worker, iteration) -> truthy on success
+        self.heavy = heavy
+
+
+def _ok(result):
+    return isinstance(result, dict) and result.get("status") == "success"
+
+
+def manager_cases(db, fx, concurrency):
+    sid, hist = fx["student_ids"], fx["history_student_id"]
+    copies = fx["copy_ids"]
+    counter = itertools.count()
+
+    def student(worker):
+        return sid[worker % len(sid)]
+
+    def worker_batch(worker):
+        start = concurrency + worker * BATCH_PAIRS
+        return [(student(worker), c) for c in copies[start:start + BATCH_PAIRS]]
+
+    def insert_then_delete(worker, i):
+        n = next(counter)
+        result = db.insert_book(f"Suite Bench Book {n}", fx["author"], fx["category"], f"SUITEBENCH{n}", 2, "BENCH")
+        return _ok(result) and _ok(db.delete_book(result["book_id"]))
+
+    def allocate_then_return(worker, i):
+        result = db.allocate_issue(fx["checkout_book_id"], student(worker))
+        return _ok(result) and _ok(db.insert_return_and_update_book(result["data"]["copy_id"], student(worker)))
+
+    def batch_issue_then_return(worker, i):
+        items = worker_batch(worker)
+        issued = db.batch_issue_books(items)
+        returned = db.batch_return_books(items)
+        return issued["data"]["failed"] == 0 and returned["data"]["failed"] == 0
+
+    def first_page_then_next(method):
+        def run(worker, i):
+            page = method(limit=50)
+            return _ok(page) and (page["next_cursor"] is None or _ok(method(limit=50, cursor=page["next_cursor"])))
+        return run
+
+    def consume_stream(worker, i):
+        return sum(len(batch) for batch in db.stream_query("SELECT * FROM issues LIMIT 10000", batch_size=2000)) >= 0
+
+    cases = [
+        ("get_materialized_view_popular_books", lambda w, i: _ok(db.get_materialized_view_popular_books())),
+        ("get_popular_books", lambda w, i: _ok(db.get_popular_books(limit=10))),
+        ("get_popular_books(window_days=30)", lambda w, i: _ok(db.get_popular_books(limit=10, window_days=30))),
+        ("get_materialized_view_overdue_transactions", lambda w, i: _ok(db.get_materialized_view_overdue_transactions())),
+        ("get_overdue_loans", lambda w, i: _ok(db.get_overdue_loans(limit=50))),
+        ("get_loans_becoming_overdue", lambda w, i: _ok(db.get_loans_becoming_overdue(limit=50))),
+        ("get_loan_policies", lambda w, i: _ok(db.get_loan_policies())),
+        ("get_fine_balances", lambda w, i: _ok(db.get_fine_balances(limit=50))),
+        ("get_student_fine_balance", lambda w, i: _ok(db.get_student_fine_balance(hist))),
+        ("get_all_books_from_materialized_view", lambda w, i: _ok(db.get_all_books_from_materialized_view())),
+        ("get_user_borrowing_history", lambda w, i: _ok(db.get_user_borrowing_history(hist))),
+        ("get_student_history", lambda w, i: _ok(db.get_student_history(hist, limit=50))),
+        ("get_issued_report", lambda w, i: _ok(db.get_issued_report())),
+        ("view_books_page", first_page_then_next(db.view_books_page)),
+        ("get_book_availability", lambda w, i: _ok(db.get_book_availability(fx["checkout_book_id"]))),
+        ("view_issues_page", first_page_then_next(db.view_issues_page)),
+        ("view_returns_page", first_page_then_next(db.view_returns_page)),
+        ("search_books", lambda w, i: _ok(db.search_books(fx["term"], limit=20))),
+        ("search_books_by_title", lambda w, i: _ok(db.search_books_by_title(fx["term"]))),
+        ("search_books_by_author", lambda w, i: _ok(db.search_books_by_author(fx["author"]))),
+        ("search_books_by_category", lambda w, i: _ok(db.search_books_by_category(fx["category"]))),
+        ("get_backup_audit_logs", lambda w, i: _ok(db.get_backup_audit_logs())),
+        ("get_name_cache_stats", lambda w, i: _ok(db.get_name_cache_stats())),
+        ("execute_query", lambda w, i: db.execute_query("SELECT 1", fetch=True) is not None),
+        ("insert_book+delete_book", insert_then_delete),
+        ("allocate_issue+insert_return_and_update_book", allocate_then_return),
+        ("batch_issue_books+batch_return_books", batch_issue_then_return),
+    ]
+    heavy = [
+        ("view_all_books", lambda w, i: _ok(db.view_all_books())),
+        ("view_all_issues", lambda w, i: _ok(db.view_all_issues())),
+        ("view_all_returns", lambda w, i: _ok(db.view_all_returns())),
+        ("stream_query(10k issues)", consume_stream),
+        ("accrue_fines", lambda w, i: _ok(db.accrue_fines())),
+    ] + [
+        (f"refresh_materialized_view({view})",
+         lambda w, i, view=view: _ok(db.refresh_materialized_view(view)))
+        for view in MATERIALIZED_VIEWS
+    ]
+    return ([Case(name, "manager", fn) for name, fn in cases]
+            + [Case(name, "manager", fn, heavy=True) for name, fn in heavy])
+
+
+class HttpClient:
+    """One keep-alive connection per worker thread."""
+
+    def __init__(self, base_url, bust_cache):
+        parts = urlsplit(base_url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.bust_cache = bust_cache
+        self._local = threading.local()
+        self._nonce = itertools.count()
+
+    def request(self, method, path, params=None, body=None):
+        params = dict(params or {})
+        if self.bust_cache and method == "GET":
+            params["_nonce"] = next(self._nonce)   # distinct key -> response cache miss
+        url = path + ("?" + urlencode(params) if params else "")
+        payload = json.dumps(body).encode() if body is not None else None
+        headers = {"Content-Type": "application/json"} if payload else {}
+        for attempt in range(2):
+            conn = getattr(self._local, "conn", None)
+            if conn is None:
+                conn = self._local.conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+            try:
+                conn.request(method, url, body=payload, headers=headers)
+                response = conn.getresponse()
+                data = response.read()
+                return response.status, data
+            except (http.client.HTTPException, OSError):
+                conn.close()
+                self._local.conn = None
+                if attempt:
+                    raise
+
+
+def route_cases(http, fx, concurrency):
+    sid, copies = fx["student_ids"], fx["copy_ids"]
+    counter = itertools.count()
+
+    def student(worker):
+        return sid[worker % len(sid)]
+
+    def get(path, params=None):
+        return lambda w, i: http.request("GET", path, params)[0] == 200
+
+    def checkout_then_return(worker, i):
+        status, body = http.request("POST", "/checkout/", {"book_id": fx["checkout_book_id"], "student_id": student(worker)})
+        if status != 200:
+            return False
+        copy_id = json.loads(body)["data"]["copy_id"]
+        return http.request("POST", "/return-book/", {"student_id": student(worker), "copy_id": copy_id})[0] == 200
+
+    def add_issue_then_return(worker, i):
+        params = {"student_id": student(worker), "copy_id": copies[worker]}
+        return (http.request("POST", "/add_issue/", params)[0] == 200
+                and http.request("POST", "/return-book/", params)[0] == 200)
+
+    def batch_issue_then_return(worker, i):
+        start = concurrency + worker * BATCH_PAIRS
+        items = [{"student_id": student(worker), "copy_id": c} for c in copies[start:start + BATCH_PAIRS]]
+        ok = True
+        for path in ("/batch/issue/", "/batch/return/"):
+            status, body = http.request("POST", path, body={"items": items})
+            ok = ok and status == 200 and json.loads(body)["data"]["failed"] == 0
+        return ok
+
+    def insert_then_delete(worker, i):
+        n = next(counter)
+        path = f"/books/Suite Route Book {n}/{fx['author']}/{fx['category']}/SUITEROUTE{n}/1/BENCH".replace(" ", "%20")
+        status, body = http.request("POST", path)
+        if status != 200:
+            return False
+        return http.request("DELETE", f"/books/{json.loads(body)['book_id']}")[0] == 200
+
+    cases = [
+        ("GET /", get("/")),
+        ("GET /popular-books/", get("/popular-books/", {"limit": 10})),
+        ("GET /popular-books/?window_days=30", get("/popular-books/", {"limit": 10, "window_days": 30})),
+        ("GET /overdue-transactions/", get("/overdue-transactions/")),
+        ("GET /overdue-loans/", get("/overdue-loans/", {"limit": 50})),
+        ("GET /overdue-loans/upcoming/", get("/overdue-loans/upcoming/", {"limit": 50})),
+        ("GET /loan-policies/", get("/loan-policies/")),
+        ("GET /fines/", get("/fines/", {"limit": 50})),
+        ("GET /fines/{student_id}", get(f"/fines/{fx['history_student_id']}")),
+        ("GET /materialized-views/status/", get("/materialized-views/status/")),
+        ("GET /all-books/", get("/all-books/", {"limit": 50})),
+        ("GET /books/{book_id}/availability", get(f"/books/{fx['checkout_book_id']}/availability")),
+        ("GET /search", get("/search", {"q": fx["term"], "limit": 20})),
+        ("GET /issues/", get("/issues/", {"limit": 50})),
+        ("GET /returns/", get("/returns/", {"limit": 50})),
+        ("GET /user-borrowing-history/{id}", get(f"/user-borrowing-history/{fx['history_student_id']}")),
+        ("GET /issue-report/", get("/issue-report/")),
+        ("GET /cache-stats/", get("/cache-stats/")),
+        ("GET /metrics", get("/metrics")),
+        ("GET /metrics/slow-queries", get("/metrics/slow-queries")),
+        ("POST /checkout/+/return-book/", checkout_then_return),
+        ("POST /add_issue/+/return-book/", add_issue_then_return),
+        ("POST /batch/issue/+/batch/return/", batch_issue_then_return),
+        ("POST /books/{...}+DELETE /books/{id}", insert_then_delete),
+    ]
+    heavy = [("GET /export/issues?format=ndjson", get("/export/issues", {"format": "ndjson"}))]
+    return ([Case(name, "route", fn) for name, fn in cases]
+            + [Case(name, "route", fn, heavy=True) for name, fn in heavy])
+
+
+# measurement
+
+def run_case(case, iterations, concurrency, warmup):
+    for i in range(warmup):
+        with contextlib.suppress(Exception):
+            case.fn(0, i)
+
+    per_worker = [iterations // concurrency + (1 if w < iterations % concurrency else 0) for w in range(concurrency)]
+
+    def worker(w):
+        samples, errors = [], 0
+        for i in range(per_worker[w]):
+            started = time.perf_counter()
+            try:
+                ok = case.fn(w, i)
+            except Exception:
+                ok = False
+            samples.append((time.perf_counter() - started) * 1000)
+            errors += 0 if ok else 1
+        return samples, errors
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(worker, range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    samples = sorted(s for worker_samples, _ in outcomes for s in worker_samples)
+    errors = sum(e for _, e in outcomes)
+
+    def pct(p):
+        return round(samples[min(len(samples) - 1, int(p * len(samples)))], 3) if samples else None
+
+    return {
+        "name": case.name,
+        "kind": case.kind,
+        "calls": len(samples),
+        "errors": errors,
+        "ops_per_sec": round(len(samples) / elapsed, 1) if elapsed else None,
+        "mean_ms": round(statistics.fmean(samples), 3) if samples else None,
+        "p50_ms": pct(0.50),
+        "p90_ms": pct(0.90),
+        "p99_ms": pct(0.99),
+        "max_ms": round(samples[-1], 3) if samples else None,
+    }
+
+
+def compare(results, baseline, threshold, min_delta_ms):
+    """Cases slower (p50/p99) or lower-throughput than the baseline beyond threshold."""
+    base = {c["name"]: c for c in baseline.get("cases", [])}
+    regressions = []
+    for case in results["cases"]:
+        before = base.get(case["name"])
+        if not before or before.get("errors") or case["calls"] == 0:
+            continue
+        for metric in ("p50_ms", "p99_ms"):
+            old, new = before.get(metric), case.get(metric)
+            if old and new and new > old * (1 + threshold) and new - old >= min_delta_ms:
+                regressions.append({"case": case["name"], "metric": metric, "baseline": old, "current": new,
+                                    "change": f"+{(new / old - 1) * 100:.0f}%"})
+        old, new = before.get("ops_per_sec"), case.get("ops_per_sec")
+        if old and new and new < old * (1 - threshold):
+            regressions.append({"case": case["name"], "metric": "ops_per_sec", "baseline": old, "current": new,
+                                "change": f"-{(1 - new / old) * 100:.0f}%"})
+        if case["errors"] and not before.get("errors"):
+            regressions.append({"case": case["name"], "metric": "errors", "baseline": 0, "current": case["errors"]})
+    return regressions
+
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=BENCH_DIR, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seed", action="store_true", help="bootstrap the schema and add a synthetic library first")
+    parser.add_argument("--books", type=int, default=10_000)
+    parser.add_argument("--copies-per-book", type=int, default=3)
+    parser.add_argument("--students", type=int, default=2_000)
+    parser.add_argument("--issues", type=int, default=50_000)
+    parser.add_argument("--random-seed", type=int, default=42, help="datagen seed")
+    parser.add_argument("--iterations", type=int, default=200, help="calls per case")
+    parser.add_argument("--heavy-iterations", type=int, default=5, help="calls per full-scan / refresh case")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--skip-routes", action="store_true")
+    parser.add_argument("--skip-heavy", action="store_true")
+    parser.add_argument("--bust-cache", action="store_true", help="defeat the response cache on GET routes")
+    parser.add_argument("--only", help="run cases whose name contains this substring")
+    parser.add_argument("--output", help="result file (default benchmarks/results/suite-<timestamp>.json)")
+    parser.add_argument("--baseline", help="compare against this result file")
+    parser.add_argument("--save-baseline", action="store_true", help=f"also write results to {DEFAULT_BASELINE}")
+    parser.add_argument("--threshold", type=float, default=0.20, help="allowed relative slowdown (0.20 = 20%%)")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0, help="ignore latency changes smaller than this")
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(sys.stderr):
+        db = LibraryDatabaseManager()
+        dataset = None
+        if args.seed:
+            result = bootstrap_schema(db)
+            if result["status"] == "error":
+                raise SystemExit(f"schema bootstrap failed: {result['message']}")
+            dataset = generate_library(books=args.books, copies_per_book=args.copies_per_book,
+                                       students=args.students, issues=args.issues, seed=args.random_seed)
+
+    fx = load_fixtures(args.concurrency)
+    results = {
+        "suite": "library-benchmarks",
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "git_revision": _git_revision(),
+        "python": platform.python_version(),
+        "dataset": dataset,
+        "config": {k: getattr(args, k) for k in ("iterations", "heavy_iterations", "concurrency", "warmup", "bust_cache")},
+        "cases": [],
+    }
+    try:
+        cases = manager_cases(db, fx, args.concurrency)
+        if not args.skip_routes:
+            cases += route_cases(HttpClient(args.base_url, args.bust_cache), fx, args.concurrency)
+        for case in cases:
+            if (args.skip_heavy and case.heavy) or (args.only and args.only not in case.name):
+                continue
+            iterations = args.heavy_iterations if case.heavy else args.iterations
+            with contextlib.redirect_stdout(sys.stderr):
+                outcome = run_case(case, iterations, args.concurrency, 0 if case.heavy else args.warmup)
+            results["cases"].append(outcome)
+            print(f"{case.name:<55} p50 {outcome['p50_ms']:>9} ms  p99 {outcome['p99_ms']:>9} ms  "
+                  f"{outcome['ops_per_sec']:>8} ops/s  errors {outcome['errors']}", file=sys.stderr)
+    finally:
+        drop_fixture(fx["checkout_book_id"], fx["student_ids"])
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            results["regressions"] = compare(results, json.load(f), args.threshold, args.min_delta_ms)
+        results["baseline"] = args.baseline
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"suite-{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}.json")
+    for path in [output] + ([DEFAULT_BASELINE] if args.save_baseline else []):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    print(f"results written to {output}", file=sys.stderr)
+
+    regressions = results.get("regressions") or []
+    for r in regressions:
+        print(f"REGRESSION {r['case']}: {r['metric']} {r['baseline']} -> {r['current']} {r.get('change', '')}",
+              file=sys.stderr)
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
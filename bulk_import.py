@@ -0,0 +1,205 @@
+"""Bulk catalog import: stream CSV / JSON records into books and book_copies.
+
+Records are processed in chunks of IMPORT_CHUNK_SIZE, one transaction each:
+authors and categories are resolved with one SELECT (plus one INSERT for the
+new names) per chunk, books go in as a single multi-row INSERT and copies
+are loaded with COPY. A chunk that fails in the database is retried row by
+row so one bad record only costs itself; every rejected record is reported
+with its row number.
+
+CLI:
+    python bulk_import.py donation.csv --chunk-size 2000
+    python bulk_import.py donation.ndjson > import_report.json
+
+Accepted fields: title, author_name (or author), category_name (or category),
+isbn, total_copies (default 1), shelf_location.
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import time
+
+from loguru import logger
+from psycopg2.extras import execute_values
+
+from connection import db_connection, init_connection_pool
+from refresh_scheduler import view_refresher
+
+
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "1000"))
+
+
+def read_records(path, fmt=None):
+    """Yield raw record dicts from a .csv, .ndjson/.jsonl (streamed) or .json array file."""
+    fmt = fmt or os.path.splitext(path)[1].lstrip(".").lower()
+    if fmt == "csv":
+        with open(path, newline="", encoding="utf-8") as f:
+            yield from csv.DictReader(f)
+    elif fmt in ("ndjson", "jsonl"):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    elif fmt == "json":
+        with open(path, encoding="utf-8") as f:
+            yield from json.load(f)
+    else:
+        raise ValueError(f"Unsupported import format '{fmt}'")
+
+
+def normalize_record(raw):
+    """Validate one raw record -> (title, author_name, category_name, isbn, total_copies, shelf_location)."""
+    title = (raw.get("title") or "").strip()
+    author_name = (raw.get("author_name") or raw.get("author") or "").strip()
+    category_name = (raw.get("category_name") or raw.get("category") or "").strip()
+    if not title:
+        raise ValueError("missing title")
+    if not author_name:
+        raise ValueError("missing author_name")
+    if not category_name:
+        raise ValueError("missing category_name")
+    try:
+        total_copies = int(raw.get("total_copies") or 1)
+    except (TypeError, ValueError):
+        raise ValueError(f"invalid total_copies {raw.get('total_copies')!r}")
+    if total_copies < 0:
+        raise ValueError("total_copies must be >= 0")
+    isbn = (raw.get("isbn") or "").strip() or None
+    shelf_location = (raw.get("shelf_location") or "").strip() or None
+    return title, author_name, category_name, isbn, total_copies, shelf_location
+
+
+def _resolve_ids(cur, select_sql, insert_sql, names):
+    """Map lower(name) -> id for a batch of names, creating the missing ones in one statement."""
+    wanted = {}
+    for name in names:
+        wanted.setdefault(name.lower(), name)
+    cur.execute(select_sql, (list(wanted),))
+    ids = dict(cur.fetchall())
+    missing = [name for key, name in wanted.items() if key not in ids]
+    if missing:
+        cur.execute(insert_sql, (missing,))
+        ids.update(cur.fetchall())
+    return ids
+
+
+def _copy_escape(value):
+    if value is None:
+        return "\\N"
+    return str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+
+def load_chunk(cur, rows):
+    """Insert normalized rows; returns (books_inserted, copies_inserted)."""
+    author_ids = _resolve_ids(
+        cur,
+        "SELECT LOWER(name), author_id FROM author WHERE LOWER(name) = ANY(%s);",
+        "INSERT INTO author (name, bio) SELECT name, 'Bio not provided' FROM unnest(%s::text[]) AS name "
+        "RETURNING LOWER(name), author_id;",
+        [row[1] for row in rows],
+    )
+    category_ids = _resolve_ids(
+        cur,
+        "SELECT LOWER(name), category_id FROM categories WHERE LOWER(name) = ANY(%s);",
+        "INSERT INTO categories (name) SELECT name FROM unnest(%s::text[]) AS name "
+        "RETURNING LOWER(name), category_id;",
+        [row[2] for row in rows],
+    )
+
+    # take ids from the sequence up front so copies can reference them without RETURNING ordering
+    cur.execute(
+        "SELECT nextval(pg_get_serial_sequence('books', 'book_id')) FROM generate_series(1, %s);",
+        (len(rows),),
+    )
+    book_ids = [r[0] for r in cur.fetchall()]
+
+    execute_values(
+        cur,
+        "INSERT INTO books (book_id, title, author, category, isbn, total_copies) VALUES %s",
+        [
+            (book_id, title, author_ids[author.lower()], category_ids[category.lower()], isbn, copies)
+            for book_id, (title, author, category, isbn, copies, _) in zip(book_ids, rows)
+        ],
+        page_size=len(rows),
+    )
+
+    buffer = io.StringIO()
+    copies_inserted = 0
+    for book_id, (_, _, _, _, copies, shelf_location) in zip(book_ids, rows):
+        line = f"{book_id}\tavailable\t{_copy_escape(shelf_location)}\n"
+        buffer.write(line * copies)
+        copies_inserted += copies
+    buffer.seek(0)
+    cur.copy_expert("COPY book_copies (book_id, status, shelf_location) FROM STDIN", buffer)
+    return len(rows), copies_inserted
+
+
+def _flush(chunk, report):
+    with db_connection() as conn:
+        try:
+            with conn.cursor() as cur:
+                books, copies = load_chunk(cur, [row for _, row in chunk])
+            conn.commit()
+            report["books_inserted"] += books
+            report["copies_inserted"] += copies
+            return
+        except Exception as e:
+            conn.rollback()
+            logger.warning(f"Chunk of {len(chunk)} rows failed ({e}); retrying row by row")
+
+        for row_number, row in chunk:
+            try:
+                with conn.cursor() as cur:
+                    books, copies = load_chunk(cur, [row])
+                conn.commit()
+                report["books_inserted"] += books
+                report["copies_inserted"] += copies
+            except Exception as e:
+                conn.rollback()
+                report["errors"].append({"row": row_number, "error": str(e).strip()})
+
+
+def import_records(records, chunk_size=IMPORT_CHUNK_SIZE):
+    """Import an iterable of raw record dicts; returns a report with rows/sec and per-row errors."""
+    report = {"rows_read": 0, "books_inserted": 0, "copies_inserted": 0, "errors": []}
+    started = time.perf_counter()
+    chunk = []
+    for row_number, raw in enumerate(records, start=1):
+        report["rows_read"] += 1
+        try:
+            chunk.append((row_number, normalize_record(raw)))
+        except ValueError as e:
+            report["errors"].append({"row": row_number, "error": str(e)})
+        if len(chunk) >= chunk_size:
+            _flush(chunk, report)
+            chunk = []
+            logger.info(f"Imported {report['books_inserted']} books ({report['rows_read']} rows read)")
+    if chunk:
+        _flush(chunk, report)
+
+    if report["books_inserted"]:
+        view_refresher.mark_dirty("books")
+    elapsed = time.perf_counter() - started
+    report["seconds"] = round(elapsed, 3)
+    report["rows_per_sec"] = round(report["rows_read"] / elapsed, 1) if elapsed else None
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=["csv", "ndjson", "jsonl", "json"])
+    parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    init_connection_pool()
+    report = import_records(read_records(args.path, args.format), args.chunk_size)
+    json.dump(report, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
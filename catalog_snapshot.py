@@ -0,0 +1,316 @@
+"""In-process catalog snapshot for read-heavy catalog serving.
+
+CATALOG_SNAPSHOT=1 keeps every book in memory as a ``__slots__`` record
+(author / category names interned, so each distinct name is stored once)
+plus a sorted ``(title, book_id)`` key list. ``/all-books/`` pages and the
+``/catalog/`` filters are then a bisect and a short walk instead of the
+books / author / categories / book_availability join.
+
+The snapshot is loaded once and then follows the change feed every
+CATALOG_SNAPSHOT_POLL seconds (sooner after an in-process write). Feed rows
+carry the id of the transaction that wrote them (``change_xid``):
+
+- ``books_audit_log``: updated or deleted books, re-read by id (a missing
+  row is a delete);
+- ``book_availability``: copy counts, and new books (every book gets a
+  counter row on insert), re-read in full when not held yet.
+
+The watermark is the xmin of the last read's snapshot: every transaction
+that was still open then, or started since, has an xid at or above it, so
+reading ``change_xid >= mark`` cannot miss a late commit. Rows committed
+before a long transaction started are read again until it ends; applying a
+change twice is harmless. A full reload every CATALOG_SNAPSHOT_RELOAD
+seconds picks up anything the feeds do not carry (author / category
+renames). Titles sort by code point, which can differ from the database
+collation.
+"""
+import bisect
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+from loguru import logger
+
+from connection import db_connection
+from pagination import BOOKS_KEYSET, build_page, clamp_page_size, decode_cursor
+from refresh_scheduler import view_refresher
+
+
+CATALOG_SNAPSHOT_ENABLED = os.getenv("CATALOG_SNAPSHOT", "0") == "1"
+CATALOG_SNAPSHOT_POLL = float(os.getenv("CATALOG_SNAPSHOT_POLL", "2"))
+CATALOG_SNAPSHOT_RELOAD = float(os.getenv("CATALOG_SNAPSHOT_RELOAD", "900"))
+CATALOG_LOAD_BATCH = 10000
+
+# tables whose writes can change what the snapshot serves
+WATCHED_TABLES = {"books", "book_availability"}
+
+CATALOG_SELECT_SQL = """
+SELECT b.book_id, b.title, a.name, c.name, b.isbn,
+       COALESCE(av.total_copies, 0), COALESCE(av.available_copies, 0)
+FROM books b
+JOIN author a ON b.author = a.author_id
+JOIN categories c ON b.category = c.category_id
+LEFT JOIN book_availability av ON av.book_id = b.book_id
+"""
+
+WATERMARK_SQL = "SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint;"
+
+
+class CatalogBook:
+    __slots__ = ("book_id", "title", "author_name", "category_name", "isbn", "total_copies", "available_copies")
+
+    def __init__(self, book_id, title, author_name, category_name, isbn, total_copies, available_copies):
+        self.book_id = book_id
+        self.title = title
+        self.author_name = author_name
+        self.category_name = category_name
+        self.isbn = isbn
+        self.total_copies = total_copies
+        self.available_copies = available_copies
+
+    def as_dict(self):
+        # same keys as view_books_page(), so either path can serve /all-books/
+        return {
+            "book_id": self.book_id,
+            "title": self.title,
+            "author_name": self.author_name,
+            "category_name": self.category_name,
+            "isbn": self.isbn,
+            "total_copies": self.total_copies,
+            "available_copies": self.available_copies,
+            "issued_copies": self.total_copies - self.available_copies,
+        }
+
+
+def _begin_snapshot(conn):
+    # one MVCC snapshot for every feed read, so a book and its counters agree
+    with conn.cursor() as cur:
+        cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY;")
+
+
+class CatalogSnapshot:
+    """Books held in memory, ordered by (title, book_id), kept current from the change feed."""
+
+    def __init__(self, poll_interval=CATALOG_SNAPSHOT_POLL, reload_interval=CATALOG_SNAPSHOT_RELOAD):
+        self.poll_interval = poll_interval
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+        self._books = {}        # book_id -> CatalogBook
+        self._order = []        # sorted (title, book_id)
+        self._names = {}        # interned author / category names
+        self._mark = 0          # xmin of the snapshot the books were last read in
+        self.loaded_at = None
+        self.last_poll = None
+        self.last_error = None
+        self.reloads = 0
+        self.polls = 0
+        self.changes_applied = 0
+
+    @property
+    def ready(self):
+        return self.loaded_at is not None
+
+    def _intern(self, names, name):
+        return names.setdefault(name, name)
+
+    def _record(self, row, names):
+        book_id, title, author_name, category_name, isbn, total, available = row
+        return CatalogBook(book_id, title, self._intern(names, author_name), self._intern(names, category_name),
+                           isbn, total, available)
+
+    # loading
+
+    def reload(self):
+        """Read the whole catalog into fresh structures, then swap them in."""
+        started = time.perf_counter()
+        books, names = {}, {}
+        with db_connection() as conn:
+            try:
+                _begin_snapshot(conn)
+                with conn.cursor() as cur:
+                    cur.execute(WATERMARK_SQL)
+                    mark = cur.fetchone()[0]
+                with conn.cursor(name=f"catalog_{uuid.uuid4().hex}") as cur:
+                    cur.itersize = CATALOG_LOAD_BATCH
+                    cur.execute(CATALOG_SELECT_SQL)
+                    for row in cur:
+                        books[row[0]] = self._record(row, names)
+            finally:
+                conn.rollback()
+        order = sorted((book.title, book.book_id) for book in books.values())
+        with self._lock:
+            self._books, self._order, self._names, self._mark = books, order, names, mark
+            self.loaded_at = time.time()
+            self.reloads += 1
+        logger.info(f"Catalog snapshot loaded: {len(books)} books in {time.perf_counter() - started:.2f}s.")
+        return len(books)
+
+    def poll(self):
+        """Apply feed entries written since the watermark; returns the number of books touched."""
+        with db_connection() as conn:
+            try:
+                _begin_snapshot(conn)
+                with conn.cursor() as cur:
+                    cur.execute(WATERMARK_SQL)
+                    mark = cur.fetchone()[0]
+                    cur.execute("SELECT DISTINCT book_id FROM books_audit_log WHERE change_xid >= %s::text::xid8;",
+                                (self._mark,))
+                    changed = {book_id for book_id, in cur.fetchall()}
+                    cur.execute("""
+                        SELECT book_id, total_copies, available_copies
+                        FROM book_availability WHERE change_xid >= %s::text::xid8;
+                    """, (self._mark,))
+                    counts = cur.fetchall()
+                    changed.update(book_id for book_id, _, _ in counts if book_id not in self._books)
+                    rows = []
+                    if changed:
+                        cur.execute(CATALOG_SELECT_SQL + " WHERE b.book_id = ANY(%s);", (list(changed),))
+                        rows = cur.fetchall()
+            finally:
+                conn.rollback()
+
+        found = {row[0] for row in rows}
+        touched = 0
+        with self._lock:
+            for row in rows:
+                touched += self._upsert(row)
+            for book_id in changed - found:
+                touched += self._delete(book_id)
+            for book_id, total, available in counts:
+                book = self._books.get(book_id)
+                if book is not None and (book.total_copies, book.available_copies) != (total, available):
+                    book.total_copies, book.available_copies = total, available
+                    touched += 1
+            self._mark = max(self._mark, mark)
+            self.last_poll = time.time()
+            self.polls += 1
+            self.changes_applied += touched
+        return touched
+
+    def _upsert(self, row):
+        # caller holds self._lock
+        book = self._record(row, self._names)
+        old = self._books.get(book.book_id)
+        if old is not None:
+            if all(getattr(old, slot) == getattr(book, slot) for slot in CatalogBook.__slots__):
+                return 0
+            if old.title != book.title:
+                del self._order[bisect.bisect_left(self._order, (old.title, old.book_id))]
+                bisect.insort(self._order, (book.title, book.book_id))
+        else:
+            bisect.insort(self._order, (book.title, book.book_id))
+        self._books[book.book_id] = book
+        return 1
+
+    def _delete(self, book_id):
+        # caller holds self._lock
+        book = self._books.pop(book_id, None)
+        if book is None:
+            return 0
+        del self._order[bisect.bisect_left(self._order, (book.title, book.book_id))]
+        return 1
+
+    # reads
+
+    def _matching_names(self, name):
+        if not name:
+            return None
+        folded = name.casefold()
+        return {n for n in self._names if n.casefold() == folded}
+
+    def page(self, limit=None, cursor=None, author=None, category=None, available_only=False):
+        """One page ordered by title, optionally filtered; same shape as view_books_page()."""
+        limit = clamp_page_size(limit)
+        after = None
+        if cursor:
+            try:
+                after = tuple(decode_cursor(BOOKS_KEYSET, cursor))
+            except ValueError as e:
+                return {"status": "error", "reason": "invalid", "message": str(e)}
+        rows = []
+        with self._lock:
+            authors = self._matching_names(author)
+            categories = self._matching_names(category)
+            order, books = self._order, self._books
+            i = bisect.bisect_right(order, after) if after else 0
+            while i < len(order) and len(rows) <= limit:
+                book = books[order[i][1]]
+                i += 1
+                if authors is not None and book.author_name not in authors:
+                    continue
+                if categories is not None and book.category_name not in categories:
+                    continue
+                if available_only and book.available_copies <= 0:
+                    continue
+                rows.append(book.as_dict())
+        return build_page(BOOKS_KEYSET, rows, limit)
+
+    def get(self, book_id):
+        with self._lock:
+            book = self._books.get(book_id)
+            return book.as_dict() if book else None
+
+    # background refresh
+
+    def notify(self, names):
+        """view_refresher listener: poll now when a watched table was written in this process."""
+        if WATCHED_TABLES.intersection(names):
+            self._wake.set()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                if self.loaded_at is None or time.time() - self.loaded_at >= self.reload_interval:
+                    self.reload()
+                else:
+                    self.poll()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                logger.error(f"Catalog snapshot refresh failed: {e}")
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        view_refresher.add_listener(self.notify)
+        self._thread = threading.Thread(target=self._loop, name="catalog-snapshot", daemon=True)
+        self._thread.start()
+        logger.info("Catalog snapshot refresher started.")
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+            logger.info("Catalog snapshot refresher stopped.")
+
+    def status(self):
+        with self._lock:
+            books = len(self._books)
+            names = len(self._names)
+            mark = self._mark
+        fresh_at = max(filter(None, (self.loaded_at, self.last_poll)), default=None)
+        return {
+            "enabled": self._thread is not None,
+            "books": books,
+            "interned_names": names,
+            "loaded_at": datetime.fromtimestamp(self.loaded_at, timezone.utc).isoformat() if self.loaded_at else None,
+            "age_seconds": round(time.time() - fresh_at, 3) if fresh_at else None,
+            "watermark_xmin": mark,
+            "polls": self.polls,
+            "reloads": self.reloads,
+            "changes_applied": self.changes_applied,
+            "last_error": self.last_error,
+        }
+
+
+catalog_snapshot = CatalogSnapshot()
@@ -0,0 +1,130 @@
+"""Arrow IPC stream / Parquet encoding for export.py sources.
+
+The export query is first run with LIMIT 0 to read its column types, which
+fix the Arrow schema up front: integers, floats, booleans, dates,
+timestamps and numeric(p, s) map to their Arrow types, unconstrained
+numeric (SUM results in the mv_* views) is read as float8 and anything
+else as text. Rows then come off a server-side cursor COLUMNAR_BATCH_ROWS
+at a time, are transposed into one Arrow array per column and written as a
+record batch (a row group for Parquet); the bytes written so far are
+yielded after every batch, so memory stays at one batch.
+
+pyarrow is optional; without it these formats are unavailable.
+"""
+import os
+import uuid
+
+from connection import db_connection
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+
+COLUMNAR_BATCH_ROWS = int(os.getenv("COLUMNAR_BATCH_ROWS", "131072"))
+PARQUET_COMPRESSION = os.getenv("PARQUET_COMPRESSION", "zstd")
+
+# Postgres type OIDs
+_INT2, _INT4, _INT8 = 21, 23, 20
+_FLOAT4, _FLOAT8 = 700, 701
+_BOOL, _NUMERIC = 16, 1700
+_DATE, _TIMESTAMP, _TIMESTAMPTZ = 1082, 1114, 1184
+_TEXT_TYPES = (25, 1042, 1043)   # text, char(n), varchar(n)
+
+
+def columnar_available():
+    return pa is not None
+
+
+def _column(col):
+    """(select expression, Arrow field) for one cursor.description entry."""
+    name = f'"{col.name}"'
+    code = col.type_code
+    simple = {
+        _INT2: pa.int16(), _INT4: pa.int32(), _INT8: pa.int64(),
+        _FLOAT4: pa.float32(), _FLOAT8: pa.float64(), _BOOL: pa.bool_(),
+        _DATE: pa.date32(), _TIMESTAMP: pa.timestamp("us"), _TIMESTAMPTZ: pa.timestamp("us", tz="UTC"),
+    }
+    if code in simple:
+        return name, pa.field(col.name, simple[code])
+    if code in _TEXT_TYPES:
+        return name, pa.field(col.name, pa.string())
+    if code == _NUMERIC:
+        if col.precision and col.precision <= 38:
+            return name, pa.field(col.name, pa.decimal128(col.precision, col.scale or 0))
+        return f"{name}::float8", pa.field(col.name, pa.float64())
+    return f"{name}::text", pa.field(col.name, pa.string())
+
+
+def _record_batch(rows, schema):
+    columns = zip(*rows)
+    return pa.RecordBatch.from_arrays(
+        [pa.array(values, type=field.type) for values, field in zip(columns, schema)], schema=schema,
+    )
+
+
+class _ChunkSink:
+    """Write-only file object that hands back what has been written since the last drain()."""
+
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self._parts.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+
+def stream_columnar(sql, params, fmt, batch_rows=None):
+    """Yield ``sql`` (from export.export_query, %s placeholders) encoded as ``fmt`` ("arrow" or "parquet")."""
+    if pa is None:
+        raise RuntimeError("pyarrow is not installed; arrow / parquet export is unavailable.")
+    batch_rows = batch_rows or COLUMNAR_BATCH_ROWS
+    with db_connection() as conn:
+        try:
+            with conn.cursor() as cur:
+                cur.execute(f"SELECT * FROM ({sql}) AS q LIMIT 0;", params)
+                selects, fields = zip(*(_column(col) for col in cur.description))
+            schema = pa.schema(fields)
+
+            sink = _ChunkSink()
+            out = pa.PythonFile(sink, mode="w")
+            if fmt == "parquet":
+                writer = pq.ParquetWriter(out, schema, compression=PARQUET_COMPRESSION)
+            else:
+                writer = pa.ipc.new_stream(out, schema)
+
+            with conn.cursor(name=f"columnar_{uuid.uuid4().hex}") as cur:
+                cur.itersize = batch_rows
+                cur.execute(f"SELECT {', '.join(selects)} FROM ({sql}) AS q", params)
+                while True:
+                    rows = cur.fetchmany(batch_rows)
+                    if not rows:
+                        break
+                    writer.write_batch(_record_batch(rows, schema))
+                    chunk = sink.drain()
+                    if chunk:
+                        yield chunk
+            writer.close()
+            yield sink.drain()
+        finally:
+            conn.rollback()
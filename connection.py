@@ -1,57 +1,324 @@
 
 import psycopg2
-from psycopg2 import pool
+from psycopg2 import extensions
+import asyncpg
 from loguru import logger
+from collections import deque
+from contextlib import contextmanager
+import threading
+import time
 import os
 
 from dotenv import load_dotenv
+from metrics import METRICS_ENABLED, TimedConnection, asyncpg_query_logger, observe_pool_wait
 load_dotenv()
 
 
 DATABASE_URL = os.getenv("DATABASE_URL")
+POOL_MIN_SIZE = int(os.getenv("POOL_MIN_SIZE", "1"))
+POOL_MAX_SIZE = int(os.getenv("POOL_MAX_SIZE", "10"))
+POOL_ACQUIRE_TIMEOUT = float(os.getenv("POOL_ACQUIRE_TIMEOUT", "30"))
+POOL_MAX_LIFETIME = float(os.getenv("POOL_MAX_LIFETIME", "1800"))
+POOL_VALIDATE_AFTER_IDLE = float(os.getenv("POOL_VALIDATE_AFTER_IDLE", "30"))
+ASYNC_POOL_MIN_SIZE = int(os.getenv("ASYNC_POOL_MIN_SIZE", "1"))
+ASYNC_POOL_MAX_SIZE = int(os.getenv("ASYNC_POOL_MAX_SIZE", "10"))
+
+
+def _connect(dsn):
+    # TimedConnection cursors feed per-statement latency into metrics
+    return psycopg2.connect(dsn, connection_factory=TimedConnection if METRICS_ENABLED else None)
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection could be checked out within the acquire timeout."""
+
+
+class LibraryConnectionPool:
+    """Thread-safe, bounded psycopg2 pool.
+
+    Callers that find every connection checked out queue on a condition
+    variable for up to ``timeout`` seconds instead of failing immediately.
+    Connections are validated on checkout when they have been idle longer than
+    ``validate_after_idle`` seconds (0 validates every checkout) and are
+    recycled once they are older than ``max_lifetime`` seconds.
+    """
+
+    def __init__(self, minconn, maxconn, dsn, timeout=POOL_ACQUIRE_TIMEOUT,
+                 max_lifetime=POOL_MAX_LIFETIME, validate_after_idle=POOL_VALIDATE_AFTER_IDLE):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError(f"Invalid pool bounds min={minconn} max={maxconn}")
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.dsn = dsn
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.validate_after_idle = validate_after_idle
+
+        self._cond = threading.Condition()
+        self._idle = deque()        # (conn, released_at), oldest release first
+        self._created = {}          # id(conn) -> created_at for every open connection
+        self._in_use = set()        # id(conn) of checked-out connections
+        self._size = 0              # open connections, including ones being opened
+        self._closed = False
+
+        for _ in range(minconn):
+            conn = _connect(self.dsn)
+            self._created[id(conn)] = time.monotonic()
+            self._size += 1
+            self._idle.append((conn, time.monotonic()))
+
+    def _discard(self, conn):
+        # caller holds self._cond
+        self._created.pop(id(conn), None)
+        self._size -= 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _is_healthy(self, conn, released_at):
+        if conn.closed:
+            return False
+        now = time.monotonic()
+        if self.max_lifetime and now - self._created.get(id(conn), now) > self.max_lifetime:
+            return False
+        if now - released_at >= self.validate_after_idle:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT 1")
+                conn.rollback()
+            except Exception:
+                return False
+        return True
+
+    def getconn(self, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        while True:
+            conn = None
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise Exception("Connection pool is closed.")
+                    if self._idle:
+                        conn, released_at = self._idle.popleft()
+                        break
+                    if self._size < self.maxconn:
+                        self._size += 1     # reserve the slot, connect outside the lock
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolTimeout(
+                            f"Timed out after {timeout}s waiting for a connection "
+                            f"({self.maxconn} in use)"
+                        )
+                    self._cond.wait(remaining)
+
+            if conn is None:
+                try:
+                    conn = _connect(self.dsn)
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self._created[id(conn)] = time.monotonic()
+                    self._in_use.add(id(conn))
+                return conn
+
+            # validate outside the lock; a bad connection frees its slot and we retry
+            if self._is_healthy(conn, released_at):
+                with self._cond:
+                    self._in_use.add(id(conn))
+                return conn
+            with self._cond:
+                self._discard(conn)
+                self._cond.notify()
+
+    def putconn(self, conn, close=False):
+        if id(conn) not in self._in_use:
+            raise Exception("Trying to put unkeyed connection")
+        reusable = not (close or conn.closed)
+        if reusable:
+            status = conn.info.transaction_status
+            if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                reusable = False
+            elif status != extensions.TRANSACTION_STATUS_IDLE:
+                # caller left a transaction open (e.g. a bare SELECT); do not leak it
+                try:
+                    conn.rollback()
+                except Exception:
+                    reusable = False
+        with self._cond:
+            self._in_use.discard(id(conn))
+            if reusable and not self._closed:
+                self._idle.append((conn, time.monotonic()))
+            else:
+                self._discard(conn)
+            self._cond.notify()
+
+    def closeall(self):
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                conn, _ = self._idle.popleft()
+                self._discard(conn)
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "min_size": self.minconn,
+                "max_size": self.maxconn,
+                "open": self._size,
+                "idle": len(self._idle),
+                "in_use": len(self._in_use),
+            }
 
 
 connection_pool = None
+async_connection_pool = None
 
 def init_connection_pool():
     
     global connection_pool
+    if connection_pool:
+        return connection_pool
     try:
-        connection_pool = psycopg2.pool.SimpleConnectionPool(
-            1, 10, dsn=DATABASE_URL
+        connection_pool = LibraryConnectionPool(
+            POOL_MIN_SIZE, POOL_MAX_SIZE, dsn=DATABASE_URL
         )
         if connection_pool:
             logger.info(" PostgreSQL connection pool established successfully ")
+        return connection_pool
     except Exception as e:
         logger.error(f" Error creating connection pool: {e}")
         raise
 
-def get_connection():
+def get_connection(timeout=None):
     
     try:
         if not connection_pool:
             raise Exception("Connection pool not initialized.")
-        conn = connection_pool.getconn()
+        started = time.perf_counter()
+        conn = connection_pool.getconn(timeout)
+        observe_pool_wait("psycopg2", time.perf_counter() - started)
         return conn
     except Exception as e:
         logger.error(f" Error getting connection: {e}")
         raise
 
-def release_connection(conn):
+def release_connection(conn, close=False):
     
     try:
         if connection_pool and conn:
-            connection_pool.putconn(conn)
+            connection_pool.putconn(conn, close=close)
     except Exception as e:
         logger.warning(f"Error releasing connection: {e}")
 
+@contextmanager
+def db_connection(timeout=None):
+    """Check out a pooled connection for the duration of a ``with`` block."""
+    conn = get_connection(timeout)
+    try:
+        yield conn
+    finally:
+        release_connection(conn)
+
 def close_connection_pool():
     
     global connection_pool
     if connection_pool:
         connection_pool.closeall()
+        connection_pool = None
         logger.info("PostgreSQL connection pool closed.")
 
 
+# ASYNC POOL (asyncpg) - used by AsyncLibraryDatabaseManager / FastAPI handlers
+
+class _TimedAcquire:
+    """``async with pool.acquire()`` that records how long the checkout waited."""
+
+    def __init__(self, pool, timeout):
+        self._pool = pool
+        self._timeout = timeout
+        self._conn = None
+
+    async def __aenter__(self):
+        started = time.perf_counter()
+        self._conn = await self._pool.acquire(timeout=self._timeout)
+        observe_pool_wait("asyncpg", time.perf_counter() - started)
+        return self._conn
+
+    async def __aexit__(self, *exc_info):
+        await self._pool.release(self._conn)
+
+
+class TimedAsyncPool:
+    """Thin wrapper over asyncpg.Pool whose acquire() is timed; everything else passes through."""
+
+    def __init__(self, pool):
+        self._pool = pool
+
+    def acquire(self, *, timeout=None):
+        return _TimedAcquire(self._pool, timeout)
+
+    def __getattr__(self, name):
+        return getattr(self._pool, name)
+
+
+async def _init_async_connection(conn):
+    # add_query_logger arrived in asyncpg 0.29; older versions just skip statement timing
+    if METRICS_ENABLED and hasattr(conn, "add_query_logger"):
+        conn.add_query_logger(asyncpg_query_logger)
+
+
+async def init_async_connection_pool():
+
+    global async_connection_pool
+    if async_connection_pool:
+        return async_connection_pool
+    try:
+        async_connection_pool = await asyncpg.create_pool(
+            dsn=DATABASE_URL,
+            min_size=ASYNC_POOL_MIN_SIZE,
+            max_size=ASYNC_POOL_MAX_SIZE,
+            init=_init_async_connection,
+        )
+        logger.info(" asyncpg connection pool established successfully ")
+        return async_connection_pool
+    except Exception as e:
+        logger.error(f" Error creating async connection pool: {e}")
+        raise
+
+def get_async_pool():
+
+    if not async_connection_pool:
+        raise Exception("Async connection pool not initialized.")
+    return TimedAsyncPool(async_connection_pool)
+
+def pool_stats():
+    """Open / idle / in-use connection counts for whichever pools are initialised."""
+    stats = {}
+    if connection_pool:
+        stats["psycopg2"] = connection_pool.stats()
+    if async_connection_pool:
+        size = async_connection_pool.get_size()
+        idle = async_connection_pool.get_idle_size()
+        stats["asyncpg"] = {
+            "min_size": async_connection_pool.get_min_size(),
+            "max_size": async_connection_pool.get_max_size(),
+            "open": size,
+            "idle": idle,
+            "in_use": size - idle,
+        }
+    return stats
 
+async def close_async_connection_pool():
 
+    global async_connection_pool
+    if async_connection_pool:
+        await async_connection_pool.close()
+        async_connection_pool = None
+        logger.info("asyncpg connection pool closed.")
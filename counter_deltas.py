@@ -0,0 +1,100 @@
+"""Background fold of the per-book counter deltas.
+
+Checkouts, returns and copy changes only append rows to the delta tables
+(book_availability_deltas, book_popularity_deltas); nothing on the checkout
+path updates a per-title counter row, so concurrent checkouts of one title
+never queue on it. LibraryDatabaseManager.apply_counter_deltas() folds the
+committed deltas into the per-book rows in one set-based statement per
+table. This module calls it every COUNTER_APPLY_INTERVAL seconds on a
+background thread, so the catalog and top-N counters trail the copy and
+issue tables by about that much; and from the command line after a bulk
+load:
+
+    python counter_deltas.py
+
+Several app workers applying at once is harmless: each delta row is deleted,
+and so applied, by exactly one of them.
+"""
+import contextlib
+import json
+import os
+import sys
+import threading
+from datetime import datetime
+
+from loguru import logger
+
+from query import LibraryDatabaseManager
+
+
+COUNTER_APPLY_INTERVAL = float(os.getenv("COUNTER_APPLY_INTERVAL", "1"))
+
+
+class CounterDeltaApplier:
+    """Calls ``apply()`` every ``interval`` seconds; ``last_result`` keeps the outcome for status endpoints."""
+
+    def __init__(self, interval=COUNTER_APPLY_INTERVAL):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self._apply = None
+        self.last_result = None
+        self.last_error = None
+
+    def run_now(self):
+        try:
+            result = self._apply()
+        except Exception as e:
+            result = {"status": "error", "message": str(e)}
+        self.last_result = {"at": datetime.now().isoformat(), **result}
+        if result["status"] == "error":
+            # only log a new failure, not the same one every interval
+            if result["message"] != self.last_error:
+                logger.error(f"Applying counter deltas failed: {result['message']}")
+            self.last_error = result["message"]
+        else:
+            self.last_error = None
+        return result
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self.run_now()
+
+    def start(self, apply):
+        """Start the background thread; ``apply()`` does the work (LibraryDatabaseManager.apply_counter_deltas)."""
+        if self.interval <= 0 or (self._thread and self._thread.is_alive()):
+            return
+        self._apply = apply
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="counter-deltas", daemon=True)
+        self._thread.start()
+        logger.info(f"Counter deltas applied every {self.interval}s.")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def status(self):
+        return {
+            "interval_seconds": self.interval,
+            "running": self._thread is not None,
+            "last_result": self.last_result,
+        }
+
+
+counter_applier = CounterDeltaApplier()
+
+
+def main():
+    with contextlib.redirect_stdout(sys.stderr):
+        db = LibraryDatabaseManager()
+    result = db.apply_counter_deltas()
+    json.dump(result, sys.stdout, indent=2, default=str)
+    sys.stdout.write("\n")
+    sys.exit(0 if result["status"] == "success" else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,471 @@
+"""Synthetic library generator: authors, categories, books, copies, students, issues and returns.
+
+Everything is drawn from one ``random.Random(seed)``, so the same arguments
+produce the same library (row ids follow the tables' sequences, so they are
+offset by whatever the database already holds). Shape of the data:
+
+- popularity is Zipfian: book ranks are a seeded shuffle of the catalog and
+  issues pick books with weight 1/rank**s, so a few titles take most of the
+  loans; authors and categories are skewed the same way, students mildly;
+- popular titles get more copies, and a copy is never lent twice at once:
+  when every copy of the drawn title is out, another title is drawn;
+- loans follow the calendar (fewer on weekends, a term-time swell) over the
+  last ``days`` days; most come back within LOAN_DAYS, OVERDUE_RATE of them
+  late with a long tail, LOST_RATE never; late returns carry
+  ``fine_per_day`` per day late and loans not back yet stay open.
+
+Rows are loaded with COPY in chunks of DATAGEN_CHUNK_ROWS. The row triggers
+on books / issues / returns are disabled while loading (one trigger call
+per row would dominate the run) and their effects are applied set-based
+afterwards: books_backup rows, the book_search index, counter rows for
+books without copies, copy status, due dates, the popularity counters and
+the fine balances. book_copies keeps its statement-level availability
+triggers, so each COPY chunk appends its availability deltas; they are
+folded into book_availability once at the end. Meant for scratch
+and benchmark databases: it reserves id ranges from the sequences and takes
+table locks, so run it without other writers.
+
+CLI:
+    python datagen.py --books 1000000 --students 200000 --issues 5000000
+    python datagen.py --books 20000 --issues 200000 --seed 7 > datagen_report.json
+"""
+import argparse
+import bisect
+import io
+import itertools
+import json
+import math
+import os
+import random
+import sys
+import time
+from array import array
+from datetime import date, timedelta
+
+from loguru import logger
+
+from connection import db_connection, init_connection_pool
+from query import DEFAULT_FINE_PER_DAY, DEFAULT_LOAN_DAYS, LibraryDatabaseManager
+from refresh_scheduler import MATERIALIZED_VIEWS
+
+
+DATAGEN_CHUNK_ROWS = int(os.getenv("DATAGEN_CHUNK_ROWS", "100000"))
+
+LOAN_DAYS = DEFAULT_LOAN_DAYS   # no loan_policies rows exist for generated categories
+OVERDUE_RATE = 0.18
+LATE_MEAN_DAYS = 9       # mean days late for an overdue return (exponential tail)
+LOST_RATE = 0.005
+
+TRIGGER_TABLES = ("books", "issues", "returns")
+
+FIRST_NAMES = [
+    "Aarav", "Ananya", "Ben", "Chen", "Diya", "Elena", "Farah", "Gabriel", "Hana", "Ishaan",
+    "Julia", "Kenji", "Laila", "Mateo", "Nadia", "Omar", "Priya", "Quinn", "Rohan", "Sara",
+    "Tariq", "Uma", "Victor", "Wei", "Ximena", "Yusuf", "Zara", "Arjun", "Meera", "Noah",
+]
+LAST_NAMES = [
+    "Banerjee", "Okafor", "Schmidt", "Tanaka", "Garcia", "Rossi", "Kowalski", "Haddad", "Iyer", "Novak",
+    "Mendes", "Larsen", "Kim", "Dubois", "Mandal", "Petrov", "Osei", "Nguyen", "Fischer", "Sato",
+    "Reyes", "Das", "Moreau", "Ali", "Costa", "Berg", "Chatterjee", "Ward", "Silva", "Hughes",
+]
+TITLE_WORDS = [
+    "history", "quantum", "garden", "algorithms", "shadow", "river", "empire", "machine",
+    "silent", "kingdom", "ocean", "theory", "winter", "dragon", "network", "modern",
+    "ancient", "journey", "physics", "secret", "storm", "language", "mountain", "data",
+    "poetry", "economics", "night", "crystal", "biology", "forest", "glass", "engine",
+]
+CATEGORY_NAMES = [
+    "Computer Science", "Mathematics", "Physics", "Chemistry", "Biology", "History", "Economics",
+    "Literature", "Poetry", "Philosophy", "Psychology", "Engineering", "Medicine", "Law", "Art",
+    "Music", "Geography", "Politics", "Sociology", "Fantasy", "Science Fiction", "Mystery",
+    "Biography", "Travel", "Cooking", "Languages", "Statistics", "Astronomy", "Architecture", "Education",
+]
+DEPARTMENTS = [
+    "Computer Science", "Electrical", "Mechanical", "Civil", "Mathematics", "Physics", "Chemistry",
+    "Biology", "Economics", "English", "History", "Architecture",
+]
+
+
+class ZipfSampler:
+    """Draw indexes 0..n-1 with weight 1/rank**s; ranks are a seeded shuffle, so index 0 is not the favourite."""
+
+    def __init__(self, n, s, rng):
+        self.n = n
+        self.rank_to_index = list(range(n))
+        rng.shuffle(self.rank_to_index)
+        self.cum_weights = list(itertools.accumulate(1.0 / (rank ** s) for rank in range(1, n + 1)))
+        self.rng = rng
+
+    def ranks(self, k):
+        total = self.cum_weights[-1]
+        cum = self.cum_weights
+        random_ = self.rng.random
+        return [bisect.bisect_left(cum, random_() * total) for _ in range(k)]
+
+    def sample(self, k):
+        order = self.rank_to_index
+        return [order[rank] for rank in self.ranks(k)]
+
+
+def _copy_escape(value):
+    if value is None:
+        return "\\N"
+    return str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+
+def _copy_rows(cur, table, columns, rows):
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join(_copy_escape(v) for v in row))
+        buffer.write("\n")
+    buffer.seek(0)
+    cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", buffer)
+
+
+def _reserve_ids(cur, table, column, count):
+    """First id of a block of ``count`` ids taken from the column's sequence."""
+    if count <= 0:
+        return None
+    cur.execute(
+        "SELECT setval(pg_get_serial_sequence(%s, %s), nextval(pg_get_serial_sequence(%s, %s)) + %s - 1);",
+        (table, column, table, column, count),
+    )
+    return cur.fetchone()[0] - count + 1
+
+
+def _load_chunked(conn, table, id_column, columns, rows, report_key, report, finish=None):
+    """COPY an iterable of row tuples (without the id) in chunks; returns the assigned ids in order.
+
+    ``finish(row_id, row)`` can fill columns derived from the id (unique ISBNs, emails).
+    """
+    first_ids = []
+    with conn.cursor() as cur:
+        for chunk in _chunks(rows, DATAGEN_CHUNK_ROWS):
+            first = _reserve_ids(cur, table, id_column, len(chunk))
+            if finish:
+                chunk = [finish(first + i, row) for i, row in enumerate(chunk)]
+            _copy_rows(cur, table, (id_column,) + columns,
+                       ((first + i,) + row for i, row in enumerate(chunk)))
+            conn.commit()
+            first_ids.append((first, len(chunk)))
+            report[report_key] += len(chunk)
+    return [first + i for first, n in first_ids for i in range(n)]
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _existing_names(conn, table):
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT LOWER(name) FROM {table};")
+        names = {row[0] for row in cur.fetchall()}
+    conn.rollback()
+    return names
+
+
+def _unique_names(count, make, seen):
+    """``count`` names from ``make(i)``, numbered where they clash with each other or with ``seen``."""
+    names = []
+    next_suffix = {}
+    for i in range(count):
+        base = name = make(i)
+        suffix = next_suffix.get(base, 2)
+        while name.lower() in seen:
+            name = f"{base} {suffix}"
+            suffix += 1
+        next_suffix[base] = suffix
+        seen.add(name.lower())
+        names.append(name)
+    return names
+
+
+def _daily_volumes(issues, days, start):
+    """Split ``issues`` over the calendar: weekends quieter, a swell during term."""
+    weights = []
+    for d in range(days):
+        day = start + timedelta(days=d)
+        weight = 0.4 if day.weekday() >= 5 else 1.0
+        weight *= 1.0 + 0.35 * math.sin(2 * math.pi * (day.timetuple().tm_yday - 30) / 365)
+        weights.append(weight)
+    total = sum(weights)
+    volumes, carry = [], 0.0
+    for weight in weights:
+        exact = issues * weight / total + carry
+        count = int(exact)
+        carry = exact - count
+        volumes.append(count)
+    return volumes
+
+
+def _loan_length(rng):
+    """Days a copy is kept, or None if it never comes back."""
+    roll = rng.random()
+    if roll < LOST_RATE:
+        return None
+    if roll < LOST_RATE + OVERDUE_RATE:
+        return LOAN_DAYS + 1 + int(rng.expovariate(1.0 / LATE_MEAN_DAYS))
+    # on-time returns bunch up just before the due date
+    return max(1, min(LOAN_DAYS, int(rng.triangular(1, LOAN_DAYS + 1, LOAN_DAYS - 2))))
+
+
+def _set_user_triggers(conn, enabled):
+    with conn.cursor() as cur:
+        for table in TRIGGER_TABLES:
+            cur.execute(f"ALTER TABLE {table} {'ENABLE' if enabled else 'DISABLE'} TRIGGER USER;")
+    conn.commit()
+
+
+def generate_library(
+    books=100_000,
+    authors=None,
+    categories=30,
+    copies_per_book=3,
+    students=20_000,
+    issues=1_000_000,
+    days=730,
+    zipf_s=1.1,
+    fine_per_day=float(DEFAULT_FINE_PER_DAY),
+    seed=42,
+    keep_triggers=False,
+    refresh_views=True,
+):
+    """Generate and load a library; returns a report with row counts and timings."""
+    rng = random.Random(seed)
+    authors = authors or max(1, books // 8)
+    today = date.today()
+    start = today - timedelta(days=days)
+    report = {
+        "seed": seed,
+        "authors": 0, "categories": 0, "books": 0, "copies": 0, "students": 0,
+        "issues": 0, "returns": 0, "open_issues": 0, "overdue_open": 0, "late_returns": 0,
+        "unplaced_issues": 0,
+        "timings": {},
+    }
+    started = time.perf_counter()
+
+    def lap(name, since):
+        report["timings"][name] = round(time.perf_counter() - since, 3)
+        return time.perf_counter()
+
+    with db_connection() as conn:
+        if not keep_triggers:
+            _set_user_triggers(conn, enabled=False)
+        try:
+            t = time.perf_counter()
+            # names stay unique so lookups by name (insert_book, bulk import) resolve to one row
+            author_names = _unique_names(authors, lambda i: f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+                                         _existing_names(conn, "author"))
+            author_ids = _load_chunked(conn, "author", "author_id", ("name", "bio"),
+                                       ((name, "Bio not provided") for name in author_names), "authors", report)
+            category_names = _unique_names(categories, lambda i: CATEGORY_NAMES[i % len(CATEGORY_NAMES)],
+                                           _existing_names(conn, "categories"))
+            category_ids = _load_chunked(conn, "categories", "category_id", ("name",),
+                                         ((name,) for name in category_names), "categories", report)
+            t = lap("authors_categories", t)
+
+            # catalog: titles, skewed authorship and category sizes, more copies for popular titles
+            book_popularity = ZipfSampler(books, zipf_s, rng)
+            author_pick = ZipfSampler(len(author_ids), 0.9, rng)
+            category_pick = ZipfSampler(len(category_ids), 0.8, rng)
+            book_authors = author_pick.sample(books)
+            book_categories = category_pick.sample(books)
+            copy_counts = array("i", [0] * books)
+            top = max(1, books // 100)
+            for rank, index in enumerate(book_popularity.rank_to_index):
+                copies = max(1, int(rng.expovariate(1.0 / copies_per_book) + 0.5))
+                copy_counts[index] = copies * 4 if rank < top else copies
+
+            def book_rows():
+                for i in range(books):
+                    words = rng.sample(TITLE_WORDS, rng.randint(2, 4))
+                    yield (
+                        " ".join(words).title(),
+                        author_ids[book_authors[i]],
+                        category_ids[book_categories[i]],
+                        None,
+                        copy_counts[i],
+                    )
+
+            book_ids = _load_chunked(conn, "books", "book_id",
+                                     ("title", "author", "category", "isbn", "total_copies"),
+                                     book_rows(), "books", report,
+                                     finish=lambda book_id, row: row[:3] + (f"DG{book_id:011d}",) + row[4:])
+            t = lap("books", t)
+
+            copy_first = array("i", [0] * books)   # index into copy_ids of each book's first copy
+            position = 0
+            for i in range(books):
+                copy_first[i] = position
+                position += copy_counts[i]
+            copy_ids = _load_chunked(
+                conn, "book_copies", "copy_id", ("book_id", "status", "shelf_location"),
+                ((book_ids[i], "available", f"{chr(65 + book_categories[i] % 26)}{book_categories[i]}-{i % 200}")
+                 for i in range(books) for _ in range(copy_counts[i])),
+                "copies", report,
+            )
+            t = lap("copies", t)
+
+            student_ids = _load_chunked(
+                conn, "student", "student_id", ("name", "department", "email", "phone"),
+                ((f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}", rng.choice(DEPARTMENTS), None,
+                  f"9{rng.randrange(10 ** 9):09d}") for _ in range(students)),
+                "students", report,
+                finish=lambda student_id, row: row[:2] + (f"dg-{student_id}@example.invalid",) + row[3:],
+            )
+            t = lap("students", t)
+
+            # loans in calendar order; busy_until[copy] is the first day the copy is back on the shelf
+            reader = ZipfSampler(len(student_ids), 0.6, rng)
+            busy_until = array("i", [0] * len(copy_ids))
+            never = 1 << 30
+            today_n = today.toordinal()
+
+            def loans():
+                for d, volume in enumerate(_daily_volumes(issues, days, start)):
+                    day = start + timedelta(days=d)
+                    day_n = day.toordinal()
+                    for book, student in zip(book_popularity.sample(volume), reader.sample(volume)):
+                        copy = None
+                        for attempt in range(3):
+                            first, count = copy_first[book], copy_counts[book]
+                            offset = rng.randrange(count)
+                            for k in range(count):
+                                candidate = first + (offset + k) % count
+                                if busy_until[candidate] <= day_n:
+                                    copy = candidate
+                                    break
+                            if copy is not None:
+                                break
+                            book = book_popularity.sample(1)[0]
+                        if copy is None:
+                            report["unplaced_issues"] += 1
+                            continue
+                        held = _loan_length(rng)
+                        returned_n = None if held is None else day_n + held
+                        if returned_n is not None and returned_n <= today_n:
+                            busy_until[copy] = returned_n
+                            late = max(0, held - LOAN_DAYS)
+                            yield (student_ids[student], copy_ids[copy], day, date.fromordinal(returned_n),
+                                   round(late * fine_per_day, 2))
+                            report["late_returns"] += 1 if late else 0
+                        else:
+                            busy_until[copy] = never
+                            yield (student_ids[student], copy_ids[copy], day, None, None)
+                            report["open_issues"] += 1
+                            report["overdue_open"] += 1 if day_n + LOAN_DAYS < today_n else 0
+
+            with conn.cursor() as cur:
+                for chunk in _chunks(loans(), DATAGEN_CHUNK_ROWS):
+                    first = _reserve_ids(cur, "issues", "issue_id", len(chunk))
+                    _copy_rows(cur, "issues", ("issue_id", "student_id", "copy_id", "issue_date", "returned"),
+                               ((first + i, s, c, d, "no" if r is None else "yes")
+                                for i, (s, c, d, r, _) in enumerate(chunk)))
+                    returned = [(first + i, r, fine) for i, (_, _, _, r, fine) in enumerate(chunk) if r is not None]
+                    if returned:
+                        return_first = _reserve_ids(cur, "returns", "return_id", len(returned))
+                        _copy_rows(cur, "returns", ("return_id", "issue_id", "return_date", "fine_amount"),
+                                   ((return_first + j,) + row for j, row in enumerate(returned)))
+                    conn.commit()
+                    report["issues"] += len(chunk)
+                    report["returns"] += len(returned)
+                    logger.info(f"datagen: {report['issues']} issues loaded")
+            t = lap("issues_returns", t)
+
+            if not keep_triggers:
+                # what the disabled row triggers would have done, set-based
+                with conn.cursor() as cur:
+                    cur.execute("""
+                        INSERT INTO books_backup (book_id, title, author, category, isbn, total_copies, backup_date)
+                        SELECT book_id, title, author, category, isbn, total_copies, CURRENT_TIMESTAMP
+                        FROM books WHERE book_id BETWEEN %s AND %s;
+                    """, (book_ids[0], book_ids[-1]))
+                    conn.commit()
+        finally:
+            if not keep_triggers:
+                _set_user_triggers(conn, enabled=True)
+
+        with conn.cursor() as cur:
+            # open loans: copy is out (one UPDATE, so one pass of the availability trigger)
+            cur.execute("""
+                UPDATE book_copies bc SET status = 'issue'
+                FROM issues i
+                WHERE i.copy_id = bc.copy_id AND i.returned = 'no'
+                  AND bc.book_id BETWEEN %(first)s AND %(last)s;
+            """, {"first": book_ids[0], "last": book_ids[-1]})
+            if not keep_triggers:
+                # trg_book_search_books and trg_books_add_availability were off
+                # with the rest of the books triggers
+                cur.execute("""
+                    INSERT INTO book_availability (book_id)
+                    SELECT book_id FROM books WHERE book_id BETWEEN %s AND %s
+                    ON CONFLICT (book_id) DO NOTHING;
+                """, (book_ids[0], book_ids[-1]))
+                cur.execute(
+                    "SELECT refresh_book_search(ARRAY(SELECT book_id FROM books WHERE book_id BETWEEN %s AND %s));",
+                    (book_ids[0], book_ids[-1]),
+                )
+            # fold the copy deltas of every COPY chunk and the UPDATE above in one pass
+            cur.execute("SELECT apply_availability_deltas();")
+            conn.commit()
+        t = lap("derived_state", t)
+
+    db = LibraryDatabaseManager()
+    if not keep_triggers:
+        db.backfill_due_dates()
+        db.backfill_book_popularity()
+        db.rebuild_fine_balances()
+    with db_connection() as conn:
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("ANALYZE author, categories, books, book_copies, student, issues, returns;")
+        finally:
+            conn.autocommit = False
+    if refresh_views:
+        for view in MATERIALIZED_VIEWS:
+            db.refresh_materialized_view(view, concurrently=False)
+    lap("popularity_analyze_views", t)
+
+    elapsed = time.perf_counter() - started
+    report["seconds"] = round(elapsed, 3)
+    report["rows_per_sec"] = round(
+        sum(report[k] for k in ("authors", "categories", "books", "copies", "students", "issues", "returns"))
+        / elapsed, 1) if elapsed else None
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--books", type=int, default=100_000)
+    parser.add_argument("--authors", type=int, help="default: books / 8")
+    parser.add_argument("--categories", type=int, default=30)
+    parser.add_argument("--copies-per-book", type=float, default=3, help="mean copies per title")
+    parser.add_argument("--students", type=int, default=20_000)
+    parser.add_argument("--issues", type=int, default=1_000_000)
+    parser.add_argument("--days", type=int, default=730, help="length of the loan history")
+    parser.add_argument("--zipf", type=float, default=1.1, help="popularity skew exponent")
+    parser.add_argument("--fine-per-day", type=float, default=float(DEFAULT_FINE_PER_DAY))
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--keep-triggers", action="store_true", help="load with the row triggers enabled (slow)")
+    parser.add_argument("--no-refresh", action="store_true", help="skip refreshing the mv_* views")
+    args = parser.parse_args()
+
+    init_connection_pool()
+    report = generate_library(
+        books=args.books, authors=args.authors, categories=args.categories,
+        copies_per_book=args.copies_per_book, students=args.students, issues=args.issues,
+        days=args.days, zipf_s=args.zipf, fine_per_day=args.fine_per_day, seed=args.seed,
+        keep_triggers=args.keep_triggers, refresh_views=not args.no_refresh,
+    )
+    json.dump(report, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
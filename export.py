@@ -0,0 +1,187 @@
+"""Streaming NDJSON / CSV export of large tables and mv_* views.
+
+Rows come from a server-side cursor in batches of EXPORT_BATCH_SIZE, are
+encoded batch by batch and handed straight to the response (or stdout), so
+memory stays bounded no matter how many rows the source has. Any source can
+be pruned to some columns and, where it has a date column, cut to a date
+range. The ``arrow`` / ``parquet`` formats are written by columnar_export.
+
+CLI:
+    python export.py issues --format csv > issues.csv
+    python export.py mv_issued_report --format ndjson > report.ndjson
+    python export.py issues --format parquet --from 2024-01-01 --to 2024-12-31 -o issues_2024.parquet
+"""
+import argparse
+import contextlib
+import csv
+import decimal
+import io
+import json
+import os
+import re
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "5000"))
+
+# source -> (ORDER BY, column that date_from / date_to filter on)
+EXPORT_SOURCES = {
+    "issues": ("issue_id", "issue_date"),
+    "returns": ("return_id", "return_date"),
+    "books_audit_log": ("log_id", "action_time"),
+    "backup_audit_log": ("log_id", "timestamp"),
+    "mv_popular_books": ("total_issues DESC", None),
+    "mv_overdue_transactions": (None, "issue_date"),
+    "mv_all_books_summary": (None, None),
+    "mv_user_borrowing_history": (None, "issue_date"),
+    "mv_issued_report": (None, None),
+}
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+}
+COLUMNAR_FORMATS = ("arrow", "parquet")
+
+_IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def parse_columns(value):
+    """"a, b" -> ["a", "b"]; None or "" -> None (every column)."""
+    columns = [c.strip() for c in (value or "").split(",") if c.strip()]
+    bad = [c for c in columns if not _IDENTIFIER.match(c)]
+    if bad:
+        raise ValueError(f"Invalid column name(s): {', '.join(bad)}")
+    return columns or None
+
+
+def check_columns(columns, available):
+    unknown = [c for c in columns or () if c not in available]
+    if unknown:
+        raise ValueError(f"Unknown column(s): {', '.join(unknown)}; available: {', '.join(available)}")
+
+
+def export_query(source, columns=None, date_from=None, date_to=None, placeholder="%s", ordered=True):
+    """(sql, params) for ``source``; ``date_to`` is inclusive.
+
+    ``placeholder`` is "%s" for psycopg2 or "$" for asyncpg's numbered
+    parameters. ``columns`` must already be checked against the source.
+    """
+    order_by, date_column = EXPORT_SOURCES[source]
+    if (date_from or date_to) and date_column is None:
+        raise ValueError(f"{source} has no date column to filter on.")
+    if date_from and date_to and date_from > date_to:
+        raise ValueError("date_from must not be after date_to.")
+
+    select = ", ".join(f'"{c}"' for c in columns) if columns else "*"
+    conditions, params = [], []
+    for op, value in ((">=", date_from), ("<", date_to and date_to + timedelta(days=1))):
+        if value:
+            params.append(value)
+            mark = "%s" if placeholder == "%s" else f"${len(params)}"
+            # ::date so asyncpg accepts a date for timestamp columns too
+            conditions.append(f'"{date_column}" {op} {mark}::date')
+    sql = f"SELECT {select} FROM {source}"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    if ordered and order_by:
+        sql += f" ORDER BY {order_by}"
+    return sql, params
+
+
+def _json_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def encode_ndjson(batch):
+    return "".join(json.dumps(row, default=_json_default) + "\n" for row in batch)
+
+
+class CsvBatchEncoder:
+    """Encodes successive row batches as one CSV document (header on the first batch)."""
+
+    def __init__(self):
+        self._columns = None
+
+    def __call__(self, batch):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if self._columns is None:
+            self._columns = list(batch[0].keys())
+            writer.writerow(self._columns)
+        for row in batch:
+            writer.writerow([
+                v.isoformat() if isinstance(v, (date, datetime)) else v
+                for v in (row[c] for c in self._columns)
+            ])
+        return buffer.getvalue()
+
+
+def batch_encoder(fmt):
+    return encode_ndjson if fmt == "ndjson" else CsvBatchEncoder()
+
+
+async def stream_export(batches, fmt):
+    """Async generator of encoded chunks for a StreamingResponse."""
+    encode = batch_encoder(fmt)
+    async for batch in batches:
+        yield encode(batch)
+
+
+def main():
+    from query import LibraryDatabaseManager
+
+    parser = argparse.ArgumentParser(description="Stream a table or mv_* view to stdout (or --output).")
+    parser.add_argument("source", choices=sorted(EXPORT_SOURCES))
+    parser.add_argument("--format", choices=sorted(EXPORT_FORMATS), default="ndjson")
+    parser.add_argument("--columns", help="comma-separated columns to keep (default all)")
+    parser.add_argument("--from", dest="date_from", type=date.fromisoformat, help="first day (inclusive)")
+    parser.add_argument("--to", dest="date_to", type=date.fromisoformat, help="last day (inclusive)")
+    parser.add_argument("--batch-size", type=int, help="rows per fetch / record batch")
+    parser.add_argument("-o", "--output", help="file to write (default stdout)")
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(sys.stderr):
+        # keep setup chatter out of the exported data
+        db = LibraryDatabaseManager()
+    try:
+        columns = parse_columns(args.columns)
+        if columns:
+            available = db.get_relation_columns(args.source)
+            if available["status"] == "error":
+                sys.exit(available["message"])
+            check_columns(columns, available["data"])
+        sql, params = export_query(args.source, columns, args.date_from, args.date_to,
+                                   ordered=args.format not in COLUMNAR_FORMATS)
+    except ValueError as e:
+        sys.exit(str(e))
+
+    started = time.perf_counter()
+    written = 0
+    binary = args.format in COLUMNAR_FORMATS
+    with (open(args.output, "wb" if binary else "w") if args.output else contextlib.nullcontext(
+            sys.stdout.buffer if binary else sys.stdout)) as out:
+        if binary:
+            from columnar_export import stream_columnar
+            chunks = stream_columnar(sql, params, args.format, batch_rows=args.batch_size)
+        else:
+            encode = batch_encoder(args.format)
+            batches = db.stream_query(sql, params, batch_size=args.batch_size or EXPORT_BATCH_SIZE)
+            chunks = (encode(batch) for batch in batches)
+        for chunk in chunks:
+            out.write(chunk)
+            written += len(chunk)
+    unit = "bytes" if binary else "characters"
+    print(f"{args.source}: {written} {unit} of {args.format} in {time.perf_counter() - started:.2f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
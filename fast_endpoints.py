@@ -1,8 +1,27 @@
 import logging
 from datetime import date
+from typing import List, Optional
+from async_query import AsyncLibraryDatabaseManager
 from query import LibraryDatabaseManager
+from refresh_scheduler import view_refresher
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from search import SEARCH_MAX_OFFSET
+from schema import SCHEMA_BOOTSTRAP_ON_STARTUP, bootstrap_schema
+from response_cache import ResponseCacheMiddleware, response_cache
+from connection import pool_stats
+from metrics import SLOW_QUERY_MS, render_metrics, slow_queries
+from export import COLUMNAR_FORMATS, EXPORT_FORMATS, EXPORT_SOURCES, check_columns, export_query, parse_columns, stream_export
+from columnar_export import columnar_available, stream_columnar
+from fines import fine_accrual
+from counter_deltas import counter_applier
+from catalog_snapshot import CATALOG_SNAPSHOT_ENABLED, catalog_snapshot
+from serialization import json_response
+from analytics import circulation_analytics, department_usage, issues_per_period, lateness_distribution, loan_durations
 from fastapi import FastAPI, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -13,6 +32,8 @@ origins = [
     "http://127.0.0.1:3000",      # Alternative local dev
 ]
 
+# added before CORS so CORS stays the outer layer and also decorates cached/304 responses
+app.add_middleware(ResponseCacheMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,          # or ["*"] to allow all origins (not recommended in prod)
@@ -20,16 +41,57 @@ app.add_middleware(
     allow_methods=["*"],            # GET, POST, DELETE, etc.
     allow_headers=["*"],            # Allow all headers
 )
-library_manager = LibraryDatabaseManager()
+library_manager = AsyncLibraryDatabaseManager()
+
+
+class CheckoutPair(BaseModel):
+    student_id: int
+    copy_id: int
+
+
+class BatchRequest(BaseModel):
+    items: List[CheckoutPair]
+    atomic: bool = False    # one transaction for the whole batch, rolled back if any pair fails
+
+
+@app.on_event("startup")
+async def startup():
+    await library_manager.init()
+    sync_manager = LibraryDatabaseManager()
+    if SCHEMA_BOOTSTRAP_ON_STARTUP:
+        # views, triggers and procedures are created here once, never on the request path
+        result = await run_in_threadpool(bootstrap_schema, sync_manager)
+        if result["status"] == "error":
+            logger.error(f"Schema bootstrap failed: {result['message']}")
+        else:
+            logger.info(f"Schema at version {result['version']} ({result['duration_ms']} ms, applied {len(result['applied'])})")
+    # mv_* refreshes run on a background thread through the sync (psycopg2) pool
+    view_refresher.start(sync_manager.refresh_materialized_view)
+    fine_accrual.start(sync_manager.accrue_fines)
+    counter_applier.start(sync_manager.apply_counter_deltas)
+    if CATALOG_SNAPSHOT_ENABLED:
+        catalog_snapshot.start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    view_refresher.stop()
+    fine_accrual.stop()
+    counter_applier.stop()
+    catalog_snapshot.stop()
+    await library_manager.close()
 
 @app.get("/popular-books/")
-async def get_popular_books():
-    """Fetch popular books from materialized view."""
+async def get_popular_books(
+    limit: Optional[int] = Query(None, ge=1, description="Top-N books (all when omitted)"),
+    window_days: Optional[int] = Query(None, ge=1, le=365, description="Only count issues from the last N days, e.g. 7, 30 or 365"),
+):
+    """Fetch popular books from the incrementally maintained popularity counters."""
     try:
-        result = library_manager.get_materialized_view_popular_books()
+        result = await library_manager.get_popular_books(limit, window_days)
         if result["status"] == "error":
             raise HTTPException(status_code=500, detail=result["message"])
-        return result
+        return json_response(result)
     except Exception as e:
         logger.error(f"Error fetching popular books: {e}")
         raise HTTPException(status_code=500, detail="Could not fetch popular books.")
@@ -39,37 +101,355 @@ async def get_popular_books():
 async def get_overdue_transactions():
     """Fetch overdue transactions from materialized view."""
     try:
-        result = library_manager.get_materialized_view_overdue_transactions()
+        result = await library_manager.get_materialized_view_overdue_transactions()
         if result["status"] == "error":
             raise HTTPException(status_code=500, detail=result["message"])
-        return result
+        return json_response(result)
     except Exception as e:
         logger.error(f"Error fetching overdue transactions: {e}")
         raise HTTPException(status_code=500, detail="Could not fetch overdue transactions.")
 
 
+@app.get("/overdue-loans/")
+async def get_overdue_loans(
+    as_of: Optional[date] = Query(None, description="Overdue as of this date (default today)"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description=f"Page size (default {DEFAULT_PAGE_SIZE})"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+):
+    """Fetch one page of books still out past their due date, most overdue first."""
+    try:
+        result = await library_manager.get_overdue_loans(as_of, limit, cursor)
+        if result["status"] == "error":
+            status_code = 400 if result.get("reason") == "invalid" else 500
+            raise HTTPException(status_code=status_code, detail=result["message"])
+        return json_response(result)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching overdue loans: {e}")
+        raise HTTPException(status_code=500, detail="Could not fetch overdue loans.")
+
+
+@app.get("/overdue-loans/upcoming/")
+async def get_loans_becoming_overdue(
+    day: Optional[date] = Query(None, description="Loans turning overdue on this date (default tomorrow)"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description=f"Page size (default {DEFAULT_PAGE_SIZE})"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+):
+    """Fetch one page of open loans that become overdue on the given day."""
+    try:
+        result = await library_manager.get_loans_becoming_overdue(day, limit, cursor)
+        if result["status"] == "error":
+            status_code = 400 if result.get("reason") == "invalid" else 500
+            raise HTTPException(status_code=status_code, detail=result["message"])
+        return json_response(result)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching loans becoming overdue: {e}")
+        raise HTTPException(status_code=500, detail="Could not fetch loans becoming overdue.")
+
+
+@app.get("/loan-policies/")
+async def get_loan_policies():
+    """List per-category loan periods and the default."""
+    try:
+        result = await library_manager.get_loan_policies()
+        if result["status"] == "error":
+            raise HTTPException(status_code=500, detail=result["message"])
+        return json_response(result)
+    except Exception as e:
+        logger.error(f"Error fetching loan policies: {e}")
+        raise HTTPException(status_code=500, detail="Could not fetch loan policies.")
+
+
+@app.put("/loan-policies/{category_id}")
+async def set_loan_policy(
+    category_id: int,
+    loan_days: Optional[int] = Query(None, ge=1, description="Loan period in days; omit to use the default"),
+    fine_per_day: Optional[float] = Query(None, ge=0, description="Fine per day late; omit to use the default"),
+    max_fine: Optional[float] = Query(None, ge=0, description="Cap on the fine for one loan; omit for no cap"),
+):
+    """Set a category's loan period and fine rules for new loans."""
+    try:
+        result = await library_manager.set_loan_policy(category_id, loan_days, fine_per_day, max_fine)
+        if result["status"] == "error":
+            status_code = 404 if result.get("reason") == "not_found" else 500
+            raise HTTPException(status_code=status_code, detail=result["message"])
+        return json_response(result)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error setting loan policy for category {category_id}: {e}")
+        raise HTTPException(status_code=500, detail="Could not set loan policy.")
+
+
+@app.get("/fines/")
+async def get_fine_balances(
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description=f"Page size (default {DEFAULT_PAGE_SIZE})"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+):
+    """Fetch one page of student fine balances, largest first."""
+    try:
+        result = await library_manager.get_fine_balances(limit, cursor)
+        if result["status"] == "error":
+            status_code = 400 if result.get("reason") == "invalid" else 500
+            raise HTTPException(status_code=status_code, detail=result["message"])
+        return json_response(result)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching fine balances: {e}")
+        raise HTTPException(status_code=500, detail="Could not fetch fine balances.")
+
+
+@app.get("/fines/accrual/status")
+async def get_fine_accrual_status():
+    """Report when the nightly fine accrual runs next and how the last run went."""
+    return {"status": "success", "data": fine_accrual.status()}
+
+
+@app.get("/fines/{student_id}")
+async def get_student_fine_balance(student_id: int):
+    """Fetch a student's fine balance: charged on returns plus accruing on open overdue loans."""
+    try:
+        result = await library_manager.get_student_fine_balance(student_id)
+        if result["status"] == "error":
+            raise HTTPException(status_code=500, detail=result["message"])
+        return json_response(result)
+    except Exception as e:
+        logger.error(f"Error fetching fine balance for student {student_id}: {e}")
+        raise HTTPException(status_code=500, detail="Could not fetch fine balance.")
+
+
+@app.get("/materialized-views/status/")
+async def get_materialized_views_status():
+    """Report last refresh time, age and dirty flag of every mv_* view."""
+    return {"status": "success", "data": view_refresher.status()}
+
+
 @app.get("/all-books/")
-async def get_all_books_summary():
-    """Fetch all books summary from materialized view."""
+async def get_all_books_summary(
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description=f"Page size (default {DEFAULT_PAGE_SIZE})"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+):
+    """Fetch one page of the catalog ordered by title."""
     try:
         # library_manager.create_materialized_view_all_books_summary()
-        result = library_manager.view_all_books()
+        if catalog_snapshot.ready:
+            result = catalog_snapshot.page(limit, cursor)
+        else:
+            result = await library_manager.view_books_page(limit, cursor)
         if result["status"] == "error":
-            raise HTTPException(status_code=500, detail=result["message"])
-        return result
+            status_code = 400 if result.get("reason") == "invalid" else 500
+            raise HTTPException(status_code=status_code, detail=result["message"])
+        return json_response(result)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching all books summary: {e}")
         raise HTTPException(status_code=500, detail="Could not fetch all books summary.")
 
 
-@app.get("/user-borrowing-history/{user_id}")
-async def get_user_borrowing_history(user_id: int):
-    """Fetch a specific user's borrowing history."""
+@app.get("/catalog/")
+async def browse_catalog(
+    author: Optional[str] = Query(None, description="Exact author name (case-insensitive)"),
+    category: Optional[str] = Query(None, description="Exact category name (case-insensitive)"),
+    available_only: bool = Query(False, description="Only books with a copy on the shelf"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description=f"Page size (default {DEFAULT_PAGE_SIZE})"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+):
+    """Filter and page the in-memory catalog snapshot (CATALOG_SNAPSHOT=1), ordered by title."""
+    if not catalog_snapshot.ready:
+        raise HTTPException(status_code=503, detail="Catalog snapshot is not loaded.")
+    try:
+        result = catalog_snapshot.page(limit, cursor, author, category, available_only)
+        if result["status"] == "error":
+            raise HTTPException(status_code=400, detail=result["message"])
+        return json_response(result)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error browsing catalog snapshot: {e}")
+        raise HTTPException(status_code=500, detail="Could not browse catalog.")
+
+
+@app.get("/catalog/status")
+async def catalog_status():
+    """Size, feed watermark and freshness of the in-memory catalog snapshot."""
+    return catalog_snapshot.status()
+
+
+@app.get("/search")
+async def search_books(
+    q: str = Query(..., min_length=1, description="Words from title, author, category or ISBN"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description=f"Page size (default {DEFAULT_PAGE_SIZE})"),
+    offset: int = Query(0, ge=0, le=SEARCH_MAX_OFFSET, description="next_offset from the previous page"),
+):
+    """Ranked, typo-tolerant book search."""
     try:
-        result = library_manager.get_user_borrowing_history(user_id)
+        result = await library_manager.search_books(q, limit, offset)
         if result["status"] == "error":
             raise HTTPException(status_code=500, detail=result["message"])
-        return result
+        return json_response(result)
+    except Exception as e:
+        logger.error(f"Error searching books for '{q}': {e}")
+        raise HTTPException(status_code=500, detail="Could not search books.")
+
+
+@app.get("/issues/")
+async def get_issues(
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description=f"Page size (default {DEFAULT_PAGE_SIZE})"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+):
+    """Fetch one page of issues, newest first."""
+    try:
+        result = await library_manager.view_issues_page(limit, cursor)
+        if result["status"] == "error":
+            status_code = 400 if result.get("reason") == "invalid" else 500
+            raise HTTPException(status_code=status_code, detail=result["message"])
+        return json_response(result)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching issues: {e}")
+        raise HTTPException(status_code=500, detail="Could not fetch issues.")
+
+
+@app.get("/returns/")
+async def get_returns(
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description=f"Page size (default {DEFAULT_PAGE_SIZE})"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+):
+    """Fetch one page of returns, newest first."""
+    try:
+        result = await library_manager.view_returns_page(limit, cursor)
+        if result["status"] == "error":
+            status_code = 400 if result.get("reason") == "invalid" else 500
+            raise HTTPException(status_code=status_code, detail=result["message"])
+        return json_response(result)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching returns: {e}")
+        raise HTTPException(status_code=500, detail="Could not fetch returns.")
+
+
+@app.get("/export/{source}")
+async def export_source(
+    source: str,
+    format: str = Query("ndjson", description="ndjson, csv, arrow (IPC stream) or parquet"),
+    columns: Optional[str] = Query(None, description="Comma-separated columns to keep (default all)"),
+    date_from: Optional[date] = Query(None, description="First day to include, on the source's date column"),
+    date_to: Optional[date] = Query(None, description="Last day to include"),
+):
+    """Stream a table or mv_* view, optionally pruned to some columns and a date range, with bounded memory."""
+    if source not in EXPORT_SOURCES:
+        raise HTTPException(status_code=404, detail=f"Unknown export source '{source}'.")
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format '{format}'.")
+    if format in COLUMNAR_FORMATS and not columnar_available():
+        raise HTTPException(status_code=501, detail=f"{format} export needs pyarrow installed on the server.")
+
+    columnar = format in COLUMNAR_FORMATS
+    try:
+        selected = parse_columns(columns)
+        if selected:
+            available = await library_manager.get_relation_columns(source)
+            if available["status"] == "error":
+                raise HTTPException(status_code=500, detail=available["message"])
+            check_columns(selected, available["data"])
+        # the columnar path reads through psycopg2 (%s) and needs no ORDER BY
+        sql, params = export_query(source, selected, date_from, date_to,
+                                   placeholder="%s" if columnar else "$", ordered=not columnar)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if columnar:
+        # sync generator; Starlette iterates it on the threadpool
+        chunks = stream_columnar(sql, params, format)
+    else:
+        chunks = stream_export(library_manager.stream_query(sql, *params), format)
+    return StreamingResponse(
+        chunks,
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{source}.{format}"'},
+    )
+
+
+async def _analytics(report, **params):
+    # CPU-bound (and the first call loads the arrays), so off the event loop
+    result = await run_in_threadpool(circulation_analytics.run, report, **params)
+    if result["status"] == "error":
+        status_code = {"invalid": 400, "unavailable": 501}.get(result.get("reason"), 500)
+        raise HTTPException(status_code=status_code, detail=result["message"])
+    return json_response(result)
+
+
+@app.get("/analytics/issues-per-period")
+async def analytics_issues_per_period(
+    period: str = Query("week", description="day or week (weeks start on Monday)"),
+    date_from: Optional[date] = Query(None, description="First issue day to include"),
+    date_to: Optional[date] = Query(None, description="Last issue day to include"),
+    top: int = Query(20, ge=1, le=200, description="Categories listed separately; the rest are '(other)'"),
+):
+    """Issues per day or week for the busiest categories."""
+    return await _analytics(issues_per_period, period=period, date_from=date_from, date_to=date_to, top=top)
+
+
+@app.get("/analytics/loan-durations")
+async def analytics_loan_durations(
+    date_from: Optional[date] = Query(None, description="First issue day to include"),
+    date_to: Optional[date] = Query(None, description="Last issue day to include"),
+):
+    """Mean, median and p90 days from issue to return, overall and per category."""
+    return await _analytics(loan_durations, date_from=date_from, date_to=date_to)
+
+
+@app.get("/analytics/lateness")
+async def analytics_lateness(
+    date_from: Optional[date] = Query(None, description="First issue day to include"),
+    date_to: Optional[date] = Query(None, description="Last issue day to include"),
+    as_of: Optional[date] = Query(None, description="Day open loans are measured against (default today)"),
+):
+    """Distribution of days late at return, and of how overdue open loans are."""
+    return await _analytics(lateness_distribution, date_from=date_from, date_to=date_to, as_of=as_of)
+
+
+@app.get("/analytics/departments")
+async def analytics_departments(
+    date_from: Optional[date] = Query(None, description="First issue day to include"),
+    date_to: Optional[date] = Query(None, description="Last issue day to include"),
+):
+    """Loans, active students, loan length, lateness and fines per student department."""
+    return await _analytics(department_usage, date_from=date_from, date_to=date_to)
+
+
+@app.get("/analytics/status")
+async def analytics_status():
+    """Size and age of the loaded circulation arrays."""
+    return circulation_analytics.status()
+
+
+@app.get("/user-borrowing-history/{user_id}")
+async def get_user_borrowing_history(
+    user_id: int,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description=f"Page size (default {DEFAULT_PAGE_SIZE})"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    date_from: Optional[date] = Query(None, description="Only loans issued on or after this date"),
+    date_to: Optional[date] = Query(None, description="Only loans issued on or before this date"),
+):
+    """Fetch one page of a user's borrowing history, newest first."""
+    if date_from and date_to and date_from > date_to:
+        raise HTTPException(status_code=400, detail="date_from must not be after date_to.")
+    try:
+        result = await library_manager.get_student_history(user_id, limit, cursor, date_from, date_to)
+        if result["status"] == "error":
+            status_code = 400 if result.get("reason") == "invalid" else 500
+            raise HTTPException(status_code=status_code, detail=result["message"])
+        return json_response(result)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching borrowing history for user {user_id}: {e}")
         raise HTTPException(status_code=500, detail="Could not fetch user borrowing history.")
@@ -79,11 +459,10 @@ async def get_user_borrowing_history(user_id: int):
 async def get_fines_report():
     """Fetch total fines per student from materialized view."""
     try:
-        library_manager.create_materialized_view_issued_report()
-        result = library_manager.get_issued_report()
+        result = await library_manager.get_issued_report()
         if result["status"] == "error":
             raise HTTPException(status_code=500, detail=result["message"])
-        return result
+        return json_response(result)
     except Exception as e:
         logger.error(f"Error fetching fines report: {e}")
         raise HTTPException(status_code=500, detail="Could not fetch fines report.")
@@ -99,10 +478,10 @@ async def insert_book(
 ):
     """Insert a new book using stored procedure."""
     try:
-        result = library_manager.stored_procedure_insert_book(title, author, category, isbn, total_copies)
+        result = await library_manager.stored_procedure_insert_book(title, author, category, isbn, total_copies)
         if result["status"] == "error":
             raise HTTPException(status_code=500, detail=result["message"])
-        return result
+        return json_response(result)
     except Exception as e:
         logger.error(f"Error inserting book: {e}")
         raise HTTPException(status_code=500, detail="Could not insert book.")
@@ -116,14 +495,32 @@ async def add_issue(
     try:
         #result = library_manager.issue_book(copy_id, student_id, copy_id, issue_date)
         
-        result = library_manager.stored_procedure_issue_book(student_id, copy_id,date.today())
+        result = await library_manager.stored_procedure_issue_book(student_id, copy_id,date.today())
         if result["status"] == "error":
             raise HTTPException(status_code=500, detail=result["message"])
-        return result
+        return json_response(result)
     except Exception as e:
         logger.error(f"Error adding issue: {e}")
         raise HTTPException(status_code=500, detail="Could not add issue.")
 
+@app.post("/checkout/")
+async def checkout_book(
+    book_id: int = Query(..., description="Book ID"),
+    student_id: int = Query(..., description="Student ID"),
+):
+    """Issue any available copy of a book; safe under concurrent checkouts of the same title."""
+    try:
+        result = await library_manager.allocate_issue(book_id, student_id, date.today())
+        if result["status"] == "error":
+            status_code = 409 if result.get("reason") == "unavailable" else 500
+            raise HTTPException(status_code=status_code, detail=result["message"])
+        return json_response(result)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error checking out book: {e}")
+        raise HTTPException(status_code=500, detail="Could not check out book.")
+
 @app.post("/return-book/")
 async def return_book(
     student_id: int = Query(..., description="Student ID"),
@@ -131,22 +528,75 @@ async def return_book(
 ):
     """Return a book copy issued to a student."""
     try:
-        result = library_manager.insert_return_and_update_book(copy_id, student_id)
+        result = await library_manager.insert_return_and_update_book(copy_id, student_id)
         if result["status"] == "error":
             raise HTTPException(status_code=400, detail=result["message"])
-        return result
+        return json_response(result)
     except Exception as e:
         logger.error(f"Error returning book: {e}")
         raise HTTPException(status_code=500, detail="Could not return book.")
 
+def _batch_response(result):
+    if result["status"] == "error":
+        status_code = 422 if result.get("reason") == "invalid" else 500
+        raise HTTPException(status_code=status_code, detail=result["message"])
+    return json_response(result)
+
+
+@app.post("/batch/issue/")
+async def batch_issue(request: BatchRequest):
+    """Issue a cart of (student_id, copy_id) pairs in as few transactions as possible, with per-item results."""
+    try:
+        items = [(pair.student_id, pair.copy_id) for pair in request.items]
+        return _batch_response(await library_manager.batch_issue_books(items, date.today(), request.atomic))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in batch issue: {e}")
+        raise HTTPException(status_code=500, detail="Could not process batch issue.")
+
+
+@app.post("/batch/return/")
+async def batch_return(request: BatchRequest):
+    """Return a cart of (student_id, copy_id) pairs with per-item results."""
+    try:
+        items = [(pair.student_id, pair.copy_id) for pair in request.items]
+        return _batch_response(await library_manager.batch_return_books(items, request.atomic))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in batch return: {e}")
+        raise HTTPException(status_code=500, detail="Could not process batch return.")
+
+@app.get("/books/{book_id}/availability")
+async def book_availability(book_id: int):
+    """Total, available and issued copies of one book, from the availability counters."""
+    try:
+        result = await library_manager.get_book_availability(book_id)
+        if result["status"] == "error":
+            status_code = 404 if result.get("reason") == "not_found" else 500
+            raise HTTPException(status_code=status_code, detail=result["message"])
+        return json_response(result)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching availability for book {book_id}: {e}")
+        raise HTTPException(status_code=500, detail="Could not fetch book availability.")
+
+
+@app.get("/counters/status")
+async def get_counter_status():
+    """Report how the background fold of the per-book counter deltas last went."""
+    return {"status": "success", "data": counter_applier.status()}
+
 @app.delete("/books/{book_id}")
 async def delete_book(book_id: int):
     """Delete a book by ID using stored procedure."""
     try:
-        result = library_manager.delete_book(book_id)
+        result = await library_manager.delete_book(book_id)
         if result["status"] == "error":
             raise HTTPException(status_code=500, detail=result["message"])
-        return result
+        return json_response(result)
     except Exception as e:
         logger.error(f"Error deleting book {book_id}: {e}")
         raise HTTPException(status_code=500, detail="Could not delete book.")
@@ -157,14 +607,14 @@ async def delete_book(book_id: int):
 async def insert_book(title: str, author_name: str, category_name: str, isbn: str, total_copies: int, shelf_location: str):
     """Insert a new book using path variables."""
     try:
-        result = library_manager.insert_book(
+        result = await library_manager.insert_book(
             title, author_name, category_name, isbn, 1, shelf_location
         )
 
         if result["status"] == "error":
             raise HTTPException(status_code=500, detail=result["message"])
 
-        return result
+        return json_response(result)
 
     except Exception as e:
         logger.error(f"Error inserting book '{title}': {e}")
@@ -203,6 +653,35 @@ async def insert_book(title: str, author_name: str, category_name: str, isbn: st
 #         release_connection(conn)
 
 
+@app.get("/cache-stats/")
+async def get_cache_stats():
+    """Hit/miss counters of the in-process id caches and the response cache."""
+    result = await library_manager.get_name_cache_stats()
+    result["data"]["responses"] = response_cache.stats()
+    return result
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus text exposition: method/SQL latency histograms, row counts, pool wait and pool size."""
+    pools = pool_stats()
+    connections = {
+        (pool, state): stats[state]
+        for pool, stats in pools.items()
+        for state in ("open", "idle", "in_use", "max_size")
+    }
+    body = render_metrics({
+        "library_pool_connections": ("Pooled connections by state.", connections, ("pool", "state")),
+    })
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
+
+
+@app.get("/metrics/slow-queries")
+async def get_slow_queries():
+    """Most recent statements slower than SLOW_QUERY_MS, newest first."""
+    return {"status": "success", "threshold_ms": SLOW_QUERY_MS, "data": slow_queries()}
+
+
 @app.get("/")
 async def root():
     return {"message": "Library Management System API is running!"}
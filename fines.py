@@ -0,0 +1,111 @@
+"""Nightly fine accrual.
+
+LibraryDatabaseManager.accrue_fines() prices every open overdue loan in one
+set-based pass and refreshes the ``accruing`` part of student_fine_balances;
+returned loans are charged as they come back (compute_fine() plus the
+returns trigger). This module runs the accrual once a day at
+FINE_ACCRUAL_TIME (server local time, "HH:MM"; empty disables it) on a
+background thread, and from the command line for cron:
+
+    python fines.py                      # accrue as of today
+    python fines.py --as-of 2024-06-30
+    python fines.py --rebuild            # recompute balances from returns + open loans
+
+The accrual is idempotent and serialised by an advisory lock, so several app
+workers (or a worker and cron) running it the same night do no harm.
+"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+import threading
+from datetime import date, datetime, timedelta
+
+from loguru import logger
+
+from query import LibraryDatabaseManager
+
+
+FINE_ACCRUAL_TIME = os.getenv("FINE_ACCRUAL_TIME", "02:00")
+
+
+def _next_run(now, at):
+    hour, minute = (int(part) for part in at.split(":"))
+    run = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    return run if run > now else run + timedelta(days=1)
+
+
+class NightlyFineAccrual:
+    """Calls ``accrue()`` once a day at ``at``; ``last_result`` keeps the outcome for status endpoints."""
+
+    def __init__(self, at=FINE_ACCRUAL_TIME):
+        self.at = at
+        self._stop = threading.Event()
+        self._thread = None
+        self._accrue = None
+        self.next_run = None
+        self.last_result = None
+
+    def run_now(self):
+        try:
+            result = self._accrue()
+        except Exception as e:
+            result = {"status": "error", "message": str(e)}
+        self.last_result = {"at": datetime.now().isoformat(), **result}
+        if result["status"] == "success":
+            logger.info(f"Fines accrued: {result['data']}")
+        else:
+            logger.error(f"Fine accrual failed: {result['message']}")
+        return result
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self.next_run = _next_run(datetime.now(), self.at)
+            if self._stop.wait((self.next_run - datetime.now()).total_seconds()):
+                break
+            self.run_now()
+
+    def start(self, accrue):
+        """Start the background thread; ``accrue()`` does the work (LibraryDatabaseManager.accrue_fines)."""
+        if not self.at or (self._thread and self._thread.is_alive()):
+            return
+        self._accrue = accrue
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="fine-accrual", daemon=True)
+        self._thread.start()
+        logger.info(f"Nightly fine accrual scheduled at {self.at}.")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def status(self):
+        return {
+            "scheduled_at": self.at or None,
+            "next_run": self.next_run.isoformat() if self.next_run else None,
+            "last_result": self.last_result,
+        }
+
+
+fine_accrual = NightlyFineAccrual()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--as-of", type=date.fromisoformat, help="accrual date (default today)")
+    parser.add_argument("--rebuild", action="store_true", help="rebuild all balances before accruing")
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(sys.stderr):
+        db = LibraryDatabaseManager()
+    result = db.rebuild_fine_balances(args.as_of) if args.rebuild else db.accrue_fines(args.as_of)
+    json.dump(result, sys.stdout, indent=2, default=str)
+    sys.stdout.write("\n")
+    sys.exit(0 if result["status"] == "success" else 1)
+
+
+if __name__ == "__main__":
+    main()
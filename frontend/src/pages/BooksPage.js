@@ -9,28 +9,41 @@ const BooksPage = ({ userRole }) => {
   const [error, setError] = useState(null);
   const navigate = useNavigate();
 
-  useEffect(() => {
-    // test connection
-    fetch("http://localhost:8000/")
-      .then(res => res.json())
-      .then(data => console.log("BACKEND CONNECTED:", data))
-      .catch(err => console.error("CONNECTION ERROR:", err));
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
 
-    // fetch books
-    fetch("http://localhost:8000/all-books/")
+  // fetch one keyset page of books; cursor = next_cursor of the previous page
+  const fetchBooksPage = (cursor) => {
+    const url = cursor
+      ? `http://localhost:8000/all-books/?cursor=${encodeURIComponent(cursor)}`
+      : "http://localhost:8000/all-books/";
+    return fetch(url)
       .then(res => res.json())
       .then(data => {
         console.log("BOOKS DATA:", data);
         if (data.status === "success" && Array.isArray(data.data)) {
-          setSampleBooks(data.data);
+          setSampleBooks(prev => (cursor ? [...prev, ...data.data] : data.data));
+          setNextCursor(data.next_cursor || null);
         } else if (Array.isArray(data)) {
           // In case backend directly returns array
           setSampleBooks(data);
+          setNextCursor(null);
         } else {
           setSampleBooks([]);
           setError("Invalid data format from backend");
         }
-      })
+      });
+  };
+
+  useEffect(() => {
+    // test connection
+    fetch("http://localhost:8000/")
+      .then(res => res.json())
+      .then(data => console.log("BACKEND CONNECTED:", data))
+      .catch(err => console.error("CONNECTION ERROR:", err));
+
+    // fetch first page of books
+    fetchBooksPage(null)
       .catch(err => {
         console.error("ERROR FETCHING BOOKS:", err);
         setError("Failed to load books");
@@ -38,6 +51,34 @@ const BooksPage = ({ userRole }) => {
       .finally(() => setLoading(false));
   }, []);
 
+  // server-side ranked search, debounced so we do not query on every keystroke
+  const [searchResults, setSearchResults] = useState(null);
+  useEffect(() => {
+    const term = searchTerm.trim();
+    if (!term) {
+      setSearchResults(null);
+      return;
+    }
+    const timer = setTimeout(() => {
+      fetch(`http://localhost:8000/search?q=${encodeURIComponent(term)}`)
+        .then(res => res.json())
+        .then(data => {
+          if (data.status === "success" && Array.isArray(data.data)) {
+            setSearchResults(data.data);
+          }
+        })
+        .catch(err => console.error("ERROR SEARCHING BOOKS:", err));
+    }, 300);
+    return () => clearTimeout(timer);
+  }, [searchTerm]);
+
+  const loadMoreBooks = () => {
+    setLoadingMore(true);
+    fetchBooksPage(nextCursor)
+      .catch(err => console.error("ERROR FETCHING MORE BOOKS:", err))
+      .finally(() => setLoadingMore(false));
+  };
+
   // Helper for badges
   const getStatusBadge = (status, availableCopies) => {
     if (status === "Available" && availableCopies > 0) {
@@ -56,19 +97,13 @@ const BooksPage = ({ userRole }) => {
   };
 
   // Prevent filtering if books not loaded yet
-  const filteredBooks = sampleBooks.filter(book => {
-    const matchesSearch =
-      book.title?.toLowerCase().includes(searchTerm.toLowerCase()) ||
-      book.author_name?.toLowerCase().includes(searchTerm.toLowerCase()) ||
-      String(book.book_id).toLowerCase().includes(searchTerm.toLowerCase()) ||
-      book.isbn?.toLowerCase().includes(searchTerm.toLowerCase());
-
+  const filteredBooks = (searchResults ?? sampleBooks).filter(book => {
     const matchesFilter =
       filterBy === 'all' ||
       (filterBy === 'available' && book.available_copies > 0) ||
       (filterBy === 'issued' && book.available_copies === 0);
 
-    return matchesSearch && matchesFilter;
+    return matchesFilter;
   });
 
   if (loading) {
@@ -231,6 +266,18 @@ const BooksPage = ({ userRole }) => {
         <div className="mt-6 text-center text-gray-600">
           Showing {filteredBooks.length} of {sampleBooks.length} books
         </div>
+
+        {nextCursor && searchResults === null && (
+          <div className="mt-4 text-center">
+            <button
+              onClick={loadMoreBooks}
+              disabled={loadingMore}
+              className="bg-blue-500 hover:bg-blue-600 disabled:opacity-50 text-white px-6 py-2 rounded-lg font-medium transition-all duration-200"
+            >
+              {loadingMore ? 'Loading...' : 'Load more'}
+            </button>
+          </div>
+        )}
       </div>
     </div>
   );
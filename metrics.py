@@ -0,0 +1,284 @@
+"""Latency histograms, row counters and a slow-query log, rendered as Prometheus text.
+
+Three layers feed it:
+- manager methods: ``instrument_methods`` wraps every public method of
+  LibraryDatabaseManager / AsyncLibraryDatabaseManager (duration, rows in
+  ``data``, error results);
+- SQL statements: psycopg2 connections are opened with TimedConnection and
+  asyncpg connections get a query logger (duration per statement label,
+  rows where the driver reports them);
+- the pools: time spent waiting in ``get_connection()`` / ``acquire()``.
+
+Statements slower than SLOW_QUERY_MS are logged and kept in a ring of the
+last SLOW_QUERY_LOG_SIZE entries (``slow_queries()``).
+"""
+import functools
+import inspect
+import os
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+from loguru import logger
+from psycopg2 import extensions
+
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "250"))
+SLOW_QUERY_LOG_SIZE = int(os.getenv("SLOW_QUERY_LOG_SIZE", "100"))
+
+# seconds; roughly 1-2.5-5 steps from 1 ms to 10 s
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=""):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.label_names, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, label_names=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._series = {}   # labels -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, labels, value):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            else:
+                series[len(self.buckets)] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    le = 'le="%s"' % bound
+                    lines.append(f"{self.name}_bucket{_labels(self.label_names, labels, le)} {cumulative}")
+                cumulative += series[len(self.buckets)]
+                le = 'le="+Inf"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, labels, le)} {cumulative}")
+                lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {series[-1]:.6f}")
+                lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {cumulative}")
+        return lines
+
+
+METHOD_LATENCY = Histogram(
+    "library_method_duration_seconds", "Manager method latency.", ("manager", "method"))
+METHOD_ROWS = Counter(
+    "library_method_rows_total", "Rows returned in manager method results.", ("manager", "method"))
+METHOD_ERRORS = Counter(
+    "library_method_errors_total", "Manager calls that raised or returned status=error.", ("manager", "method"))
+STATEMENT_LATENCY = Histogram(
+    "library_sql_duration_seconds", "SQL statement latency by driver and statement.", ("driver", "statement"))
+STATEMENT_ROWS = Counter(
+    "library_sql_rows_total", "Rows returned or affected by SQL statements.", ("driver", "statement"))
+SLOW_QUERIES = Counter(
+    "library_slow_queries_total", f"Statements slower than SLOW_QUERY_MS ({SLOW_QUERY_MS:g} ms).", ("driver",))
+POOL_WAIT = Histogram(
+    "library_pool_wait_seconds", "Time spent waiting to check out a pooled connection.", ("pool",))
+
+ALL_METRICS = (METHOD_LATENCY, METHOD_ROWS, METHOD_ERRORS, STATEMENT_LATENCY, STATEMENT_ROWS, SLOW_QUERIES, POOL_WAIT)
+
+_slow_log = deque(maxlen=SLOW_QUERY_LOG_SIZE)
+_slow_lock = threading.Lock()
+_WHITESPACE = re.compile(r"\s+")
+
+
+def statement_label(sql):
+    """Bounded-cardinality label: whitespace-collapsed SQL text, truncated (queries are parameterised)."""
+    if isinstance(sql, bytes):
+        sql = sql.decode("utf-8", "replace")
+    elif not isinstance(sql, str):
+        return type(sql).__name__
+    text = _WHITESPACE.sub(" ", sql).strip()
+    return text if len(text) <= 120 else text[:117] + "..."
+
+
+def record_statement(driver, sql, seconds, rows=None):
+    label = statement_label(sql)
+    STATEMENT_LATENCY.observe((driver, label), seconds)
+    if rows is not None and rows >= 0:
+        STATEMENT_ROWS.inc((driver, label), rows)
+    if seconds * 1000 >= SLOW_QUERY_MS:
+        SLOW_QUERIES.inc((driver,))
+        entry = {
+            "at": datetime.now(timezone.utc).isoformat(),
+            "driver": driver,
+            "duration_ms": round(seconds * 1000, 3),
+            "rows": rows,
+            "statement": label,
+        }
+        with _slow_lock:
+            _slow_log.append(entry)
+        logger.warning(f"Slow query ({entry['duration_ms']} ms, {driver}): {label}")
+
+
+def observe_pool_wait(pool, seconds):
+    POOL_WAIT.observe((pool,), seconds)
+
+
+def slow_queries():
+    with _slow_lock:
+        return list(reversed(_slow_log))
+
+
+def render_metrics(gauges=None):
+    """Prometheus text exposition; ``gauges`` maps metric name -> (help, {labels tuple: value}, label names)."""
+    lines = []
+    for metric in ALL_METRICS:
+        lines.extend(metric.render())
+    for name, (help_text, values, label_names) in (gauges or {}).items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} gauge")
+        for labels, value in values.items():
+            lines.append(f"{name}{_labels(label_names, labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+# manager methods
+
+def _result_rows(result):
+    if isinstance(result, dict):
+        data = result.get("data")
+        if isinstance(data, list):
+            return len(data)
+        if isinstance(data, dict) and isinstance(data.get("results"), list):
+            return len(data["results"])
+    return 0
+
+
+def _record_method(manager, method, started, result=None, failed=False):
+    labels = (manager, method)
+    METHOD_LATENCY.observe(labels, time.perf_counter() - started)
+    if failed or (isinstance(result, dict) and result.get("status") == "error"):
+        METHOD_ERRORS.inc(labels)
+    rows = _result_rows(result)
+    if rows:
+        METHOD_ROWS.inc(labels, rows)
+
+
+def _wrap(manager, name, fn):
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def timed_async(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                result = await fn(*args, **kwargs)
+            except BaseException:
+                _record_method(manager, name, started, failed=True)
+                raise
+            _record_method(manager, name, started, result)
+            return result
+        return timed_async
+
+    @functools.wraps(fn)
+    def timed(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException:
+            _record_method(manager, name, started, failed=True)
+            raise
+        _record_method(manager, name, started, result)
+        return result
+    return timed
+
+
+def instrument_methods(manager):
+    """Class decorator: time every public method (generators excepted; their SQL is timed per statement)."""
+    def decorate(cls):
+        if not METRICS_ENABLED:
+            return cls
+        for name, fn in list(vars(cls).items()):
+            if name.startswith("_") or not inspect.isfunction(fn):
+                continue
+            if inspect.isgeneratorfunction(fn) or inspect.isasyncgenfunction(fn):
+                continue
+            setattr(cls, name, _wrap(manager, name, fn))
+        return cls
+    return decorate
+
+
+# SQL statements
+
+class TimedCursorMixin:
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            record_statement("psycopg2", query, time.perf_counter() - started, self.rowcount)
+
+    def executemany(self, query, vars_list):
+        started = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            record_statement("psycopg2", query, time.perf_counter() - started, self.rowcount)
+
+    def copy_expert(self, sql, file, size=8192):
+        started = time.perf_counter()
+        try:
+            return super().copy_expert(sql, file, size)
+        finally:
+            record_statement("psycopg2", sql, time.perf_counter() - started, self.rowcount)
+
+
+@functools.lru_cache(maxsize=None)
+def timed_cursor_class(factory):
+    return type(f"Timed{factory.__name__}", (TimedCursorMixin, factory), {})
+
+
+class TimedConnection(extensions.connection):
+    """psycopg2 connection whose cursors (any cursor_factory) time every statement."""
+
+    def cursor(self, *args, **kwargs):
+        factory = kwargs.get("cursor_factory") or self.cursor_factory or extensions.cursor
+        kwargs["cursor_factory"] = timed_cursor_class(factory)
+        return super().cursor(*args, **kwargs)
+
+
+def asyncpg_query_logger(record):
+    # asyncpg LoggedQuery: query, args, timeout, elapsed, exception, ...
+    record_statement("asyncpg", record.query, record.elapsed)
@@ -0,0 +1,102 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+NAME_CACHE_MAXSIZE = int(os.getenv("NAME_CACHE_MAXSIZE", "10000"))
+NAME_CACHE_TTL = float(os.getenv("NAME_CACHE_TTL", "300"))
+
+
+class NameIdCache:
+    """Bounded, case-insensitive name -> id LRU cache with hit/miss counters.
+
+    Entries expire after ``ttl`` seconds so ids removed by another process
+    (handle_book_delete drops orphaned authors/categories) cannot linger
+    forever; within this process delete paths evict the ids they touch.
+    """
+
+    def __init__(self, maxsize=NAME_CACHE_MAXSIZE, ttl=NAME_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # lower(name) -> (id, expires_at)
+        self._keys_by_id = {}           # id -> lower(name)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, name):
+        key = name.lower()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] < time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, name, value):
+        key = name.lower()
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._keys_by_id[value] = key
+            while len(self._entries) > self.maxsize:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def evict_id(self, value):
+        with self._lock:
+            key = self._keys_by_id.get(value)
+            if key is not None:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_id.clear()
+
+    def _remove(self, key):
+        # caller holds self._lock
+        value, _ = self._entries.pop(key)
+        if self._keys_by_id.get(value) == key:
+            del self._keys_by_id[value]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            }
+
+
+author_cache = NameIdCache()
+category_cache = NameIdCache()
+
+
+def evict_book_names(author_id, category_id):
+    """Drop the ids a deleted book referenced; handle_book_delete may have removed them."""
+    if author_id is not None:
+        author_cache.evict_id(author_id)
+    if category_id is not None:
+        category_cache.evict_id(category_id)
+
+
+def clear_name_caches():
+    author_cache.clear()
+    category_cache.clear()
+
+
+def name_cache_stats():
+    return {"author": author_cache.stats(), "category": category_cache.stats()}
@@ -0,0 +1,83 @@
+import base64
+import json
+import os
+from datetime import date
+from decimal import Decimal
+
+
+DEFAULT_PAGE_SIZE = int(os.getenv("DEFAULT_PAGE_SIZE", "50"))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "500"))
+
+
+class KeysetSpec:
+    """Describes how a listing is ordered so it can be paged by key instead of OFFSET.
+
+    ``keys`` is a sequence of ``(sql_expression, column_name, parse)`` tuples in
+    ORDER BY order; ``parse`` turns the JSON value stored in a cursor back into
+    the Python type the driver expects.
+    """
+
+    def __init__(self, keys, descending=False):
+        self.keys = keys
+        self.descending = descending
+
+    @property
+    def order_by(self):
+        direction = " DESC" if self.descending else ""
+        return ", ".join(expr + direction for expr, _, _ in self.keys)
+
+    def where(self, placeholders):
+        # row comparison lets Postgres walk a composite index from the cursor onwards
+        columns = ", ".join(expr for expr, _, _ in self.keys)
+        operator = "<" if self.descending else ">"
+        return f"({columns}) {operator} ({', '.join(placeholders)})"
+
+
+BOOKS_KEYSET = KeysetSpec((("b.title", "title", str), ("b.book_id", "book_id", int)))
+ISSUES_KEYSET = KeysetSpec(
+    (("issue_date", "issue_date", date.fromisoformat), ("issue_id", "issue_id", int)), descending=True
+)
+RETURNS_KEYSET = KeysetSpec(
+    (("return_date", "return_date", date.fromisoformat), ("return_id", "return_id", int)), descending=True
+)
+OVERDUE_KEYSET = KeysetSpec((("i.due_date", "due_date", date.fromisoformat), ("i.issue_id", "issue_id", int)))
+FINES_KEYSET = KeysetSpec((("f.balance", "balance", Decimal), ("f.student_id", "student_id", int)), descending=True)
+HISTORY_KEYSET = KeysetSpec(
+    (("i.issue_date", "issue_date", date.fromisoformat), ("i.issue_id", "issue_id", int)), descending=True
+)
+
+
+def clamp_page_size(limit):
+    if limit is None:
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(int(limit), MAX_PAGE_SIZE))
+
+
+def encode_cursor(spec, row):
+    values = [row[name] for _, name, _ in spec.keys]
+    values = [v.isoformat() if isinstance(v, date) else str(v) if isinstance(v, Decimal) else v for v in values]
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(spec, cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if len(values) != len(spec.keys):
+            raise ValueError
+        return [parse(value) for value, (_, _, parse) in zip(values, spec.keys)]
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+
+
+def build_page(spec, rows, limit):
+    """Trim the extra look-ahead row and attach the cursor for the next page."""
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return {
+        "status": "success",
+        "data": rows,
+        "limit": limit,
+        "next_cursor": encode_cursor(spec, rows[-1]) if has_more else None,
+    }
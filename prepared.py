@@ -0,0 +1,114 @@
+"""Server-side prepared statements for the hot psycopg2 queries.
+
+psycopg2 sends every statement as text and Postgres parses and plans it on
+each call. PreparedStatementRegistry issues ``PREPARE name AS ...`` the first
+time a statement runs on a pooled connection and ``EXECUTE name(...)`` with
+bound parameters from then on, so the parse/plan happens once per
+connection instead of once per call.
+
+Statements are written with psycopg2 ``%s`` placeholders (add a cast where
+Postgres cannot infer the type); the registry rewrites them to ``$n`` for
+PREPARE. CALL cannot be prepared, so procedure calls are only parameterised
+(their bodies' plans are cached by plpgsql already). The asyncpg manager
+needs none of this: asyncpg prepares and caches statements per connection
+itself.
+
+Set PREPARED_STATEMENTS=0 to fall back to plain execution (the benchmark
+uses this to compare).
+"""
+import os
+import threading
+import weakref
+
+
+PREPARED_STATEMENTS_ENABLED = os.getenv("PREPARED_STATEMENTS", "1") == "1"
+
+HOT_STATEMENTS = {
+    "author_id_by_name": "SELECT author_id FROM author WHERE LOWER(name) = LOWER(%s::text)",
+    "insert_author": "INSERT INTO author (name, bio) VALUES (%s::text, 'Bio not provided') RETURNING author_id",
+    "category_id_by_name": "SELECT category_id FROM categories WHERE LOWER(name) = LOWER(%s::text)",
+    "insert_category": "INSERT INTO categories (name) VALUES (%s::text) RETURNING category_id",
+    "insert_book_row": (
+        "INSERT INTO books (title, author, category, isbn, total_copies) "
+        "VALUES (%s::text, %s::int, %s::int, %s::text, %s::int) RETURNING book_id"
+    ),
+    "insert_book_copies": (
+        "INSERT INTO book_copies (book_id, status, shelf_location) "
+        "SELECT %s::int, 'available', %s::text FROM generate_series(1, %s::int) RETURNING copy_id"
+    ),
+    "book_names_by_id": "SELECT book_id, author, category FROM books WHERE book_id = %s::int",
+    "delete_book_by_id": "DELETE FROM books WHERE book_id = %s::int",
+    "popular_books_all_time": (
+        "SELECT p.book_id, b.title, p.total_issues, p.last_issued "
+        "FROM book_popularity p JOIN books b ON b.book_id = p.book_id "
+        "ORDER BY p.total_issues DESC LIMIT %s::int"
+    ),
+    "popular_books_window": (
+        "SELECT d.book_id, b.title, SUM(d.issues) AS total_issues, MAX(d.issue_day) AS last_issued "
+        "FROM book_popularity_daily d JOIN books b ON b.book_id = d.book_id "
+        "WHERE d.issue_day > CURRENT_DATE - %s::int "
+        "GROUP BY d.book_id, b.title ORDER BY total_issues DESC LIMIT %s::int"
+    ),
+    "mv_popular_books": "SELECT * FROM mv_popular_books ORDER BY total_issues DESC",
+    "mv_overdue_transactions": "SELECT * FROM mv_overdue_transactions WHERE status = 'Overdue'",
+    "mv_all_books_summary": "SELECT * FROM mv_all_books_summary",
+    "mv_user_borrowing_history": "SELECT * FROM mv_user_borrowing_history WHERE student_id = %s::int",
+    "mv_issued_report": "SELECT * FROM mv_issued_report",
+}
+
+
+def to_numbered_placeholders(sql):
+    """``%s`` -> ``$1, $2, ...`` (``%%`` stays a literal percent sign)."""
+    parts = sql.replace("%%", "\0").split("%s")
+    out = parts[0]
+    for n, part in enumerate(parts[1:], start=1):
+        out += f"${n}" + part
+    return out.replace("\0", "%")
+
+
+class PreparedStatementRegistry:
+    """Prepares each registered statement once per connection and executes it by name."""
+
+    def __init__(self, statements, enabled=PREPARED_STATEMENTS_ENABLED):
+        self.statements = dict(statements)
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        # connection -> names prepared on it; entries vanish with the connection
+        self._prepared = weakref.WeakKeyDictionary()
+        self.prepares = 0
+        self.executions = 0
+
+    def execute(self, cur, name, params=()):
+        sql = self.statements[name]
+        if not self.enabled:
+            cur.execute(sql, params)
+            return cur
+
+        conn = cur.connection
+        with self._lock:
+            prepared = self._prepared.setdefault(conn, set())
+            self.executions += 1
+        if name not in prepared:
+            # PREPARE is session-level: it survives the transaction's commit/rollback
+            cur.execute(f"PREPARE {name} AS {to_numbered_placeholders(sql)}")
+            prepared.add(name)
+            with self._lock:
+                self.prepares += 1
+        if params:
+            cur.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", params)
+        else:
+            cur.execute(f"EXECUTE {name}")
+        return cur
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "statements": len(self.statements),
+                "connections": len(self._prepared),
+                "prepares": self.prepares,
+                "executions": self.executions,
+            }
+
+
+prepared_statements = PreparedStatementRegistry(HOT_STATEMENTS)
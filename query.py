@@ -1,11 +1,78 @@
-from connection import get_connection, release_connection, init_connection_pool, close_connection_pool
+from connection import db_connection, init_connection_pool, close_connection_pool
 import json
+import os
+import time
+import uuid
 import datetime
 import decimal
 from datetime import date, datetime as dt
+import psycopg2.errors
 from psycopg2.extras import RealDictCursor
-
-
+from refresh_scheduler import view_refresher
+from name_cache import author_cache, category_cache, clear_name_caches, evict_book_names, name_cache_stats
+from export import EXPORT_BATCH_SIZE
+from bulk_import import IMPORT_CHUNK_SIZE, import_records
+from search import SEARCH_MAX_OFFSET, search_terms, to_prefix_tsquery
+from batch import batch_arrays, batch_summary, item_results, sub_batches, validate_batch
+from prepared import prepared_statements
+from metrics import instrument_methods
+from pagination import (
+    BOOKS_KEYSET, FINES_KEYSET, HISTORY_KEYSET, ISSUES_KEYSET, OVERDUE_KEYSET, RETURNS_KEYSET, build_page,
+    clamp_page_size, decode_cursor,
+)
+
+
+# windowed popularity (7/30/365 days) is served from daily buckets kept this long
+POPULARITY_RETENTION_DAYS = 365
+
+# loan period for categories without a loan_policies row; baked into
+# loan_days_for_copy() when create_overdue_tracking() runs
+DEFAULT_LOAN_DAYS = int(os.getenv("DEFAULT_LOAN_DAYS", "14"))
+# fine per day late for categories without a policy fine; baked into compute_fine()
+DEFAULT_FINE_PER_DAY = decimal.Decimal(os.getenv("DEFAULT_FINE_PER_DAY", "1.00"))
+# accrue_fines() holds it exclusively, the return trigger shares it
+FINE_ACCRUAL_LOCK_ID = 7_315_002
+
+# open loans with their due date; paged by OVERDUE_KEYSET (most overdue first)
+OPEN_LOANS_SQL = """
+SELECT
+    i.issue_id,
+    i.student_id,
+    s.name AS student_name,
+    s.email,
+    i.copy_id,
+    bc.book_id,
+    b.title AS book_title,
+    i.issue_date,
+    i.due_date
+FROM issues i
+JOIN student s ON s.student_id = i.student_id
+JOIN book_copies bc ON bc.copy_id = i.copy_id
+JOIN books b ON b.book_id = bc.book_id
+"""
+
+# same columns as mv_user_borrowing_history plus the ids; paged by HISTORY_KEYSET
+STUDENT_HISTORY_SQL = """
+SELECT
+    i.issue_id,
+    i.student_id,
+    s.name AS student_name,
+    i.copy_id,
+    bc.book_id,
+    b.title AS book_title,
+    i.issue_date,
+    i.returned,
+    r.return_date,
+    r.fine_amount
+FROM issues i
+JOIN student s ON s.student_id = i.student_id
+JOIN book_copies bc ON bc.copy_id = i.copy_id
+JOIN books b ON b.book_id = bc.book_id
+LEFT JOIN returns r ON r.issue_id = i.issue_id
+"""
+
+
+@instrument_methods("sync")
 class LibraryDatabaseManager:
     def __init__(self):
         init_connection_pool()
@@ -59,20 +126,18 @@ class LibraryDatabaseManager:
         );
         """
     # PART 1: MATERIALIZED VIEWS
-    def refresh_materialized_view(self, view_name: str):
-        sql = f"REFRESH MATERIALIZED VIEW CONCURRENTLY {view_name};"
-        conn = get_connection()
-        try:
-            with conn.cursor() as cur:
-                cur.execute(sql)
-                conn.commit()
-            print(f"Materialized view '{view_name}' refreshed successfully!")
-            return {"status": "success", "message": f"{view_name} refreshed successfully"}
-        except Exception as e:
-            print(f"Error refreshing materialized view {view_name}: {e}")
-            return {"status": "error", "message": str(e)}
-        finally:
-            release_connection(conn)
+    def refresh_materialized_view(self, view_name: str, concurrently=True):
+        sql = f"REFRESH MATERIALIZED VIEW {'CONCURRENTLY ' if concurrently else ''}{view_name};"
+        with db_connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(sql)
+                    conn.commit()
+                print(f"Materialized view '{view_name}' refreshed successfully!")
+                return {"status": "success", "message": f"{view_name} refreshed successfully"}
+            except Exception as e:
+                print(f"Error refreshing materialized view {view_name}: {e}")
+                return {"status": "error", "message": str(e)}
 
     
 
@@ -88,41 +153,189 @@ class LibraryDatabaseManager:
         JOIN issues i ON bc.copy_id = i.copy_id
         GROUP BY b.book_id, b.title
         ORDER BY total_issues DESC;
+
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_popular_books_book_id ON mv_popular_books(book_id);
         """
-        conn = get_connection()
-        try:
+        with db_connection() as conn:
             with conn.cursor() as cur:
                 cur.execute(sql)
                 conn.commit()
-        finally:
-            release_connection(conn)
 
 
     def get_materialized_view_popular_books(self):
-        # ensure the materialized view is fresh before querying
-        try:
-            self.refresh_materialized_view('mv_popular_books')
-        except Exception:
-            # if refresh fails, continue to attempt to read the view
-            pass
-
-        sql = "SELECT * FROM mv_popular_books ORDER BY total_issues DESC;"
-        conn = get_connection()
-        try:
-            with conn.cursor() as cur:
-                cur.execute(sql)
-                columns = [desc[0] for desc in cur.description]  
-                rows = cur.fetchall()
+        # served as-is; view_refresher keeps the view fresh in the background
+        with db_connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    prepared_statements.execute(cur, "mv_popular_books")
+                    columns = [desc[0] for desc in cur.description]  
+                    rows = cur.fetchall()
             
             
-            data = [dict(zip(columns, row)) for row in rows]
+                data = [dict(zip(columns, row)) for row in rows]
 
             
-            return {"status": "success", "data": data}
-        except Exception as e:
-            return {"status": "error", "message": str(e)}
-        finally:
-            release_connection(conn)
+                return {"status": "success", "data": data, "freshness": view_refresher.freshness('mv_popular_books')}
+            except Exception as e:
+                return {"status": "error", "message": str(e)}
+
+
+    # Incremental popularity counters, so top-N reads never rescan the issues
+    # history the way mv_popular_books does. The issues trigger only appends
+    # (book, day) deltas; apply_popularity_deltas() folds them into the per-book
+    # and per-day rows in the background (counter_deltas.py), so a checkout
+    # never holds a per-title counter row locked.
+
+    def create_book_popularity_counters(self):
+        sql = """
+        CREATE TABLE IF NOT EXISTS book_popularity (
+            book_id INT PRIMARY KEY REFERENCES books(book_id) ON DELETE CASCADE,
+            total_issues BIGINT NOT NULL DEFAULT 0,
+            last_issued DATE
+        );
+        CREATE INDEX IF NOT EXISTS idx_book_popularity_total_issues ON book_popularity(total_issues DESC);
+
+        CREATE TABLE IF NOT EXISTS book_popularity_daily (
+            book_id INT REFERENCES books(book_id) ON DELETE CASCADE,
+            issue_day DATE NOT NULL,
+            issues INT NOT NULL DEFAULT 0,
+            PRIMARY KEY (book_id, issue_day)
+        );
+        CREATE INDEX IF NOT EXISTS idx_book_popularity_daily_day ON book_popularity_daily(issue_day);
+
+        -- append-only, one row per issue: concurrent checkouts never wait on each other here
+        CREATE TABLE IF NOT EXISTS book_popularity_deltas (
+            book_id INT NOT NULL,
+            issue_day DATE NOT NULL
+        );
+
+        CREATE OR REPLACE FUNCTION bump_book_popularity()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            INSERT INTO book_popularity_deltas (book_id, issue_day)
+            SELECT bc.book_id, COALESCE(n.issue_date, CURRENT_DATE)
+            FROM new_issues n
+            JOIN book_copies bc ON bc.copy_id = n.copy_id
+            WHERE bc.book_id IS NOT NULL;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS trg_book_popularity ON issues;
+        CREATE TRIGGER trg_book_popularity
+        AFTER INSERT ON issues
+        REFERENCING NEW TABLE AS new_issues
+        FOR EACH STATEMENT
+        EXECUTE FUNCTION bump_book_popularity();
+
+        -- Folds every committed delta into book_popularity / book_popularity_daily
+        -- and returns the number of books whose count moved. A delta row is
+        -- deleted (and so applied) by exactly one concurrent caller.
+        CREATE OR REPLACE FUNCTION apply_popularity_deltas()
+        RETURNS INT AS $$
+        DECLARE
+            v_books INT;
+        BEGIN
+            WITH moved AS (
+                DELETE FROM book_popularity_deltas
+                RETURNING book_id, issue_day
+            ), live AS (
+                -- deltas of deleted books are dropped
+                SELECT m.book_id, m.issue_day FROM moved m JOIN books b ON b.book_id = m.book_id
+            ), daily AS (
+                INSERT INTO book_popularity_daily AS d (book_id, issue_day, issues)
+                SELECT book_id, issue_day, COUNT(*)
+                FROM live
+                GROUP BY book_id, issue_day
+                ORDER BY book_id, issue_day
+                ON CONFLICT (book_id, issue_day) DO UPDATE
+                SET issues = d.issues + EXCLUDED.issues
+            )
+            INSERT INTO book_popularity AS p (book_id, total_issues, last_issued)
+            SELECT book_id, COUNT(*), MAX(issue_day)
+            FROM live
+            GROUP BY book_id
+            ORDER BY book_id
+            ON CONFLICT (book_id) DO UPDATE
+            SET total_issues = p.total_issues + EXCLUDED.total_issues,
+                last_issued = GREATEST(p.last_issued, EXCLUDED.last_issued);
+            GET DIAGNOSTICS v_books = ROW_COUNT;
+            RETURN v_books;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+        with db_connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(sql)
+                    conn.commit()
+                print("Book popularity counters created successfully!")
+            except Exception as e:
+                conn.rollback()
+                print(f"Error creating book popularity counters: {e}")
+
+    def backfill_book_popularity(self):
+        # one-off rebuild from the full issues history (e.g. right after create_book_popularity_counters)
+        sql = """
+        LOCK TABLE issues IN SHARE MODE;
+        -- pending deltas belong to issues the rebuild counts anyway
+        TRUNCATE book_popularity, book_popularity_daily, book_popularity_deltas;
+
+        INSERT INTO book_popularity (book_id, total_issues, last_issued)
+        SELECT bc.book_id, COUNT(*), MAX(i.issue_date)
+        FROM issues i
+        JOIN book_copies bc ON bc.copy_id = i.copy_id
+        GROUP BY bc.book_id;
+
+        INSERT INTO book_popularity_daily (book_id, issue_day, issues)
+        SELECT bc.book_id, i.issue_date, COUNT(*)
+        FROM issues i
+        JOIN book_copies bc ON bc.copy_id = i.copy_id
+        WHERE i.issue_date > CURRENT_DATE - %s
+        GROUP BY bc.book_id, i.issue_date;
+        """
+        with db_connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(sql, (POPULARITY_RETENTION_DAYS,))
+                    conn.commit()
+                return {"status": "success", "message": "Book popularity counters rebuilt"}
+            except Exception as e:
+                conn.rollback()
+                return {"status": "error", "message": str(e)}
+
+    def prune_book_popularity_daily(self, keep_days=None):
+        # daily buckets only back the windowed queries; drop the ones no window can reach
+        keep_days = keep_days or POPULARITY_RETENTION_DAYS
+        sql = "DELETE FROM book_popularity_daily WHERE issue_day <= CURRENT_DATE - %s;"
+        with db_connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(sql, (keep_days,))
+                    deleted = cur.rowcount
+                    conn.commit()
+                return {"status": "success", "message": f"Pruned {deleted} popularity buckets"}
+            except Exception as e:
+                conn.rollback()
+                return {"status": "error", "message": str(e)}
+
+    def get_popular_books(self, limit=10, window_days=None):
+        """Top-N books by issue count, all time or over the last ``window_days`` days."""
+        if window_days is None:
+            statement, params = "popular_books_all_time", (limit,)
+        elif 0 < window_days <= POPULARITY_RETENTION_DAYS:
+            statement, params = "popular_books_window", (window_days, limit)
+        else:
+            return {"status": "error", "message": f"window_days must be between 1 and {POPULARITY_RETENTION_DAYS}"}
+
+        with db_connection() as conn:
+            try:
+                with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                    prepared_statements.execute(cur, statement, params)
+                    data = [dict(row) for row in cur.fetchall()]
+                return {"status": "success", "data": data, "window_days": window_days}
+            except Exception as e:
+                return {"status": "error", "message": str(e)}
 
 
     def create_materialized_view_overdue_transactions(self):
@@ -145,41 +358,632 @@ class LibraryDatabaseManager:
         JOIN books b ON bc.book_id = b.book_id
         JOIN student s ON i.student_id = s.student_id;
         """
-        conn = get_connection() 
-        try:
-            with conn.cursor() as cur:
-                cur.execute(sql)
-                conn.commit()
-            print("Materialized view 'mv_overdue_transactions' created successfully!")
-        except Exception as e:
-            print(f"Error creating materialized view: {e}")
-        finally:
-            release_connection(conn) 
+        with db_connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(sql)
+                    conn.commit()
+                print("Materialized view 'mv_overdue_transactions' created successfully!")
+            except Exception as e:
+                print(f"Error creating materialized view: {e}")
 
     def get_materialized_view_overdue_transactions(self):
-        # refresh view before querying
-        try:
-            self.refresh_materialized_view('mv_overdue_transactions')
-        except Exception:
-            pass
-
-        sql = """SELECT * FROM mv_overdue_transactions WHERE status = 'Overdue';"""
-        conn = get_connection() 
-        try:
-            with conn.cursor() as cur:
-                cur.execute(sql)
-                columns = [desc[0] for desc in cur.description] 
-                rows = cur.fetchall()
+        # served as-is; view_refresher keeps the view fresh in the background
+        with db_connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    prepared_statements.execute(cur, "mv_overdue_transactions")
+                    columns = [desc[0] for desc in cur.description] 
+                    rows = cur.fetchall()
 
             
-            data = [dict(zip(columns, row)) for row in rows]
+                data = [dict(zip(columns, row)) for row in rows]
 
 
-            return {"status": "success", "data": data}
-        except Exception as e:
-            return {"status": "error", "message": str(e)}
-        finally:
-            release_connection(conn) 
+                return {"status": "success", "data": data, "freshness": view_refresher.freshness('mv_overdue_transactions')}
+            except Exception as e:
+                return {"status": "error", "message": str(e)}
+
+
+    # Live overdue tracking. mv_overdue_transactions only sees loans that came
+    # back late; every open loan instead carries a due_date (set on insert from
+    # its category's loan policy) in the partial index idx_issues_open_due, so
+    # "overdue as of D" and "due on D" are index range scans over open loans.
+    # Changing a policy affects new loans only; existing due dates stand.
+
+    def create_overdue_tracking(self):
+        sql = f"""
+        CREATE TABLE IF NOT EXISTS loan_policies (
+            category_id INT PRIMARY KEY REFERENCES categories(category_id) ON DELETE CASCADE,
+            loan_days INT CHECK (loan_days > 0)
+        );
+
+        ALTER TABLE issues ADD COLUMN IF NOT EXISTS due_date DATE;
+
+        CREATE OR REPLACE FUNCTION loan_days_for_copy(p_copy_id INT)
+        RETURNS INT AS $$
+            SELECT COALESCE(
+                (SELECT lp.loan_days
+                 FROM book_copies bc
+                 JOIN books b ON b.book_id = bc.book_id
+                 JOIN loan_policies lp ON lp.category_id = b.category
+                 WHERE bc.copy_id = p_copy_id),
+                {DEFAULT_LOAN_DAYS}
+            );
+        $$ LANGUAGE sql STABLE;
+
+        CREATE OR REPLACE FUNCTION set_issue_due_date()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            IF NEW.due_date IS NULL THEN
+                NEW.due_date := COALESCE(NEW.issue_date, CURRENT_DATE) + loan_days_for_copy(NEW.copy_id);
+            END IF;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS trg_issue_due_date ON issues;
+        CREATE TRIGGER trg_issue_due_date
+        BEFORE INSERT ON issues
+        FOR EACH ROW
+        EXECUTE FUNCTION set_issue_due_date();
+
+        CREATE INDEX IF NOT EXISTS idx_issues_open_due ON issues(due_date, issue_id) WHERE returned = 'no';
+        """
+        with db_connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(sql)
+                    conn.commit()
+                print("Overdue tracking created successfully!")
+            except Exception as e:
+                conn.rollback()
+                print(f"Error creating overdue tracking: {e}")
+
+    def backfill_due_dates(self):
+        # set-based due dates for loans inserted before the trigger existed (or with triggers disabled)
+        sql = """
+        UPDATE issues i
+        SET due_date = i.issue_date + COALESCE(lp.loan_days, %s)
+        FROM book_copies bc
+        JOIN books b ON b.book_id = bc.book_id
+        LEFT JOIN loan_policies lp ON lp.category_id = b.category
+        WHERE bc.copy_id = i.copy_id AND i.due_date IS NULL;
+        """
+        with db_connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(sql, (DEFAULT_LOAN_DAYS,))
+                    updated = cur.rowcount
+                    conn.commit()
+                return {"status": "success", "message": f"Due dates set on {updated} issues"}
+            except Exception as e:
+                conn.rollback()
+                return {"status": "error", "message": str(e)}
+
+    def _open_loans_page(self, condition, day, limit, cursor, as_of):
+        page = self._keyset_page(
+            OVERDUE_KEYSET, OPEN_LOANS_SQL, limit, cursor, ["i.returned = 'no'", condition], [day],
+        )
+        if page["status"] == "success":
+            for row in page["data"]:
+                row["days_overdue"] = max(0, (as_of - row["due_date"]).days)
+            page["as_of"] = as_of.isoformat()
+        return page
+
+    def get_overdue_loans(self, as_of=None, limit=None, cursor=None):
+        """Open loans past their due date on ``as_of`` (default today), most overdue first."""
+        as_of = as_of or date.today()
+        return self._open_loans_page("i.due_date < %s", as_of, limit, cursor, as_of)
+
+    def get_loans_becoming_overdue(self, day=None, limit=None, cursor=None):
+        """Open loans that turn overdue on ``day`` (default tomorrow), i.e. are due the day before."""
+        day = day or date.today() + datetime.timedelta(days=1)
+        due = day - datetime.timedelta(days=1)
+        return self._open_loans_page("i.due_date = %s", due, limit, cursor, day)
+
+    def get_loan_policies(self):
+        sql = """
+        SELECT c.category_id, c.name AS category_name, lp.loan_days, lp.fine_per_day, lp.max_fine
+        FROM loan_policies lp
+        JOIN categories c ON c.category_id = lp.category_id
+        ORDER BY c.name;
+        """
+        with db_connection() as conn:
+            try:
+                with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                    cur.execute(sql)
+                    rows = [dict(row) for row in cur.fetchall()]
+                return {
+                    "status": "success",
+                    "data": rows,
+                    "default_loan_days": DEFAULT_LOAN_DAYS,
+                    "default_fine_per_day": DEFAULT_FINE_PER_DAY,
+                }
+            except Exception as e:
+                return {"status": "error", "message": str(e)}
+
+    def set_loan_policy(self, category_id, loan_days=None, fine_per_day=None, max_fine=None):
+        """Set a category's loan period and fine rules; ``None`` falls back to the defaults. Applies to new loans."""
+        if loan_days is None and fine_per_day is None and max_fine is None:
+            sql, params = "DELETE FROM loan_policies WHERE category_id = %s;", (category_id,)
+        else:
+            sql = """
+            INSERT INTO loan_policies (category_id, loan_days, fine_per_day, max_fine) VALUES (%s, %s, %s, %s)
+            ON CONFLICT (category_id) DO UPDATE
+            SET loan_days = EXCLUDED.loan_days, fine_per_day = EXCLUDED.fine_per_day, max_fine = EXCLUDED.max_fine;
+            """
+            params = (category_id, loan_days, fine_per_day, max_fine)
+        with db_connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(sql, params)
+                    conn.commit()
+                days = DEFAULT_LOAN_DAYS if loan_days is None else loan_days
+                return {"status": "success", "message": f"Category {category_id} loan period is {days} days"}
+            except psycopg2.errors.ForeignKeyViolation:
+                conn.rollback()
+                return {"status": "error", "reason": "not_found", "message": f"No category with ID {category_id}"}
+            except Exception as e:
+                conn.rollback()
+                return {"status": "error", "message": str(e)}
+
+
+    # Fines. compute_fine() prices one loan from its due date and the category
+    # policy; every return path charges it into returns.fine_amount, and a
+    # trigger adds it to the student's row in student_fine_balances. Open
+    # overdue loans are priced nightly by accrue_fines(), one set-based pass
+    # over idx_issues_open_due, into fine_accruals and the balances'
+    # ``accruing`` column. Reports read the balances, never SUM(returns).
+
+    def create_fine_engine(self):
+        sql = f"""
+        ALTER TABLE loan_policies ALTER COLUMN loan_days DROP NOT NULL;
+        ALTER TABLE loan_policies ADD COLUMN IF NOT EXISTS fine_per_day NUMERIC(10,2) CHECK (fine_per_day >= 0);
+        ALTER TABLE loan_policies ADD COLUMN IF NOT EXISTS max_fine NUMERIC(10,2) CHECK (max_fine >= 0);
+
+        CREATE TABLE IF NOT EXISTS fine_accruals (
+            issue_id INT PRIMARY KEY REFERENCES issues(issue_id) ON DELETE CASCADE,
+            student_id INT NOT NULL,
+            amount NUMERIC(12,2) NOT NULL,
+            accrued_through DATE NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_fine_accruals_student ON fine_accruals(student_id);
+
+        CREATE TABLE IF NOT EXISTS student_fine_balances (
+            student_id INT PRIMARY KEY REFERENCES student(student_id) ON DELETE CASCADE,
+            charged NUMERIC(12,2) NOT NULL DEFAULT 0,
+            accruing NUMERIC(12,2) NOT NULL DEFAULT 0,
+            balance NUMERIC(12,2) GENERATED ALWAYS AS (charged + accruing) STORED,
+            accrued_through DATE,
+            updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE INDEX IF NOT EXISTS idx_student_fine_balances_balance
+            ON student_fine_balances(balance DESC, student_id DESC);
+
+        -- days late x fine per day, capped at max_fine (LEAST ignores a NULL cap)
+        CREATE OR REPLACE FUNCTION compute_fine(p_issue_id INT, p_as_of DATE)
+        RETURNS NUMERIC AS $$
+            SELECT COALESCE(
+                LEAST(GREATEST(p_as_of - i.due_date, 0) * COALESCE(lp.fine_per_day, {DEFAULT_FINE_PER_DAY}), lp.max_fine),
+                0
+            )
+            FROM issues i
+            JOIN book_copies bc ON bc.copy_id = i.copy_id
+            JOIN books b ON b.book_id = bc.book_id
+            LEFT JOIN loan_policies lp ON lp.category_id = b.category
+            WHERE i.issue_id = p_issue_id;
+        $$ LANGUAGE sql STABLE;
+
+        CREATE OR REPLACE FUNCTION apply_return_fine()
+        RETURNS TRIGGER AS $$
+        DECLARE
+            v_student_id INT;
+            v_accrued NUMERIC;
+        BEGIN
+            -- waits while accrue_fines() is rewriting the accruals
+            PERFORM pg_advisory_xact_lock_shared({FINE_ACCRUAL_LOCK_ID});
+
+            SELECT student_id INTO v_student_id FROM issues WHERE issue_id = NEW.issue_id;
+            IF v_student_id IS NULL THEN
+                RETURN NEW;
+            END IF;
+
+            DELETE FROM fine_accruals WHERE issue_id = NEW.issue_id RETURNING amount INTO v_accrued;
+
+            INSERT INTO student_fine_balances (student_id, charged, accruing, updated_at)
+            VALUES (v_student_id, COALESCE(NEW.fine_amount, 0), 0, CURRENT_TIMESTAMP)
+            ON CONFLICT (student_id) DO UPDATE
+            SET charged = student_fine_balances.charged + EXCLUDED.charged,
+                accruing = GREATEST(student_fine_balances.accruing - COALESCE(v_accrued, 0), 0),
+                updated_at = EXCLUDED.updated_at;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS trg_returns_fine_balance ON returns;
+        CREATE TRIGGER trg_returns_fine_balance
+        AFTER INSERT ON returns
+        FOR EACH ROW
+        EXECUTE FUNCTION apply_return_fine();
+        """
+        with db_connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(sql)
+                    conn.commit()
+                print("Fine engine created successfully!")
+            except Exception as e:
+                conn.rollback()
+                print(f"Error creating fine engine: {e}")
+
+    def _accrue_fines(self, cur, as_of):
+        params = {"as_of": as_of, "default_fine": DEFAULT_FINE_PER_DAY, "lock": FINE_ACCRUAL_LOCK_ID}
+        cur.execute("SELECT pg_advisory_xact_lock(%(lock)s);", params)
+        # accruals of loans returned while the return trigger was disabled (bulk loads)
+        cur.execute("""
+        DELETE FROM fine_accruals a USING issues i
+        WHERE i.issue_id = a.issue_id AND i.returned = 'yes';
+        """)
+        # same pricing as compute_fine(), for every open overdue loan in one statement
+        cur.execute("""
+        INSERT INTO fine_accruals (issue_id, student_id, amount, accrued_through)
+        SELECT i.issue_id, i.student_id,
+               COALESCE(LEAST((%(as_of)s::date - i.due_date) * COALESCE(lp.fine_per_day, %(default_fine)s), lp.max_fine), 0),
+               %(as_of)s
+        FROM issues i
+        JOIN book_copies bc ON bc.copy_id = i.copy_id
+        JOIN books b ON b.book_id = bc.book_id
+        LEFT JOIN loan_policies lp ON lp.category_id = b.category
+        WHERE i.returned = 'no' AND i.due_date < %(as_of)s
+        ON CONFLICT (issue_id) DO UPDATE
+        SET amount = EXCLUDED.amount, accrued_through = EXCLUDED.accrued_through;
+        """, params)
+        accruals = cur.rowcount
+        cur.execute("""
+        INSERT INTO student_fine_balances (student_id, accruing, accrued_through, updated_at)
+        SELECT student_id, SUM(amount), %(as_of)s, CURRENT_TIMESTAMP
+        FROM fine_accruals
+        GROUP BY student_id
+        ON CONFLICT (student_id) DO UPDATE
+        SET accruing = EXCLUDED.accruing, accrued_through = EXCLUDED.accrued_through, updated_at = EXCLUDED.updated_at;
+        """, params)
+        students = cur.rowcount
+        cur.execute("""
+        UPDATE student_fine_balances b
+        SET accruing = 0, accrued_through = %(as_of)s, updated_at = CURRENT_TIMESTAMP
+        WHERE b.accruing <> 0
+        AND NOT EXISTS (SELECT 1 FROM fine_accruals a WHERE a.student_id = b.student_id);
+        """, params)
+        cur.execute("SELECT COALESCE(SUM(amount), 0) FROM fine_accruals;")
+        return {"as_of": as_of.isoformat(), "accruals": accruals, "students": students, "total_accruing": cur.fetchone()[0]}
+
+    def accrue_fines(self, as_of=None):
+        """Nightly batch: price every open overdue loan as of ``as_of`` (default today). Idempotent."""
+        as_of = as_of or date.today()
+        started = time.perf_counter()
+        with db_connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    data = self._accrue_fines(cur, as_of)
+                    conn.commit()
+                view_refresher.mark_dirty("student_fine_balances")
+                data["duration_ms"] = round((time.perf_counter() - started) * 1000, 3)
+                return {"status": "success", "data": data}
+            except Exception as e:
+                conn.rollback()
+                return {"status": "error", "message": str(e)}
+
+    def rebuild_fine_balances(self, as_of=None):
+        # one-off rebuild from returns + open loans (first install, or after a trigger-less bulk load)
+        as_of = as_of or date.today()
+        with db_connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT pg_advisory_xact_lock(%s);", (FINE_ACCRUAL_LOCK_ID,))
+                    cur.execute("TRUNCATE fine_accruals, student_fine_balances;")
+                    cur.execute("""
+                    INSERT INTO student_fine_balances (student_id, charged)
+                    SELECT i.student_id, SUM(r.fine_amount)
+                    FROM returns r
+                    JOIN issues i ON i.issue_id = r.issue_id
+                    WHERE i.student_id IS NOT NULL
+                    GROUP BY i.student_id;
+                    """)
+                    data = self._accrue_fines(cur, as_of)
+                    conn.commit()
+                view_refresher.mark_dirty("student_fine_balances")
+                return {"status": "success", "data": data}
+            except Exception as e:
+                conn.rollback()
+                return {"status": "error", "message": str(e)}
+
+    def get_fine_balances(self, limit=None, cursor=None):
+        """Students with a non-zero balance, largest first, from the pre-aggregated balances."""
+        sql = """
+        SELECT f.student_id, s.name AS student_name, f.charged, f.accruing, f.balance, f.accrued_through
+        FROM student_fine_balances f
+        JOIN student s ON s.student_id = f.student_id
+        """
+        return self._keyset_page(FINES_KEYSET, sql, limit, cursor, ["f.balance > 0"])
+
+    def get_student_fine_balance(self, student_id):
+        sql = """
+        SELECT f.student_id, f.charged, f.accruing, f.balance, f.accrued_through,
+               COALESCE(json_agg(json_build_object('issue_id', a.issue_id, 'amount', a.amount))
+                        FILTER (WHERE a.issue_id IS NOT NULL), '[]') AS accruing_loans
+        FROM student_fine_balances f
+        LEFT JOIN fine_accruals a ON a.student_id = f.student_id
+        WHERE f.student_id = %s
+        GROUP BY f.student_id;
+        """
+        with db_connection() as conn:
+            try:
+                with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                    cur.execute(sql, (student_id,))
+                    row = cur.fetchone()
+                if row is None:
+                    row = {"student_id": student_id, "charged": 0, "accruing": 0, "balance": 0,
+                           "accrued_through": None, "accruing_loans": []}
+                return {"status": "success", "data": dict(row)}
+            except Exception as e:
+                return {"status": "error", "message": str(e)}
+
+
+    # Availability counters. book_availability holds total / available / issued
+    # copies per book. Statement-level triggers on book_copies (transition
+    # tables, so a COPY of 100k copies is one grouped insert) only append
+    # deltas to book_availability_deltas; apply_availability_deltas() folds
+    # them into the per-book rows in the background (counter_deltas.py). A
+    # checkout therefore never locks a per-title row, and concurrent checkouts
+    # of one title only meet on the copy rows SKIP LOCKED spreads them over.
+    # Every path that adds, issues, returns or deletes a copy goes through
+    # book_copies, so the catalog reads availability from one row per book;
+    # get_book_availability() adds the deltas not folded yet.
+    # books.total_copies is the stock and no longer moves on issue / return.
+
+    def create_availability_counters(self):
+        sql = """
+        CREATE TABLE IF NOT EXISTS book_availability (
+            book_id INT PRIMARY KEY REFERENCES books(book_id) ON DELETE CASCADE,
+            total_copies INT NOT NULL DEFAULT 0,
+            available_copies INT NOT NULL DEFAULT 0,
+            issued_copies INT GENERATED ALWAYS AS (total_copies - available_copies) STORED
+        );
+
+        -- append-only: no key, no foreign key, so concurrent inserts never wait on each other
+        CREATE TABLE IF NOT EXISTS book_availability_deltas (
+            book_id INT NOT NULL,
+            total_delta INT NOT NULL,
+            available_delta INT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_book_availability_deltas_book_id ON book_availability_deltas(book_id);
+
+        CREATE OR REPLACE FUNCTION count_copies_insert()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            INSERT INTO book_availability_deltas (book_id, total_delta, available_delta)
+            SELECT n.book_id, COUNT(*), COUNT(*) FILTER (WHERE n.status = 'available')
+            FROM new_copies n
+            WHERE n.book_id IS NOT NULL
+            GROUP BY n.book_id;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE OR REPLACE FUNCTION count_copies_update()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            INSERT INTO book_availability_deltas (book_id, total_delta, available_delta)
+            SELECT d.book_id, SUM(d.total), SUM(d.available)
+            FROM (
+                SELECT o.book_id, -1 AS total, -(o.status = 'available')::int AS available FROM old_copies o
+                UNION ALL
+                SELECT n.book_id, 1, (n.status = 'available')::int FROM new_copies n
+            ) d
+            WHERE d.book_id IS NOT NULL
+            GROUP BY d.book_id
+            HAVING SUM(d.total) <> 0 OR SUM(d.available) <> 0;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE OR REPLACE FUNCTION count_copies_delete()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            INSERT INTO book_availability_deltas (book_id, total_delta, available_delta)
+            SELECT o.book_id, -COUNT(*), -COUNT(*) FILTER (WHERE o.status = 'available')
+            FROM old_copies o
+            WHERE o.book_id IS NOT NULL
+            GROUP BY o.book_id;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        -- Folds every committed delta into book_availability and returns the
+        -- number of books whose counters moved. Concurrent callers are safe:
+        -- a delta row is deleted (and so applied) by exactly one of them.
+        CREATE OR REPLACE FUNCTION apply_availability_deltas()
+        RETURNS INT AS $$
+        DECLARE
+            v_books INT;
+        BEGIN
+            WITH moved AS (
+                DELETE FROM book_availability_deltas
+                RETURNING book_id, total_delta, available_delta
+            )
+            INSERT INTO book_availability AS av (book_id, total_copies, available_copies)
+            SELECT m.book_id, SUM(m.total_delta), SUM(m.available_delta)
+            FROM moved m
+            JOIN books b ON b.book_id = m.book_id   -- deltas of deleted books are dropped
+            GROUP BY m.book_id
+            HAVING SUM(m.total_delta) <> 0 OR SUM(m.available_delta) <> 0
+            ORDER BY m.book_id
+            ON CONFLICT (book_id) DO UPDATE
+            SET total_copies = av.total_copies + EXCLUDED.total_copies,
+                available_copies = av.available_copies + EXCLUDED.available_copies;
+            GET DIAGNOSTICS v_books = ROW_COUNT;
+            RETURN v_books;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        -- no writes to book_copies between the backfill and the triggers going live
+        LOCK TABLE book_copies IN SHARE MODE;
+
+        DROP TRIGGER IF EXISTS trg_book_copies_count_insert ON book_copies;
+        CREATE TRIGGER trg_book_copies_count_insert
+        AFTER INSERT ON book_copies
+        REFERENCING NEW TABLE AS new_copies
+        FOR EACH STATEMENT
+        EXECUTE FUNCTION count_copies_insert();
+
+        DROP TRIGGER IF EXISTS trg_book_copies_count_update ON book_copies;
+        CREATE TRIGGER trg_book_copies_count_update
+        AFTER UPDATE ON book_copies
+        REFERENCING OLD TABLE AS old_copies NEW TABLE AS new_copies
+        FOR EACH STATEMENT
+        EXECUTE FUNCTION count_copies_update();
+
+        DROP TRIGGER IF EXISTS trg_book_copies_count_delete ON book_copies;
+        CREATE TRIGGER trg_book_copies_count_delete
+        AFTER DELETE ON book_copies
+        REFERENCING OLD TABLE AS old_copies
+        FOR EACH STATEMENT
+        EXECUTE FUNCTION count_copies_delete();
+
+        -- the backfill below counts every copy, including any pending delta
+        TRUNCATE book_availability_deltas;
+
+        INSERT INTO book_availability (book_id, total_copies, available_copies)
+        SELECT book_id, COUNT(*), COUNT(*) FILTER (WHERE status = 'available')
+        FROM book_copies
+        WHERE book_id IS NOT NULL
+        GROUP BY book_id
+        ON CONFLICT (book_id) DO UPDATE
+        SET total_copies = EXCLUDED.total_copies, available_copies = EXCLUDED.available_copies;
+
+        -- undo the old decrement-on-issue drift; a stock correction, not a catalog edit to audit
+        ALTER TABLE books DISABLE TRIGGER trg_books_audit;
+        UPDATE books b SET total_copies = av.total_copies
+        FROM book_availability av
+        WHERE av.book_id = b.book_id AND b.total_copies <> av.total_copies;
+        ALTER TABLE books ENABLE TRIGGER trg_books_audit;
+        """
+        with db_connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(sql)
+                    conn.commit()
+                print("Availability counters created successfully!")
+            except Exception as e:
+                conn.rollback()
+                print(f"Error creating availability counters: {e}")
+
+    def create_catalog_change_feed(self):
+        # change_xid is the id of the transaction that last wrote the row, so
+        # catalog_snapshot can poll "everything written since snapshot xmin N"
+        # through an index; a sequence value would be taken before commit and
+        # could land behind a mark that has already moved on
+        sql = """
+        ALTER TABLE book_availability
+            ADD COLUMN IF NOT EXISTS change_xid xid8 NOT NULL DEFAULT pg_current_xact_id();
+        CREATE INDEX IF NOT EXISTS idx_book_availability_change_xid ON book_availability(change_xid);
+
+        ALTER TABLE books_audit_log
+            ADD COLUMN IF NOT EXISTS change_xid xid8 NOT NULL DEFAULT pg_current_xact_id();
+        CREATE INDEX IF NOT EXISTS idx_books_audit_log_change_xid ON books_audit_log(change_xid);
+
+        CREATE OR REPLACE FUNCTION stamp_availability_change()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            NEW.change_xid := pg_current_xact_id();
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS trg_book_availability_change_xid ON book_availability;
+        CREATE TRIGGER trg_book_availability_change_xid
+        BEFORE UPDATE ON book_availability
+        FOR EACH ROW
+        EXECUTE FUNCTION stamp_availability_change();
+
+        -- every book gets a counter row when it is inserted, so new books
+        -- (with or without copies) show up in the same feed
+        CREATE OR REPLACE FUNCTION add_book_availability()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            INSERT INTO book_availability (book_id) VALUES (NEW.book_id)
+            ON CONFLICT (book_id) DO NOTHING;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS trg_books_add_availability ON books;
+        CREATE TRIGGER trg_books_add_availability
+        AFTER INSERT ON books
+        FOR EACH ROW
+        EXECUTE FUNCTION add_book_availability();
+
+        INSERT INTO book_availability (book_id)
+        SELECT book_id FROM books
+        ON CONFLICT (book_id) DO NOTHING;
+        """
+        with db_connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(sql)
+                    conn.commit()
+                print("Catalog change feed created successfully!")
+            except Exception as e:
+                conn.rollback()
+                print(f"Error creating catalog change feed: {e}")
+
+    def get_book_availability(self, book_id):
+        # exact: the folded counters plus this book's deltas not applied yet
+        sql = """
+        SELECT b.book_id,
+               COALESCE(av.total_copies, 0) + COALESCE(d.total, 0) AS total_copies,
+               COALESCE(av.available_copies, 0) + COALESCE(d.available, 0) AS available_copies,
+               COALESCE(av.issued_copies, 0) + COALESCE(d.total, 0) - COALESCE(d.available, 0) AS issued_copies
+        FROM books b
+        LEFT JOIN book_availability av ON av.book_id = b.book_id
+        LEFT JOIN LATERAL (
+            SELECT SUM(total_delta) AS total, SUM(available_delta) AS available
+            FROM book_availability_deltas
+            WHERE book_id = b.book_id
+        ) d ON true
+        WHERE b.book_id = %s;
+        """
+        with db_connection() as conn:
+            try:
+                with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                    cur.execute(sql, (book_id,))
+                    row = cur.fetchone()
+                if row is None:
+                    return {"status": "error", "reason": "not_found", "message": f"No book found with ID {book_id}."}
+                return {"status": "success", "data": dict(row)}
+            except Exception as e:
+                return {"status": "error", "message": str(e)}
+
+    def apply_counter_deltas(self):
+        """Fold pending counter deltas into the per-book rows (run by counter_deltas.counter_applier)."""
+        with db_connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT apply_availability_deltas(), apply_popularity_deltas();")
+                    availability_books, popularity_books = cur.fetchone()
+                    conn.commit()
+                if availability_books:
+                    view_refresher.mark_dirty("book_availability")
+                if popularity_books:
+                    view_refresher.mark_dirty("book_popularity")
+                return {
+                    "status": "success",
+                    "data": {"availability_books": availability_books, "popularity_books": popularity_books},
+                }
+            except Exception as e:
+                conn.rollback()
+                return {"status": "error", "message": str(e)}
 
     def create_materialized_view_all_books_summary(self):
         sql = """
@@ -194,43 +998,35 @@ class LibraryDatabaseManager:
         FROM books b
         JOIN author a ON b.author = a.author_id
         JOIN categories c ON b.category = c.category_id;
+
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_all_books_summary_book_id ON mv_all_books_summary(book_id);
         """
-        conn = get_connection()
-        try:
-            with conn.cursor() as cur:
-                cur.execute(sql)
-                conn.commit()
-            print("Materialized view 'mv_all_books_summary' created successfully!")
-        except Exception as e:
-            print(f"Error creating materialized view: {e}")
-        finally:
-            release_connection(conn)
+        with db_connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(sql)
+                    conn.commit()
+                print("Materialized view 'mv_all_books_summary' created successfully!")
+            except Exception as e:
+                print(f"Error creating materialized view: {e}")
 
     def get_all_books_from_materialized_view(self):
-        # refresh view before querying
-        try:
-            self.refresh_materialized_view('mv_all_books_summary')
-        except Exception:
-            pass
-
-        sql = """SELECT * FROM mv_all_books_summary;"""
-        conn = get_connection()
-        try:
-            with conn.cursor() as cur:
-                cur.execute(sql)
-                rows = cur.fetchall()
-                columns = [desc[0] for desc in cur.description]
+        # served as-is; view_refresher keeps the view fresh in the background
+        with db_connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    prepared_statements.execute(cur, "mv_all_books_summary")
+                    rows = cur.fetchall()
+                    columns = [desc[0] for desc in cur.description]
 
             
-            data = [dict(zip(columns, row)) for row in rows]
+                data = [dict(zip(columns, row)) for row in rows]
 
-            return {"status": "success", "data": data}
+                return {"status": "success", "data": data, "freshness": view_refresher.freshness('mv_all_books_summary')}
 
-        except Exception as e:
-            print(f"Error fetching all books summary: {e}")
-            return {"status": "error", "message": str(e)}
-        finally:
-            release_connection(conn)
+            except Exception as e:
+                print(f"Error fetching all books summary: {e}")
+                return {"status": "error", "message": str(e)}
 
     def create_materialized_view_user_borrowing_history(self):
         sql = """
@@ -248,102 +1044,82 @@ class LibraryDatabaseManager:
         JOIN books b ON bc.book_id = b.book_id
         LEFT JOIN returns r ON i.issue_id = r.issue_id;
         """
-        conn = get_connection()
-        try:
+        with db_connection() as conn:
             with conn.cursor() as cur:
                 cur.execute(sql)
                 conn.commit()
-        finally:
-            release_connection(conn)
         
 
     def get_user_borrowing_history(self, user_id):
-        # refresh view before querying
-        try:
-            self.refresh_materialized_view('mv_user_borrowing_history')
-        except Exception:
-            pass
-
-        sql = f"""SELECT * FROM mv_user_borrowing_history WHERE student_id = {user_id};"""
-        conn = get_connection()
-        try:
-            with conn.cursor() as cur:
-                cur.execute(sql, (user_id,))
-                rows = cur.fetchall()
-                columns = [desc[0] for desc in cur.description]
-
-            data = []
-            for row in rows:
-                record = dict(zip(columns, row))
-                
-                for k, v in record.items():
-                    if isinstance(v, (datetime.date, datetime.datetime)):
-                        record[k] = v.isoformat()
-                data.append(record)
-
-            return {"status": "success", "data": data}
+        # served as-is; view_refresher keeps the view fresh in the background
+        with db_connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    prepared_statements.execute(cur, "mv_user_borrowing_history", (user_id,))
+                    rows = cur.fetchall()
+                    columns = [desc[0] for desc in cur.description]
+                # dates stay dates; serialization.dumps encodes them
+                data = [dict(zip(columns, row)) for row in rows]
+                return {"status": "success", "data": data, "freshness": view_refresher.freshness('mv_user_borrowing_history')}
 
-        except Exception as e:
-            return {"status": "error", "message": str(e)}
-        finally:
-            release_connection(conn)
+            except Exception as e:
+                return {"status": "error", "message": str(e)}
 
     def create_materialized_view_issued_report(self):
+        # one row per loan. The loan's fine is what its return charged or, while
+        # it is still out, what the nightly accrual priced it at; the student_*
+        # columns are the student's row in student_fine_balances, so the report
+        # and /fines/ agree on every student
         sql = """
         CREATE MATERIALIZED VIEW IF NOT EXISTS mv_issued_report AS
-        SELECT 
+        SELECT
             s.student_id,
             s.name AS student_name,
             i.issue_id,
             i.copy_id,
-            COALESCE(SUM(r.fine_amount), 0) AS total_fines,
-            i.returned
+            COALESCE(r.charged, 0) AS fine_charged,
+            COALESCE(fa.amount, 0) AS fine_accruing,
+            COALESCE(r.charged, 0) + COALESCE(fa.amount, 0) AS total_fines,
+            i.returned,
+            COALESCE(fb.charged, 0) AS student_charged,
+            COALESCE(fb.accruing, 0) AS student_accruing,
+            COALESCE(fb.balance, 0) AS student_balance
         FROM issues i
         JOIN student s ON i.student_id = s.student_id
-        LEFT JOIN returns r ON r.issue_id = i.issue_id
-        GROUP BY s.student_id, s.name, i.issue_id, i.copy_id, i.returned;
+        LEFT JOIN LATERAL (
+            SELECT SUM(fine_amount) AS charged FROM returns WHERE returns.issue_id = i.issue_id
+        ) r ON true
+        LEFT JOIN fine_accruals fa ON fa.issue_id = i.issue_id AND i.returned = 'no'
+        LEFT JOIN student_fine_balances fb ON fb.student_id = s.student_id;
 
         CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_issued_report_issue_id ON mv_issued_report(issue_id);
         """
-        conn = get_connection()
-        try:
+        with db_connection() as conn:
             with conn.cursor() as cur:
                 cur.execute(sql)
                 conn.commit()
-        finally:
-            release_connection(conn)
 
-    def get_issued_report(self):
-        # refresh view before querying
-        try:
-            self.refresh_materialized_view('mv_issued_report')
-        except Exception:
-            pass
+    def drop_materialized_view_issued_report(self):
+        # the pre-fine-engine definition summed returns only; CREATE ... IF NOT EXISTS would keep it
+        with db_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("DROP MATERIALIZED VIEW IF EXISTS mv_issued_report;")
+                conn.commit()
 
-        sql = """SELECT * FROM mv_issued_report """
-        conn = get_connection()
+    def get_issued_report(self):
+        # served as-is; view_refresher keeps the view fresh in the background
+        with db_connection() as conn:
     
-        try:
-            with conn.cursor() as cur:
-                cur.execute(sql)
-                rows = cur.fetchall()
-                columns = [desc[0] for desc in cur.description]
-            data = []
-            for row in rows:
-                record = {}
-                for col, val in zip(columns, row):
-                    if isinstance(val, decimal.Decimal):
-                        record[col] = float(val)
-                    elif isinstance(val, date):
-                        record[col] = val.isoformat()
-                    else:
-                        record[col] = val
-                data.append(record)
-            return {"status": "success", "data": data}
-        except Exception as e:
-            return {"status": "error", "message": str(e)}
-        finally:
-            release_connection(conn)
+            try:
+                with conn.cursor() as cur:
+                    prepared_statements.execute(cur, "mv_issued_report")
+                    rows = cur.fetchall()
+                    columns = [desc[0] for desc in cur.description]
+                # Decimal / date stay as fetched; serialization.dumps encodes them
+                data = [dict(zip(columns, row)) for row in rows]
+                return {"status": "success", "data": data, "freshness": view_refresher.freshness('mv_issued_report')}
+            except Exception as e:
+                return {"status": "error", "message": str(e)}
 
     # PART 2: TRIGGERS
 
@@ -357,20 +1133,19 @@ class LibraryDatabaseManager:
         END;
         $$ LANGUAGE plpgsql;
 
+        DROP TRIGGER IF EXISTS trg_after_issue ON issues;
         CREATE TRIGGER trg_after_issue
         AFTER INSERT ON issues
         FOR EACH ROW
         EXECUTE FUNCTION update_status_after_issue();
         """
-        conn = get_connection()
-        try:
-            with conn.cursor() as cur:
-                cur.execute(sql)
-                conn.commit()
-        except Exception as e:
-            print(f"Error creating trigger for book issue: {e}")
-        finally:
-            release_connection(conn)
+        with db_connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(sql)
+                    conn.commit()
+            except Exception as e:
+                print(f"Error creating trigger for book issue: {e}")
 
     def create_after_book_return_trigger(self):
         sql = """
@@ -383,20 +1158,19 @@ class LibraryDatabaseManager:
         END;
         $$ LANGUAGE plpgsql;
 
+        DROP TRIGGER IF EXISTS trg_after_return ON returns;
         CREATE TRIGGER trg_after_return
         AFTER INSERT ON returns
         FOR EACH ROW
         EXECUTE FUNCTION update_status_after_return();
         """
-        conn = get_connection()
-        try:
-            with conn.cursor() as cur:
-                cur.execute(sql)
-                conn.commit()
-        except Exception as e:
-            print(f"Error creating trigger for book return: {e}")
-        finally:
-            release_connection(conn)
+        with db_connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(sql)
+                    conn.commit()
+            except Exception as e:
+                print(f"Error creating trigger for book return: {e}")
         
 
     def create_books_audit_log_trigger(self):
@@ -417,21 +1191,20 @@ class LibraryDatabaseManager:
         END;
         $$ LANGUAGE plpgsql;
 
+        DROP TRIGGER IF EXISTS trg_books_audit ON books;
         CREATE TRIGGER trg_books_audit
         AFTER UPDATE OR DELETE ON books
         FOR EACH ROW
         EXECUTE FUNCTION log_books_changes();
         """
-        conn = get_connection()
-        try:
-            with conn.cursor() as cur:
-                cur.execute(sql)
-                conn.commit()
-        except Exception as e:
+        with db_connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(sql)
+                    conn.commit()
+            except Exception as e:
             
-            print(f"Error creating books audit log trigger: {e}")
-        finally:
-            release_connection(conn)
+                print(f"Error creating books audit log trigger: {e}")
 
     def create_new_book_trigger(self):
         sql = """
@@ -458,74 +1231,92 @@ class LibraryDatabaseManager:
 
 
         """
-        conn = get_connection() 
-        try:
-            with conn.cursor() as cur:
-                cur.execute(sql)
-                conn.commit()
-                print("New book trigger created successfully.")
-        except Exception as e:
-            print(f"Error creating new book trigger: {e}")
-        finally:
-            release_connection(conn)
+        with db_connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(sql)
+                    conn.commit()
+                    print("New book trigger created successfully.")
+            except Exception as e:
+                print(f"Error creating new book trigger: {e}")
+    def _resolve_name_id(self, cur, cache, name, select_statement, insert_statement, pending):
+        # cached ids are only ever ones that were committed; new ids wait in `pending`
+        cached = cache.get(name)
+        if cached is not None:
+            return cached
+        prepared_statements.execute(cur, select_statement, (name,))
+        result = cur.fetchone()
+        if result:
+            value = result[0]
+        else:
+            prepared_statements.execute(cur, insert_statement, (name,))
+            value = cur.fetchone()[0]
+        pending.append((cache, name, value))
+        return value
+
     def insert_book(self, title, author_name, category_name, isbn, total_copies, shelf_location):
-        conn = get_connection()
+        with db_connection() as conn:
+            for attempt in range(2):
+                pending = []
+                try:
+                    with conn.cursor() as cur:
+                        # resolve author
+                        author_id = self._resolve_name_id(
+                            cur, author_cache, author_name, "author_id_by_name", "insert_author", pending,
+                        )
+
+                        # resolve category
+                        category_id = self._resolve_name_id(
+                            cur, category_cache, category_name, "category_id_by_name", "insert_category", pending,
+                        )
+
+                        # insert book
+                        prepared_statements.execute(
+                            cur, "insert_book_row", (title, author_id, category_id, isbn, total_copies)
+                        )
+                        book_id = cur.fetchone()[0]
+
+                        # insert all copies in one statement and capture their ids
+                        prepared_statements.execute(
+                            cur, "insert_book_copies", (book_id, shelf_location, int(total_copies))
+                        )
+                        inserted_copy_ids = sorted(row[0] for row in cur.fetchall())
+
+                        conn.commit()
+                        for cache, name, value in pending:
+                            cache.put(name, value)
+                        view_refresher.mark_dirty("books")
+
+                        return {
+                            "status": "success",
+                            "message": f"Book '{title}' inserted successfully with Book ID: {book_id} and Copy ID: {inserted_copy_ids[0]}.",
+                            "book_id": book_id,
+                            "copy_ids": inserted_copy_ids
+                        }
+
+                except psycopg2.errors.ForeignKeyViolation as e:
+                    # a cached author/category was deleted elsewhere; drop the caches and retry once
+                    conn.rollback()
+                    clear_name_caches()
+                    if attempt:
+                        return {"status": "error", "message": str(e)}
+                except Exception as e:
+                    conn.rollback()
+                    return {"status": "error", "message": str(e)}
+
+
+    def bulk_insert_books(self, records, chunk_size=IMPORT_CHUNK_SIZE):
+        """Set-based import of many books (see bulk_import.py); records are raw dicts."""
         try:
-            with conn.cursor() as cur:
-                # resolve author
-                cur.execute("SELECT author_id FROM author WHERE LOWER(name)=LOWER(%s)", (author_name,))
-                result = cur.fetchone()
-                if result:
-                    author_id = result[0]
-                else:
-                    cur.execute("INSERT INTO author (name, bio) VALUES (%s, 'Bio not provided') RETURNING author_id;",
-                                (author_name,))
-                    author_id = cur.fetchone()[0]
-
-                # resolve category
-                cur.execute("SELECT category_id FROM categories WHERE LOWER(name)=LOWER(%s)", (category_name,))
-                result = cur.fetchone()
-                if result:
-                    category_id = result[0]
-                else:
-                    cur.execute("INSERT INTO categories (name) VALUES (%s) RETURNING category_id;", (category_name,))
-                    category_id = cur.fetchone()[0]
-
-                # insert book
-                cur.execute("""
-                    INSERT INTO books (title, author, category, isbn, total_copies)
-                    VALUES (%s, %s, %s, %s, %s)
-                    RETURNING book_id
-                """, (title, author_id, category_id, isbn, total_copies))
-                book_id = cur.fetchone()[0]
-
-                # insert copies and capture their ids
-                inserted_copy_ids = []
-                for _ in range(int(total_copies)):
-                    cur.execute("""
-                        INSERT INTO book_copies (book_id, status, shelf_location)
-                        VALUES (%s, 'available', %s)
-                        RETURNING copy_id
-                    """, (book_id, shelf_location))
-                    new_copy_id = cur.fetchone()[0]
-                    inserted_copy_ids.append(new_copy_id)
-
-                conn.commit()
-
-                return {
-                    "status": "success",
-                    "message": f"Book '{title}' inserted successfully with Book ID: {book_id} and Copy ID: {inserted_copy_ids[0]}.",
-                    "book_id": book_id,
-                    "copy_ids": inserted_copy_ids
-                }
-
+            report = import_records(records, chunk_size)
+            return {"status": "success", **report}
         except Exception as e:
-            conn.rollback()
             return {"status": "error", "message": str(e)}
-        finally:
-            release_connection(conn)
 
 
+    def get_name_cache_stats(self):
+        return {"status": "success", "data": name_cache_stats()}
+
 
     def create_book_delete_trigger(self):
         sql = """
@@ -569,40 +1360,39 @@ class LibraryDatabaseManager:
         FOR EACH ROW
         EXECUTE FUNCTION handle_book_delete();
         """
-        conn = get_connection()
-        try:
-            with conn.cursor() as cur:
-                cur.execute(sql)
-                conn.commit()
-                print("Book delete trigger created successfully.")
-        except Exception as e:
-            print(f"Error creating book delete trigger: {e}")
-        finally:
-            release_connection(conn)
+        with db_connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(sql)
+                    conn.commit()
+                    print("Book delete trigger created successfully.")
+            except Exception as e:
+                print(f"Error creating book delete trigger: {e}")
 
 
     def delete_book(self, book_id):
-        conn = get_connection()
-        try:
-            with conn.cursor() as cur:
-                # Check if book exists by ID
-                cur.execute("SELECT book_id FROM books WHERE book_id = %s;", (book_id,))
-                result = cur.fetchone()
+        with db_connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    # Check if book exists by ID
+                    prepared_statements.execute(cur, "book_names_by_id", (book_id,))
+                    result = cur.fetchone()
 
-                if not result:
-                    return {"status": "error", "message": f"No book found with ID {book_id}."}
+                    if not result:
+                        return {"status": "error", "message": f"No book found with ID {book_id}."}
 
-                # Delete book by ID
-                cur.execute("DELETE FROM books WHERE book_id = %s;", (book_id,))
-                conn.commit()
+                    # Delete book by ID
+                    prepared_statements.execute(cur, "delete_book_by_id", (book_id,))
+                    conn.commit()
+                    # handle_book_delete may have dropped the now-orphaned author/category
+                    evict_book_names(result[1], result[2])
+                    view_refresher.mark_dirty("books")
 
-                return {"status": "success", "message": f"Book with ID {book_id} deleted successfully."}
+                    return {"status": "success", "message": f"Book with ID {book_id} deleted successfully."}
 
-        except Exception as e:
-            conn.rollback()
-            return {"status": "error", "message": str(e)}
-        finally:
-            release_connection(conn)
+            except Exception as e:
+                conn.rollback()
+                return {"status": "error", "message": str(e)}
 
 
 
@@ -627,30 +1417,27 @@ class LibraryDatabaseManager:
         END;
         $$;
         """
-        conn = get_connection()
-        try:
-            with conn.cursor() as cur:
-                cur.execute(sql)
-                conn.commit()
-            print("Stored procedure 'insert_book' created successfully!")
-        except Exception as e:
-            print(f"Error creating stored procedure: {e}")
-        finally:
-            release_connection(conn)
+        with db_connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(sql)
+                    conn.commit()
+                print("Stored procedure 'insert_book' created successfully!")
+            except Exception as e:
+                print(f"Error creating stored procedure: {e}")
         
         
     def stored_procedure_insert_book(self, title, author, category, isbn, total_copies):
         sql = "CALL insert_book(%s, %s, %s, %s, %s);"
-        conn = get_connection()
-        try:
-            with conn.cursor() as cur:
-                cur.execute(sql, (title, author, category, isbn, total_copies))
-                conn.commit()
-            return {"status": "success", "message": f"Book '{title}' inserted successfully!"}
-        except Exception as e:
-            return {"status": "error", "message": str(e)}
-        finally:
-            release_connection(conn)
+        with db_connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(sql, (title, author, category, isbn, total_copies))
+                    conn.commit()
+                view_refresher.mark_dirty("books")
+                return {"status": "success", "message": f"Book '{title}' inserted successfully!"}
+            except Exception as e:
+                return {"status": "error", "message": str(e)}
 
 
     def create_stored_procedure_delete_book(self):
@@ -664,29 +1451,30 @@ class LibraryDatabaseManager:
         END;
         $$;
         """
-        conn = get_connection()
-        try:
-            with conn.cursor() as cur:
-                cur.execute(sql)
-                conn.commit()
-            print("Stored procedure 'delete_book' created successfully!")
-        except Exception as e:
-            print(f"Error creating stored procedure: {e}")
-        finally:
-            release_connection(conn)
+        with db_connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(sql)
+                    conn.commit()
+                print("Stored procedure 'delete_book' created successfully!")
+            except Exception as e:
+                print(f"Error creating stored procedure: {e}")
             
     def stored_procedure_delete_book(self, book_id):
         sql = "CALL delete_book(%s);"
-        conn = get_connection()
-        try:
-            with conn.cursor() as cur:
-                cur.execute(sql, (book_id,))
-                conn.commit()
-            return {"status": "success", "message": f"Book with ID {book_id} deleted successfully!"}
-        except Exception as e:
-            return {"status": "error", "message": str(e)}
-        finally:
-            release_connection(conn)
+        with db_connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT author, category FROM books WHERE book_id = %s;", (book_id,))
+                    names = cur.fetchone()
+                    cur.execute(sql, (book_id,))
+                    conn.commit()
+                if names:
+                    evict_book_names(*names)
+                view_refresher.mark_dirty("books")
+                return {"status": "success", "message": f"Book with ID {book_id} deleted successfully!"}
+            except Exception as e:
+                return {"status": "error", "message": str(e)}
 
     def create_stored_procedure_issue_book(self):
         sql = """
@@ -694,132 +1482,166 @@ class LibraryDatabaseManager:
         LANGUAGE plpgsql
         AS $$
         BEGIN
+            -- conditional update: of two concurrent checkouts of one copy only the first matches
+            UPDATE book_copies SET status = 'issue' WHERE copy_id = p_copy_id AND status = 'available';
+            IF NOT FOUND THEN
+                RAISE EXCEPTION 'Copy % is not available', p_copy_id USING ERRCODE = 'no_data_found';
+            END IF;
             INSERT INTO issues(student_id, copy_id, issue_date, returned)
             VALUES (p_student_id, p_copy_id, p_issue_date, 'no');
-            UPDATE book_copies SET status = 'issue' WHERE copy_id = p_copy_id;
         END;
         $$;
         """
-        conn = get_connection()
-        try:
-            with conn.cursor() as cur:
-                cur.execute(sql)
-                conn.commit()
-            print("Stored procedure 'delete_book' created successfully!")
-        except Exception as e:
-            print(f"Error creating stored procedure: {e}")
-        finally:
-            release_connection(conn)
+        with db_connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(sql)
+                    conn.commit()
+                print("Stored procedure 'delete_book' created successfully!")
+            except Exception as e:
+                print(f"Error creating stored procedure: {e}")
         
 
     def create_stored_procedure_return_book(self):
         sql = """
-        CREATE OR REPLACE PROCEDURE return_book(p_issue_id INT, p_return_date DATE, p_fine NUMERIC)
+        CREATE OR REPLACE PROCEDURE return_book(p_issue_id INT, p_return_date DATE, p_fine NUMERIC DEFAULT NULL)
         LANGUAGE plpgsql
         AS $$
         BEGIN
+            -- p_fine overrides the policy fine (e.g. a waiver); NULL means compute it
             INSERT INTO returns(issue_id, return_date, fine_amount)
-            VALUES (p_issue_id, p_return_date, p_fine);
+            VALUES (p_issue_id, p_return_date, COALESCE(p_fine, compute_fine(p_issue_id, p_return_date)));
             UPDATE issues SET returned = 'yes' WHERE issue_id = p_issue_id;
         END;
         $$;
         """
-        conn = get_connection()
-        try:
-            with conn.cursor() as cur:
-                cur.execute(sql)
-                conn.commit()
-            print("Stored procedure 'return_book' created successfully!")
-        except Exception as e:
-            print(f"Error creating stored procedure: {e}")
-        finally:
-            release_connection(conn)
+        with db_connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(sql)
+                    conn.commit()
+                print("Stored procedure 'return_book' created successfully!")
+            except Exception as e:
+                print(f"Error creating stored procedure: {e}")
             
     def stored_procedure_issue_book(self, student_id, copy_id, issue_date):
         sql = "CALL issue_book(%s, %s, %s);"
-        conn = get_connection()
-        try:
-            with conn.cursor() as cur:
-                cur.execute(sql, (student_id, copy_id, issue_date))
-                conn.commit()
-            return {"status": "success", "message": f"Book issued successfully to student ID {student_id}!"}
-        except Exception as e:
-            return {"status": "error", "message": str(e)}
-        finally:
-            release_connection(conn)
+        with db_connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(sql, (student_id, copy_id, issue_date))
+                    conn.commit()
+                view_refresher.mark_dirty("issues")
+                return {"status": "success", "message": f"Book issued successfully to student ID {student_id}!"}
+            except Exception as e:
+                return {"status": "error", "message": str(e)}
             
-    def stored_procedure_return_book(self, issue_id, return_date, fine):
+    def stored_procedure_return_book(self, issue_id, return_date, fine=None):
         sql = "CALL return_book(%s, %s, %s);"
-        conn = get_connection()
-        try:
-            with conn.cursor() as cur:
-                cur.execute(sql, (issue_id, return_date, fine))
-                conn.commit()
-            return {"status": "success", "message": f"Book returned successfully for issue ID {issue_id}!"}
-        except Exception as e:
-            return {"status": "error", "message": str(e)}
-        finally:
-            release_connection(conn)
+        with db_connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(sql, (issue_id, return_date, fine))
+                    conn.commit()
+                view_refresher.mark_dirty("returns")
+                return {"status": "success", "message": f"Book returned successfully for issue ID {issue_id}!"}
+            except Exception as e:
+                return {"status": "error", "message": str(e)}
             
     def create_issue_procedure(self):
-            sql = """
-            CREATE OR REPLACE PROCEDURE issue_book(p_book_id INT, p_student_id INT)
-            LANGUAGE plpgsql
-            AS $$
-            DECLARE
-                v_copy_id INT;
-            BEGIN
-                SELECT copy_id INTO v_copy_id
-                FROM book_copies
-                WHERE book_id = p_book_id AND status = 'available'
-                LIMIT 1;
-
-                IF v_copy_id IS NULL THEN
-                    RAISE NOTICE 'No available copies for this book.';
-                    RETURN;
-                END IF;
-
-                INSERT INTO issues (student_id, copy_id, issue_date)
-                VALUES (p_student_id, v_copy_id, CURRENT_DATE);
-
-                UPDATE books
-                SET total_copies = total_copies - 1
-                WHERE book_id = p_book_id;
-
-                UPDATE book_copies
-                SET status = 'issue'
-                WHERE copy_id = v_copy_id;
-
-                RAISE NOTICE 'Book (ID: %) issued successfully to student (ID: %).', p_book_id, p_student_id;
-            END;
-            $$;
-            """
-            conn = get_connection()
+        sql = """
+        -- available copies of a book, in allocation order; keeps the SKIP LOCKED probe an index scan
+        CREATE INDEX IF NOT EXISTS idx_book_copies_available
+            ON book_copies(book_id, copy_id) WHERE status = 'available';
+
+        CREATE OR REPLACE FUNCTION allocate_copy(p_book_id INT, p_student_id INT, p_issue_date DATE DEFAULT CURRENT_DATE)
+        RETURNS TABLE (issue_id INT, copy_id INT)
+        LANGUAGE plpgsql
+        AS $$
+        #variable_conflict use_column
+        DECLARE
+            v_copy_id INT;
+            v_issue_id INT;
+        BEGIN
+            -- SKIP LOCKED: concurrent checkouts of the same book each claim a different
+            -- copy instead of queueing on (or double-issuing) the first available one
+            UPDATE book_copies bc
+            SET status = 'issue'
+            WHERE bc.copy_id = (
+                SELECT c.copy_id
+                FROM book_copies c
+                WHERE c.book_id = p_book_id AND c.status = 'available'
+                ORDER BY c.copy_id
+                LIMIT 1
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING bc.copy_id INTO v_copy_id;
+
+            IF v_copy_id IS NULL THEN
+                RAISE EXCEPTION 'No available copies for book %', p_book_id USING ERRCODE = 'no_data_found';
+            END IF;
+
+            INSERT INTO issues (student_id, copy_id, issue_date, returned)
+            VALUES (p_student_id, v_copy_id, COALESCE(p_issue_date, CURRENT_DATE), 'no')
+            RETURNING issues.issue_id INTO v_issue_id;
+
+            RETURN QUERY SELECT v_issue_id, v_copy_id;
+        END;
+        $$;
+
+        CREATE OR REPLACE PROCEDURE issue_book(p_book_id INT, p_student_id INT)
+        LANGUAGE plpgsql
+        AS $$
+        BEGIN
+            PERFORM allocate_copy(p_book_id, p_student_id, CURRENT_DATE);
+        END;
+        $$;
+        """
+        with db_connection() as conn:
             try:
                 with conn.cursor() as cur:
                     cur.execute(sql)
                     conn.commit()
-                print("Procedure 'issue_book' created successfully!")
+                print("Procedure 'issue_book' and function 'allocate_copy' created successfully!")
             except Exception as e:
+                conn.rollback()
                 print(f"Error creating procedure: {e}")
-            finally:
-                release_connection(conn)
 
-    def issue_book(self, copy_id, student_id):
-        sql = f"CALL issue_book({copy_id}, {student_id});"
-        conn = get_connection()
-        try:
-            with conn.cursor() as cur:
-                cur.execute(sql)
-                conn.commit()
-            #print(f"Book {copy_id} issued successfully to student {student_id}.")
-            return {"status": "success", "message": f"Book {copy_id} issued successfully to student {student_id}."}
-        except Exception as e:
-            print(f"Error issuing book: {e}")
-        finally:
-            release_connection(conn)
-            
-    
+    def issue_book(self, book_id, student_id):
+        sql = "CALL issue_book(%s::int, %s::int);"
+        with db_connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(sql, (book_id, student_id))
+                    conn.commit()
+                view_refresher.mark_dirty("issues")
+                return {"status": "success", "message": f"Book {book_id} issued successfully to student {student_id}."}
+            except Exception as e:
+                conn.rollback()
+                print(f"Error issuing book: {e}")
+                return {"status": "error", "message": str(e)}
+
+    def allocate_issue(self, book_id, student_id, issue_date=None):
+        # any available copy of book_id; safe to call concurrently for the same book
+        sql = "SELECT issue_id, copy_id FROM allocate_copy(%s, %s, %s);"
+        with db_connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(sql, (book_id, student_id, issue_date))
+                    issue_id, copy_id = cur.fetchone()
+                    conn.commit()
+                view_refresher.mark_dirty("issues")
+                return {
+                    "status": "success",
+                    "data": {"issue_id": issue_id, "copy_id": copy_id, "book_id": book_id, "student_id": student_id},
+                }
+            except psycopg2.errors.NoDataFound as e:
+                conn.rollback()
+                return {"status": "error", "reason": "unavailable", "message": str(e).strip()}
+            except Exception as e:
+                conn.rollback()
+                return {"status": "error", "message": str(e)}
+
     def create_procedure_insert_return(self):
         sql = """
         CREATE OR REPLACE PROCEDURE insert_return_and_update_book(
@@ -855,7 +1677,7 @@ class LibraryDatabaseManager:
 
            
             INSERT INTO returns (issue_id, return_date, fine_amount)
-            VALUES (v_issue_id, CURRENT_DATE, 0);
+            VALUES (v_issue_id, CURRENT_DATE, compute_fine(v_issue_id, CURRENT_DATE));
 
             
             UPDATE issues
@@ -867,44 +1689,152 @@ class LibraryDatabaseManager:
             SET status = 'available'
             WHERE copy_id = p_copy_id;
 
-            
-            UPDATE books
-            SET total_copies = total_copies + 1
-            WHERE book_id = v_book_id;
-
             RAISE NOTICE 'Book copy % (book_id %) returned successfully for student %', p_copy_id, v_book_id, p_student_id;
         END;
         $$;
         """
-        conn = get_connection()
-        try:
-            with conn.cursor() as cur:
-                cur.execute(sql)
-                conn.commit()
-            print("Stored procedure 'insert_return_and_update_book' created successfully!")
-        except Exception as e:
-            print(f"Error creating procedure: {e}")
-        finally:
-            conn.close()
+        with db_connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(sql)
+                    conn.commit()
+                print("Stored procedure 'insert_return_and_update_book' created successfully!")
+            except Exception as e:
+                print(f"Error creating procedure: {e}")
 
 
 
         
     def insert_return_and_update_book(self, copy_id, student_id):
-        sql = f"CALL insert_return_and_update_book({copy_id}, {student_id});"
-        conn = get_connection()
-        try:
-            with conn.cursor() as cur:
-                cur.execute(sql)
-                conn.commit()
-            #print(f"Book copy {copy_id} returned successfully by student {student_id}.")
-            return {"status": "success", "message": f"Book copy {copy_id} returned successfully by student {student_id}."}
-        except Exception as e:
-            print(f"Error returning book: {e}")
-        finally:
-            release_connection(conn)
+        sql = "CALL insert_return_and_update_book(%s, %s);"
+        with db_connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(sql, (copy_id, student_id))
+                    conn.commit()
+                #print(f"Book copy {copy_id} returned successfully by student {student_id}.")
+                view_refresher.mark_dirty("returns")
+                return {"status": "success", "message": f"Book copy {copy_id} returned successfully by student {student_id}."}
+            except Exception as e:
+                print(f"Error returning book: {e}")
+
+
+
+
+    # Batch checkout / return: one call per sub-batch, one exception block per pair
+
+    def create_batch_procedures(self):
+        sql = """
+        CREATE OR REPLACE FUNCTION issue_books_batch(p_student_ids INT[], p_copy_ids INT[], p_issue_date DATE DEFAULT CURRENT_DATE)
+        RETURNS TABLE (item INT, student_id INT, copy_id INT, issue_id INT, error TEXT)
+        LANGUAGE plpgsql
+        AS $$
+        DECLARE
+            v_issue_id INT;
+        BEGIN
+            FOR i IN 1 .. COALESCE(array_length(p_copy_ids, 1), 0) LOOP
+                BEGIN
+                    -- same checks as issue_book(student, copy, date)
+                    UPDATE book_copies bc SET status = 'issue'
+                    WHERE bc.copy_id = p_copy_ids[i] AND bc.status = 'available';
+                    IF NOT FOUND THEN
+                        RAISE EXCEPTION 'Copy % is not available', p_copy_ids[i];
+                    END IF;
+                    INSERT INTO issues AS iss (student_id, copy_id, issue_date, returned)
+                    VALUES (p_student_ids[i], p_copy_ids[i], COALESCE(p_issue_date, CURRENT_DATE), 'no')
+                    RETURNING iss.issue_id INTO v_issue_id;
+                    RETURN QUERY SELECT i, p_student_ids[i], p_copy_ids[i], v_issue_id, NULL::TEXT;
+                EXCEPTION WHEN OTHERS THEN
+                    RETURN QUERY SELECT i, p_student_ids[i], p_copy_ids[i], NULL::INT, SQLERRM;
+                END;
+            END LOOP;
+        END;
+        $$;
+
+        CREATE OR REPLACE FUNCTION return_books_batch(p_student_ids INT[], p_copy_ids INT[])
+        RETURNS TABLE (item INT, student_id INT, copy_id INT, issue_id INT, error TEXT)
+        LANGUAGE plpgsql
+        AS $$
+        DECLARE
+            v_book_id INT;
+            v_issue_id INT;
+        BEGIN
+            FOR i IN 1 .. COALESCE(array_length(p_copy_ids, 1), 0) LOOP
+                BEGIN
+                    -- same steps as insert_return_and_update_book
+                    SELECT bc.book_id INTO v_book_id FROM book_copies bc WHERE bc.copy_id = p_copy_ids[i];
+                    IF v_book_id IS NULL THEN
+                        RAISE EXCEPTION 'Invalid copy_id: % (no such book copy)', p_copy_ids[i];
+                    END IF;
+
+                    SELECT iss.issue_id INTO v_issue_id
+                    FROM issues iss
+                    WHERE iss.student_id = p_student_ids[i] AND iss.copy_id = p_copy_ids[i] AND iss.returned = 'no'
+                    LIMIT 1
+                    FOR UPDATE;
+                    IF v_issue_id IS NULL THEN
+                        RAISE EXCEPTION 'No active issue found for Student ID: %, Copy ID: %', p_student_ids[i], p_copy_ids[i];
+                    END IF;
+
+                    INSERT INTO returns (issue_id, return_date, fine_amount)
+                    VALUES (v_issue_id, CURRENT_DATE, compute_fine(v_issue_id, CURRENT_DATE));
+                    UPDATE issues iss SET returned = 'yes' WHERE iss.issue_id = v_issue_id;
+                    UPDATE book_copies bc SET status = 'available' WHERE bc.copy_id = p_copy_ids[i];
+                    RETURN QUERY SELECT i, p_student_ids[i], p_copy_ids[i], v_issue_id, NULL::TEXT;
+                EXCEPTION WHEN OTHERS THEN
+                    RETURN QUERY SELECT i, p_student_ids[i], p_copy_ids[i], NULL::INT, SQLERRM;
+                END;
+            END LOOP;
+        END;
+        $$;
+        """
+        with db_connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(sql)
+                    conn.commit()
+                print("Batch issue/return functions created successfully!")
+            except Exception as e:
+                conn.rollback()
+                print(f"Error creating batch functions: {e}")
 
+    def _run_batch(self, sql, items, extra_params, atomic):
+        try:
+            validate_batch(items)
+        except ValueError as e:
+            return {"status": "error", "reason": "invalid", "message": str(e), "data": batch_summary([], 0, atomic)}
+        results = []
+        transactions = 0
+        with db_connection() as conn:
+            try:
+                for offset, chunk in sub_batches(items, atomic):
+                    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                        cur.execute(sql, (*batch_arrays(chunk), *extra_params))
+                        results.extend(item_results(cur.fetchall(), offset))
+                    if atomic and any(r["status"] != "ok" for r in results):
+                        conn.rollback()
+                        return {"status": "success", "data": batch_summary(results, transactions, atomic)}
+                    conn.commit()
+                    transactions += 1
+            except Exception as e:
+                conn.rollback()
+                return {"status": "error", "message": str(e), "data": batch_summary(results, transactions, atomic)}
+        return {"status": "success", "data": batch_summary(results, transactions, atomic)}
+
+    def batch_issue_books(self, items, issue_date=None, atomic=False):
+        # items: [(student_id, copy_id), ...]
+        result = self._run_batch(
+            "SELECT * FROM issue_books_batch(%s::int[], %s::int[], %s::date);", items, (issue_date,), atomic
+        )
+        if result["data"]["succeeded"]:
+            view_refresher.mark_dirty("issues")
+        return result
 
+    def batch_return_books(self, items, atomic=False):
+        result = self._run_batch("SELECT * FROM return_books_batch(%s::int[], %s::int[]);", items, (), atomic)
+        if result["data"]["succeeded"]:
+            view_refresher.mark_dirty("returns")
+        return result
 
 
     # PART 4: BACKUP AND RESTORE
@@ -914,16 +1844,14 @@ class LibraryDatabaseManager:
         CREATE TABLE IF NOT EXISTS books_backup AS
         TABLE books WITH NO DATA;
         """
-        conn = get_connection()
-        try:
-            with conn.cursor() as cur:
-                cur.execute(sql)
-                conn.commit()
-            print("Backup table 'books_backup' created successfully!")
-        except Exception as e:
-            print(f"Error creating backup table: {e}")
-        finally:
-            release_connection(conn)
+        with db_connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(sql)
+                    conn.commit()
+                print("Backup table 'books_backup' created successfully!")
+            except Exception as e:
+                print(f"Error creating backup table: {e}")
 
     def create_books_restore_procedure(self):
         sql = """
@@ -937,16 +1865,14 @@ class LibraryDatabaseManager:
         END;
         $$;
         """
-        conn = get_connection()
-        try:
-            with conn.cursor() as cur:
-                cur.execute(sql)
-                conn.commit()
-            print("Stored procedure 'restore_book' created successfully!")
-        except Exception as e:
-            print(f"Error creating stored procedure: {e}")
-        finally:
-            release_connection(conn)
+        with db_connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(sql)
+                    conn.commit()
+                print("Stored procedure 'restore_book' created successfully!")
+            except Exception as e:
+                print(f"Error creating stored procedure: {e}")
 
     def create_backup_audit_log_table(self):
         sql = """
@@ -958,72 +1884,109 @@ class LibraryDatabaseManager:
             timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         );
         """
-        conn = get_connection()
-        try:
-            with conn.cursor() as cur:
-                cur.execute(sql)
-                conn.commit()
-            print("Backup audit log table 'backup_audit_log' created successfully!")
-        except Exception as e:
-            print(f"Error creating backup audit log table: {e}")
-        finally:
-            release_connection(conn)
+        with db_connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(sql)
+                    conn.commit()
+                print("Backup audit log table 'backup_audit_log' created successfully!")
+            except Exception as e:
+                print(f"Error creating backup audit log table: {e}")
 
     def insert_backup_audit_log(self, action_type, table_name, record_id):
-        sql = f"""
+        sql = """
         INSERT INTO backup_audit_log(action_type, table_name, record_id)
-        VALUES ('{action_type}', '{table_name}', {record_id});
+        VALUES (%s, %s, %s);
         """
-        conn = get_connection()
-        try:
-            with conn.cursor() as cur:
-                cur.execute(sql)
-                conn.commit()
-            print("Backup audit log entry created successfully!")
-        except Exception as e:
-            print(f"Error creating backup audit log entry: {e}")
-        finally:
-            release_connection(conn)
+        with db_connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(sql, (action_type, table_name, record_id))
+                    conn.commit()
+                print("Backup audit log entry created successfully!")
+            except Exception as e:
+                print(f"Error creating backup audit log entry: {e}")
 
     def get_backup_audit_logs(self):
         sql = """SELECT * FROM backup_audit_log ORDER BY timestamp DESC;"""
-        conn = get_connection()
-        try:
-            with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute(sql)
-                result = cur.fetchall()
-                clean_rows = [dict(row) for row in result]
+        with db_connection() as conn:
+            try:
+                with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                    cur.execute(sql)
+                    result = cur.fetchall()
+                    clean_rows = [dict(row) for row in result]
+                    return {
+                        "status": "success",
+                        "data": clean_rows
+                    }
+            except Exception as e:
                 return {
-                    "status": "success",
-                    "data": clean_rows
+                    "status": "error",
+                    "message": str(e)
                 }
-        except Exception as e:
-            return {
-                "status": "error",
-                "message": str(e)
-            }
-        finally:
-            release_connection(conn)
 
     # PART 5: SEARCH AND VIEWS
     
     def execute_query(self, sql, params=None, fetch=False):
-        conn = get_connection()
-        try:
-            with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute(sql, params)
-                if fetch:
-                    result = cur.fetchall() 
-                    clean_rows = [dict(row) for row in result]
-                    return clean_rows
-                else:
+        with db_connection() as conn:
+            try:
+                with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                    cur.execute(sql, params)
+                    if fetch:
+                        result = cur.fetchall() 
+                        clean_rows = [dict(row) for row in result]
+                        return clean_rows
+                    else:
+                        conn.commit()
+                        return None
+            except Exception as e:
+                print(f"Database error: {e}")
+                return None
+
+    def get_relation_columns(self, relation):
+        """Column names of a table or materialized view, in order (information_schema omits views)."""
+        sql = """
+        SELECT attname FROM pg_attribute
+        WHERE attrelid = to_regclass(%s) AND attnum > 0 AND NOT attisdropped
+        ORDER BY attnum;
+        """
+        with db_connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(sql, (relation,))
+                    columns = [row[0] for row in cur.fetchall()]
+                return {"status": "success", "data": columns}
+            except Exception as e:
+                return {"status": "error", "message": str(e)}
+
+    def create_export_indexes(self):
+        # BRIN keeps one summary per block range; issues / returns are appended
+        # in date order, so a year's date_from / date_to export skips the rest
+        sql = """
+        CREATE INDEX IF NOT EXISTS idx_issues_issue_date_brin ON issues USING brin(issue_date);
+        CREATE INDEX IF NOT EXISTS idx_returns_return_date_brin ON returns USING brin(return_date);
+        """
+        with db_connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(sql)
                     conn.commit()
-                    return None
-        except Exception as e:
-            print(f"Database error: {e}")
-            return None
-        finally:
-            release_connection(conn)
+                print("Export date indexes created successfully!")
+            except Exception as e:
+                conn.rollback()
+                print(f"Error creating export date indexes: {e}")
+
+    def stream_query(self, sql, params=None, batch_size=EXPORT_BATCH_SIZE):
+        """Yield rows in batches from a named (server-side) cursor; memory stays at one batch."""
+        with db_connection() as conn:
+            with conn.cursor(name=f"stream_{uuid.uuid4().hex}", cursor_factory=RealDictCursor) as cur:
+                cur.itersize = batch_size
+                cur.execute(sql, params)
+                while True:
+                    rows = cur.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    yield [dict(row) for row in rows]
 
     def view_all_books(self):
         sql = """
@@ -1033,10 +1996,13 @@ class LibraryDatabaseManager:
             a.name AS author_name,
             c.name AS category_name,
             b.isbn,
-            b.total_copies
+            COALESCE(av.total_copies, 0) AS total_copies,
+            COALESCE(av.available_copies, 0) AS available_copies,
+            COALESCE(av.issued_copies, 0) AS issued_copies
         FROM books b
         JOIN author a ON b.author = a.author_id
         JOIN categories c ON b.category = c.category_id
+        LEFT JOIN book_availability av ON av.book_id = b.book_id
         ORDER BY b.title;
         """
         try:
@@ -1104,11 +2070,113 @@ class LibraryDatabaseManager:
             }
         
 
-    def search_books_by_title(self, title):
-        
-        sql = f"""SELECT * FROM books WHERE LOWER(title) LIKE LOWER('%{title}%');"""
+    # Keyset pagination: each page seeks from the previous page's last key via
+    # an index, so page N costs the same as page 1.
+
+    def create_pagination_indexes(self):
+        sql = """
+        CREATE INDEX IF NOT EXISTS idx_books_title_book_id ON books(title, book_id);
+        CREATE INDEX IF NOT EXISTS idx_issues_issue_date_issue_id ON issues(issue_date DESC, issue_id DESC);
+        CREATE INDEX IF NOT EXISTS idx_returns_return_date_return_id ON returns(return_date DESC, return_id DESC);
+        """
+        with db_connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(sql)
+                    conn.commit()
+                print("Pagination indexes created successfully!")
+            except Exception as e:
+                conn.rollback()
+                print(f"Error creating pagination indexes: {e}")
+
+    def _keyset_page(self, spec, select_sql, limit, cursor, conditions=(), params=()):
+        # ``conditions`` are extra WHERE terms (with %s placeholders) for ``params``
+        limit = clamp_page_size(limit)
+        conditions = list(conditions)
+        params = list(params)
+        if cursor:
+            try:
+                params.extend(decode_cursor(spec, cursor))
+            except ValueError as e:
+                return {"status": "error", "reason": "invalid", "message": str(e)}
+            conditions.append(spec.where(["%s"] * len(spec.keys)))
+        where = "WHERE " + " AND ".join(conditions) if conditions else ""
+        sql = f"{select_sql} {where} ORDER BY {spec.order_by} LIMIT %s;"
+        params.append(limit + 1)
+        with db_connection() as conn:
+            try:
+                with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                    cur.execute(sql, params)
+                    rows = [dict(row) for row in cur.fetchall()]
+                return build_page(spec, rows, limit)
+            except Exception as e:
+                return {"status": "error", "message": str(e)}
+
+    def view_books_page(self, limit=None, cursor=None):
+        sql = """
+        SELECT
+            b.book_id,
+            b.title,
+            a.name AS author_name,
+            c.name AS category_name,
+            b.isbn,
+            COALESCE(av.total_copies, 0) AS total_copies,
+            COALESCE(av.available_copies, 0) AS available_copies,
+            COALESCE(av.issued_copies, 0) AS issued_copies
+        FROM books b
+        JOIN author a ON b.author = a.author_id
+        JOIN categories c ON b.category = c.category_id
+        LEFT JOIN book_availability av ON av.book_id = b.book_id
+        """
+        return self._keyset_page(BOOKS_KEYSET, sql, limit, cursor)
+
+    def view_issues_page(self, limit=None, cursor=None):
+        return self._keyset_page(ISSUES_KEYSET, "SELECT * FROM issues", limit, cursor)
+
+    def view_returns_page(self, limit=None, cursor=None):
+        return self._keyset_page(RETURNS_KEYSET, "SELECT * FROM returns", limit, cursor)
+
+
+    # Per-student history straight from issues: idx_issues_student_date seeks to
+    # the student and walks their loans newest first, so a page costs
+    # O(page size) whatever the total circulation (mv_user_borrowing_history
+    # stays for exports and reports).
+
+    def create_borrowing_history_indexes(self):
+        sql = """
+        CREATE INDEX IF NOT EXISTS idx_issues_student_date ON issues(student_id, issue_date DESC, issue_id DESC);
+        CREATE INDEX IF NOT EXISTS idx_returns_issue_id ON returns(issue_id);
+        """
+        with db_connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(sql)
+                    conn.commit()
+                print("Borrowing history indexes created successfully!")
+            except Exception as e:
+                conn.rollback()
+                print(f"Error creating borrowing history indexes: {e}")
+
+    def get_student_history(self, student_id, limit=None, cursor=None, date_from=None, date_to=None):
+        """One page of a student's loans, newest first, optionally limited to issue dates in [date_from, date_to]."""
+        if date_from and date_to and date_from > date_to:
+            return {"status": "error", "message": "date_from must not be after date_to"}
+        conditions, params = ["i.student_id = %s"], [student_id]
+        if date_from:
+            conditions.append("i.issue_date >= %s")
+            params.append(date_from)
+        if date_to:
+            conditions.append("i.issue_date <= %s")
+            params.append(date_to)
+        return self._keyset_page(HISTORY_KEYSET, STUDENT_HISTORY_SQL, limit, cursor, conditions, params)
+
+
+    # Substring searches use LOWER(col) LIKE, backed by the trigram indexes from
+    # create_book_search_index() instead of sequential scans.
+
+    def _search_books_like(self, sql, term, empty_message):
         try:
-            rows = self.execute_query(sql, fetch=True)
+            rows = self.execute_query(sql, (term,), fetch=True)
             if rows:
                 return {
                     "status": "success",
@@ -1118,7 +2186,7 @@ class LibraryDatabaseManager:
                 return {
                     "status": "success",
                     "data": [],
-                    "message": "No books found with that title"
+                    "message": empty_message
                 }
         except Exception as e:
             return {
@@ -1126,55 +2194,171 @@ class LibraryDatabaseManager:
                 "message": str(e)
             }
 
+    def search_books_by_title(self, title):
+        sql = """SELECT * FROM books WHERE LOWER(title) LIKE '%%' || LOWER(%s) || '%%';"""
+        return self._search_books_like(sql, title, "No books found with that title")
+
     def search_books_by_author(self, author_name):
-        sql = f"""
+        sql = """
         SELECT b.* FROM books b
         JOIN author a ON b.author = a.author_id
-        WHERE LOWER(a.name) LIKE LOWER('%{author_name}%');
+        WHERE LOWER(a.name) LIKE '%%' || LOWER(%s) || '%%';
         """
-        try:
-            rows = self.execute_query(sql, fetch=True)
-            if rows:
-                return {
-                    "status": "success",
-                    "data": rows
-                }
-            else:
-                return {
-                    "status": "success",
-                    "data": [],
-                    "message": "No books found by that author"
-                }
-        except Exception as e:
-            return {
-                "status": "error",
-                "message": str(e)
-            }
+        return self._search_books_like(sql, author_name, "No books found by that author")
 
     def search_books_by_category(self, category_name):
-        sql = f"""
+        sql = """
         SELECT b.* FROM books b
         JOIN categories c ON b.category = c.category_id
-        WHERE LOWER(c.name) LIKE LOWER('%{category_name}%');
+        WHERE LOWER(c.name) LIKE '%%' || LOWER(%s) || '%%';
         """
-        try:
-            rows = self.execute_query(sql, fetch=True)
-            if rows:
-                return {
-                    "status": "success",
-                    "data": rows
-                }
-            else:
+        return self._search_books_like(sql, category_name, "No books found in that category")
+
+    def create_book_search_index(self):
+        sql = """
+        CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+        CREATE TABLE IF NOT EXISTS book_search (
+            book_id INT PRIMARY KEY REFERENCES books(book_id) ON DELETE CASCADE,
+            document TSVECTOR NOT NULL,
+            search_text TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_book_search_document ON book_search USING GIN (document);
+        CREATE INDEX IF NOT EXISTS idx_book_search_text_trgm ON book_search USING GIN (search_text gin_trgm_ops);
+
+        -- trigram indexes for the LIKE '%term%' searches
+        CREATE INDEX IF NOT EXISTS idx_books_title_trgm ON books USING GIN (LOWER(title) gin_trgm_ops);
+        CREATE INDEX IF NOT EXISTS idx_author_name_trgm ON author USING GIN (LOWER(name) gin_trgm_ops);
+        CREATE INDEX IF NOT EXISTS idx_categories_name_trgm ON categories USING GIN (LOWER(name) gin_trgm_ops);
+
+        CREATE OR REPLACE FUNCTION refresh_book_search(p_book_ids INT[])
+        RETURNS VOID AS $$
+        BEGIN
+            INSERT INTO book_search (book_id, document, search_text)
+            SELECT
+                b.book_id,
+                setweight(to_tsvector('simple', COALESCE(b.title, '')), 'A') ||
+                setweight(to_tsvector('simple', COALESCE(REPLACE(b.isbn, '-', ''), '')), 'A') ||
+                setweight(to_tsvector('simple', COALESCE(a.name, '')), 'B') ||
+                setweight(to_tsvector('simple', COALESCE(c.name, '')), 'C'),
+                LOWER(CONCAT_WS(' ', b.title, a.name, c.name, REPLACE(b.isbn, '-', '')))
+            FROM books b
+            LEFT JOIN author a ON a.author_id = b.author
+            LEFT JOIN categories c ON c.category_id = b.category
+            WHERE b.book_id = ANY(p_book_ids)
+            ON CONFLICT (book_id) DO UPDATE
+            SET document = EXCLUDED.document,
+                search_text = EXCLUDED.search_text;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE OR REPLACE FUNCTION book_search_on_book_change()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            PERFORM refresh_book_search(ARRAY[NEW.book_id]);
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE OR REPLACE FUNCTION book_search_on_author_change()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            PERFORM refresh_book_search(ARRAY(SELECT book_id FROM books WHERE author = NEW.author_id));
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE OR REPLACE FUNCTION book_search_on_category_change()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            PERFORM refresh_book_search(ARRAY(SELECT book_id FROM books WHERE category = NEW.category_id));
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS trg_book_search_books ON books;
+        CREATE TRIGGER trg_book_search_books
+        AFTER INSERT OR UPDATE OF title, author, category, isbn ON books
+        FOR EACH ROW
+        EXECUTE FUNCTION book_search_on_book_change();
+
+        DROP TRIGGER IF EXISTS trg_book_search_author ON author;
+        CREATE TRIGGER trg_book_search_author
+        AFTER UPDATE OF name ON author
+        FOR EACH ROW
+        EXECUTE FUNCTION book_search_on_author_change();
+
+        DROP TRIGGER IF EXISTS trg_book_search_categories ON categories;
+        CREATE TRIGGER trg_book_search_categories
+        AFTER UPDATE OF name ON categories
+        FOR EACH ROW
+        EXECUTE FUNCTION book_search_on_category_change();
+
+        -- index the books that existed before the triggers
+        SELECT refresh_book_search(ARRAY(
+            SELECT b.book_id FROM books b
+            WHERE NOT EXISTS (SELECT 1 FROM book_search s WHERE s.book_id = b.book_id)
+        ));
+        """
+        with db_connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(sql)
+                    conn.commit()
+                print("Book search index created successfully!")
+            except Exception as e:
+                conn.rollback()
+                print(f"Error creating book search index: {e}")
+
+    def search_books(self, term, limit=None, offset=0):
+        """Ranked search over title, author, category and ISBN.
+
+        Every word matches as a prefix through the tsvector index; queries with
+        typos still match through trigram word similarity on the same rows.
+        """
+        tsquery = to_prefix_tsquery(term)
+        if not tsquery:
+            return {"status": "success", "data": [], "message": "Empty search term"}
+        limit = clamp_page_size(limit)
+        offset = max(0, min(int(offset), SEARCH_MAX_OFFSET))
+        raw = " ".join(search_terms(term))
+        sql = """
+        SELECT
+            b.book_id,
+            b.title,
+            a.name AS author_name,
+            c.name AS category_name,
+            b.isbn,
+            COALESCE(av.total_copies, 0) AS total_copies,
+            COALESCE(av.available_copies, 0) AS available_copies,
+            COALESCE(av.issued_copies, 0) AS issued_copies,
+            ts_rank(s.document, to_tsquery('simple', %(tsquery)s))
+                + word_similarity(%(raw)s, s.search_text) AS rank
+        FROM book_search s
+        JOIN books b ON b.book_id = s.book_id
+        LEFT JOIN author a ON b.author = a.author_id
+        LEFT JOIN categories c ON b.category = c.category_id
+        LEFT JOIN book_availability av ON av.book_id = b.book_id
+        WHERE s.document @@ to_tsquery('simple', %(tsquery)s)
+           OR %(raw)s <%% s.search_text
+        ORDER BY rank DESC, b.book_id
+        LIMIT %(limit)s OFFSET %(offset)s;
+        """
+        params = {"tsquery": tsquery, "raw": raw, "limit": limit + 1, "offset": offset}
+        with db_connection() as conn:
+            try:
+                with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                    cur.execute(sql, params)
+                    rows = [dict(row) for row in cur.fetchall()]
                 return {
                     "status": "success",
-                    "data": [],
-                    "message": "No books found in that category"
+                    "data": rows[:limit],
+                    "limit": limit,
+                    "offset": offset,
+                    "next_offset": offset + limit if len(rows) > limit else None,
                 }
-        except Exception as e:  
-            return {
-                "status": "error",
-                "message": str(e)
-            }
+            except Exception as e:
+                return {"status": "error", "message": str(e)}
 
 
 # if __name__ == "__main__":
@@ -0,0 +1,178 @@
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from loguru import logger
+
+
+MV_REFRESH_INTERVAL = float(os.getenv("MV_REFRESH_INTERVAL", "300"))
+MV_REFRESH_MIN_INTERVAL = float(os.getenv("MV_REFRESH_MIN_INTERVAL", "5"))
+MV_REFRESH_TICK = float(os.getenv("MV_REFRESH_TICK", "1"))
+
+MATERIALIZED_VIEWS = (
+    "mv_popular_books",
+    "mv_overdue_transactions",
+    "mv_all_books_summary",
+    "mv_user_borrowing_history",
+    "mv_issued_report",
+)
+
+# which views read from which base table; a write to the table marks them dirty
+TABLE_DEPENDENCIES = {
+    "books": MATERIALIZED_VIEWS,
+    "issues": ("mv_popular_books", "mv_user_borrowing_history", "mv_issued_report"),
+    "returns": ("mv_overdue_transactions", "mv_user_borrowing_history", "mv_issued_report"),
+    # the nightly accrual moves the accruing figures the issued report shows
+    "student_fine_balances": ("mv_issued_report",),
+}
+
+
+def _interval_for(view_name):
+    # per-view override, e.g. MV_REFRESH_INTERVAL_MV_POPULAR_BOOKS=60
+    return float(os.getenv(f"MV_REFRESH_INTERVAL_{view_name.upper()}", MV_REFRESH_INTERVAL))
+
+
+class MaterializedViewRefresher:
+    """Refreshes the mv_* views in a background thread so reads never recompute them.
+
+    A view is refreshed when it has been marked dirty by a write (at most once
+    every ``min_interval`` seconds) or when its ``interval`` has elapsed,
+    whichever comes first. ``freshness()`` reports how stale each view is so
+    read endpoints can pass it on to clients.
+    """
+
+    def __init__(self, views=MATERIALIZED_VIEWS, min_interval=MV_REFRESH_MIN_INTERVAL, tick=MV_REFRESH_TICK):
+        self.min_interval = min_interval
+        self.tick = tick
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._refresh = None
+        self._listeners = []
+        self._state = {
+            view: {
+                "interval": _interval_for(view),
+                "last_refreshed": None,
+                "last_attempt": None,
+                "last_duration_ms": None,
+                "last_error": None,
+                "dirty": True,
+                "concurrent": True,
+            }
+            for view in views
+        }
+
+    def add_listener(self, callback):
+        """``callback(names)`` runs with the base tables on every write and with the view after each refresh."""
+        self._listeners.append(callback)
+
+    def _notify(self, names):
+        for callback in self._listeners:
+            try:
+                callback(names)
+            except Exception as e:
+                logger.error(f"Refresh listener failed for {names}: {e}")
+
+    def mark_dirty(self, *tables):
+        with self._lock:
+            for table in tables:
+                for view in TABLE_DEPENDENCIES.get(table, ()):
+                    if view in self._state:
+                        self._state[view]["dirty"] = True
+        self._notify(tables)
+
+    def freshness(self, view_name):
+        with self._lock:
+            state = dict(self._state[view_name])
+        last = state["last_refreshed"]
+        return {
+            "view": view_name,
+            "last_refreshed": datetime.fromtimestamp(last, timezone.utc).isoformat() if last else None,
+            "age_seconds": round(time.time() - last, 3) if last else None,
+            "dirty": state["dirty"],
+            "refresh_interval": state["interval"],
+            "last_error": state["last_error"],
+        }
+
+    def status(self):
+        return [self.freshness(view) for view in self._state]
+
+    def _due_views(self, now):
+        due = []
+        with self._lock:
+            for view, state in self._state.items():
+                last = state["last_refreshed"]
+                attempt = state["last_attempt"]
+                if attempt is not None and now - attempt < self.min_interval:
+                    continue
+                if last is None:
+                    due.append(view)
+                elif state["dirty"]:
+                    due.append(view)
+                elif now - last >= state["interval"]:
+                    due.append(view)
+        return due
+
+    def run_pending(self, refresh=None):
+        """Refresh every view that is due; returns the names refreshed."""
+        refresh = refresh or self._refresh
+        refreshed = []
+        for view in self._due_views(time.time()):
+            with self._lock:
+                # clear before refreshing so writes landing mid-refresh re-dirty the view
+                self._state[view]["dirty"] = False
+                self._state[view]["last_attempt"] = time.time()
+                concurrent = self._state[view]["concurrent"]
+            started = time.perf_counter()
+            try:
+                result = refresh(view, concurrently=concurrent)
+                if concurrent and result["status"] == "error" and "concurrently" in result["message"].lower():
+                    # views without a unique index cannot be refreshed concurrently;
+                    # remember it so later cycles go straight to the plain refresh
+                    with self._lock:
+                        self._state[view]["concurrent"] = False
+                    logger.info(f"{view} has no unique index; refreshing it without CONCURRENTLY from now on.")
+                    result = refresh(view, concurrently=False)
+            except Exception as e:
+                result = {"status": "error", "message": str(e)}
+            with self._lock:
+                state = self._state[view]
+                if result["status"] == "success":
+                    state["last_refreshed"] = time.time()
+                    state["last_duration_ms"] = round((time.perf_counter() - started) * 1000, 3)
+                    state["last_error"] = None
+                    refreshed.append(view)
+                else:
+                    state["dirty"] = True
+                    state["last_error"] = result["message"]
+            if result["status"] == "success":
+                self._notify((view,))
+        return refreshed
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.run_pending()
+            except Exception as e:
+                logger.error(f"Materialized view refresh failed: {e}")
+            self._stop.wait(self.tick)
+
+    def start(self, refresh):
+        """Start the background thread; ``refresh(view_name, concurrently=True)`` does the work."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._refresh = refresh
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="mv-refresher", daemon=True)
+        self._thread.start()
+        logger.info("Materialized view refresher started.")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.tick * 5)
+            self._thread = None
+            logger.info("Materialized view refresher stopped.")
+
+
+view_refresher = MaterializedViewRefresher()
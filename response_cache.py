@@ -0,0 +1,147 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from urllib.parse import urlencode
+
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import Response
+
+from refresh_scheduler import view_refresher
+
+
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "60"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1024"))
+
+# GET route -> names whose change invalidates it. Live-table routes depend on
+# base tables (invalidated by the write itself); mv_* routes depend on the view
+# (invalidated when view_refresher has actually refreshed it).
+CACHED_ROUTES = {
+    "/popular-books/": ("books", "book_popularity"),
+    "/overdue-transactions/": ("mv_overdue_transactions",),
+    # available / issued copies come from book_availability, which moves when
+    # counter_deltas folds in the deltas of issues and returns
+    "/all-books/": ("books", "book_availability"),
+    "/issue-report/": ("mv_issued_report",),
+}
+
+
+class CachedResponse:
+    __slots__ = ("body", "etag", "media_type", "expires_at", "tags")
+
+    def __init__(self, body, media_type, ttl, tags):
+        self.body = body
+        self.etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+        self.media_type = media_type
+        self.expires_at = time.monotonic() + ttl
+        self.tags = tags
+
+
+class ResponseCache:
+    """Serialized GET responses keyed by route + query string, invalidated by tag.
+
+    Every tag carries a generation number; a response computed while one of
+    its tags was invalidated is served but not stored, so a write racing a
+    read can never leave stale data in the cache.
+    """
+
+    def __init__(self, ttl=RESPONSE_CACHE_TTL, max_entries=RESPONSE_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._generations = defaultdict(int)
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.invalidations = 0
+
+    def generation(self, tags):
+        with self._lock:
+            return tuple(self._generations[tag] for tag in tags)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.expires_at < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, tags, generation, body, media_type):
+        entry = CachedResponse(body, media_type, self.ttl, tags)
+        with self._lock:
+            if tuple(self._generations[tag] for tag in tags) == generation:
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return entry
+
+    def invalidate(self, names):
+        with self._lock:
+            names = set(names)
+            for name in names:
+                self._generations[name] += 1
+            stale = [key for key, entry in self._entries.items() if names.intersection(entry.tags)]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+
+    def record_not_modified(self):
+        with self._lock:
+            self.not_modified += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "not_modified": self.not_modified,
+                "invalidations": self.invalidations,
+            }
+
+
+def _etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+response_cache = ResponseCache()
+view_refresher.add_listener(response_cache.invalidate)
+
+
+class ResponseCacheMiddleware(BaseHTTPMiddleware):
+    """Serves CACHED_ROUTES from response_cache, answering If-None-Match with 304."""
+
+    async def dispatch(self, request, call_next):
+        tags = CACHED_ROUTES.get(request.url.path)
+        if request.method != "GET" or tags is None:
+            return await call_next(request)
+
+        key = request.url.path + "?" + urlencode(sorted(request.query_params.multi_items()))
+        entry = response_cache.get(key)
+        if entry is None:
+            generation = response_cache.generation(tags)
+            response = await call_next(request)
+            if response.status_code != 200:
+                return response
+            body = b"".join([chunk async for chunk in response.body_iterator])
+            media_type = response.headers.get("content-type", "application/json")
+            entry = response_cache.put(key, tags, generation, body, media_type)
+
+        headers = {"ETag": entry.etag, "Cache-Control": "no-cache"}
+        if _etag_matches(request.headers.get("if-none-match"), entry.etag):
+            response_cache.record_not_modified()
+            return Response(status_code=304, headers=headers)
+        return Response(content=entry.body, media_type=entry.media_type, headers=headers)
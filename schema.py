@@ -0,0 +1,270 @@
+"""Versioned, idempotent schema bootstrap for views, triggers and procedures.
+
+Every migration is a list of LibraryDatabaseManager ``create_*`` steps plus the
+objects they must leave behind. bootstrap_schema() runs the pending ones in
+order under an advisory lock (so several app workers starting together do
+not race), verifies the objects exist and records the version in
+schema_migrations. Once the schema is current a startup costs one SELECT;
+request handlers never run DDL.
+
+Base tables (books, author, categories, book_copies, issues, returns,
+student) are expected to exist already.
+
+CLI:
+    python schema.py             # apply pending migrations
+    python schema.py --status    # show applied / pending versions
+"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+import time
+
+from loguru import logger
+
+from connection import db_connection
+
+
+SCHEMA_BOOTSTRAP_ON_STARTUP = os.getenv("SCHEMA_BOOTSTRAP_ON_STARTUP", "1") == "1"
+SCHEMA_LOCK_ID = 7_315_001
+
+# (version, description, manager steps, objects that must exist afterwards)
+SCHEMA_MIGRATIONS = [
+    (1, "materialized views", (
+        "create_materialized_view_popular_books",
+        "create_materialized_view_overdue_transactions",
+        "create_materialized_view_all_books_summary",
+        "create_materialized_view_user_borrowing_history",
+    ), (
+        "mv_popular_books", "mv_overdue_transactions", "mv_all_books_summary",
+        "mv_user_borrowing_history",
+        "idx_mv_popular_books_book_id", "idx_mv_all_books_summary_book_id",
+    )),
+    (2, "book and issue triggers", (
+        "create_after_book_issue_trigger",
+        "create_after_book_return_trigger",
+        "create_books_audit_log_trigger",
+        "create_new_book_trigger",
+        "create_book_delete_trigger",
+    ), (
+        "trg_after_issue", "trg_after_return", "trg_books_audit", "after_book_insert", "after_book_delete",
+        "books_audit_log",
+    )),
+    (3, "stored procedures", (
+        "create_stored_procedure_insert_book",
+        "create_stored_procedure_delete_book",
+        "create_stored_procedure_issue_book",
+        "create_stored_procedure_return_book",
+        "create_issue_procedure",
+        "create_procedure_insert_return",
+    ), (
+        "insert_book", "delete_book", "issue_book", "return_book", "insert_return_and_update_book",
+    )),
+    (4, "backup tables", (
+        "create_books_backup_table",
+        "create_books_restore_procedure",
+        "create_backup_audit_log_table",
+    ), (
+        "books_backup", "restore_book", "backup_audit_log",
+    )),
+    (5, "book popularity counters", (
+        "create_book_popularity_counters",
+        "backfill_book_popularity",
+    ), (
+        "book_popularity", "book_popularity_daily", "book_popularity_deltas", "trg_book_popularity",
+        "apply_popularity_deltas",
+    )),
+    (6, "keyset pagination indexes", (
+        "create_pagination_indexes",
+    ), (
+        "idx_books_title_book_id", "idx_issues_issue_date_issue_id", "idx_returns_return_date_return_id",
+    )),
+    (7, "book search index", (
+        "create_book_search_index",
+    ), (
+        "book_search", "refresh_book_search", "trg_book_search_books",
+        "trg_book_search_author", "trg_book_search_categories",
+    )),
+    (8, "SKIP LOCKED issue allocation", (
+        "create_stored_procedure_issue_book",
+        "create_issue_procedure",
+    ), (
+        "allocate_copy", "idx_book_copies_available",
+    )),
+    (9, "batch checkout and return", (
+        "create_batch_procedures",
+    ), (
+        "issue_books_batch", "return_books_batch",
+    )),
+    (10, "per-student history indexes", (
+        "create_borrowing_history_indexes",
+    ), (
+        "idx_issues_student_date", "idx_returns_issue_id",
+    )),
+    (11, "live overdue tracking", (
+        "create_overdue_tracking",
+        "backfill_due_dates",
+    ), (
+        "loan_policies", "loan_days_for_copy", "trg_issue_due_date", "idx_issues_open_due",
+    )),
+    (12, "fine engine", (
+        "create_fine_engine",
+        "create_stored_procedure_return_book",
+        "create_procedure_insert_return",
+        "create_batch_procedures",
+        "rebuild_fine_balances",
+    ), (
+        "compute_fine", "fine_accruals", "student_fine_balances", "trg_returns_fine_balance",
+        "idx_student_fine_balances_balance",
+    )),
+    (13, "book availability counters", (
+        "create_availability_counters",
+        "create_issue_procedure",
+        "create_procedure_insert_return",
+        "create_batch_procedures",
+    ), (
+        "book_availability", "book_availability_deltas", "apply_availability_deltas",
+        "trg_book_copies_count_insert", "trg_book_copies_count_update", "trg_book_copies_count_delete",
+    )),
+    (14, "catalog snapshot change feed", ("create_catalog_change_feed",), (
+        "idx_book_availability_change_xid", "idx_books_audit_log_change_xid", "trg_book_availability_change_xid",
+        "trg_books_add_availability",
+    )),
+    (15, "export date-range indexes", ("create_export_indexes",), (
+        "idx_issues_issue_date_brin", "idx_returns_return_date_brin",
+    )),
+    # reads the fine engine's tables, so it is (re)built after them
+    (16, "issued report from fine balances", (
+        "drop_materialized_view_issued_report",
+        "create_materialized_view_issued_report",
+    ), (
+        "mv_issued_report", "idx_mv_issued_report_issue_id",
+    )),
+]
+
+SCHEMA_VERSION = SCHEMA_MIGRATIONS[-1][0]
+
+
+class SchemaBootstrapError(Exception):
+    pass
+
+
+def _ensure_migrations_table(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            duration_ms NUMERIC(12, 3)
+        );
+    """)
+
+
+def _applied_versions(cur):
+    cur.execute("SELECT version FROM schema_migrations;")
+    return {row[0] for row in cur.fetchall()}
+
+
+def _missing_objects(cur, names):
+    # the create_* steps report their own errors and carry on, so check the catalog
+    cur.execute("""
+        SELECT name FROM unnest(%s::text[]) AS name
+        WHERE to_regclass(name) IS NULL
+          AND NOT EXISTS (SELECT 1 FROM pg_proc WHERE proname = name)
+          AND NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = name AND NOT tgisinternal);
+    """, (list(names),))
+    return [row[0] for row in cur.fetchall()]
+
+
+def schema_status():
+    with db_connection() as conn:
+        with conn.cursor() as cur:
+            _ensure_migrations_table(cur)
+            cur.execute("SELECT version, description, applied_at, duration_ms FROM schema_migrations ORDER BY version;")
+            applied = [
+                {"version": v, "description": d, "applied_at": at.isoformat(), "duration_ms": float(ms or 0)}
+                for v, d, at, ms in cur.fetchall()
+            ]
+            conn.commit()
+    done = {m["version"] for m in applied}
+    return {
+        "target_version": SCHEMA_VERSION,
+        "applied": applied,
+        "pending": [{"version": v, "description": d} for v, d, _, _ in SCHEMA_MIGRATIONS if v not in done],
+    }
+
+
+def bootstrap_schema(db=None):
+    """Apply pending SCHEMA_MIGRATIONS; returns a status dict with per-version timings."""
+    if db is None:
+        from query import LibraryDatabaseManager
+        db = LibraryDatabaseManager()
+
+    started = time.perf_counter()
+    applied = []
+    with db_connection() as conn:
+        try:
+            with conn.cursor() as cur:
+                _ensure_migrations_table(cur)
+                conn.commit()
+                cur.execute("SELECT pg_advisory_lock(%s);", (SCHEMA_LOCK_ID,))
+                try:
+                    # read after taking the lock so a worker that waited sees what the winner applied
+                    done = _applied_versions(cur)
+                    conn.commit()
+                    for version, description, steps, objects in SCHEMA_MIGRATIONS:
+                        if version in done:
+                            continue
+                        step_started = time.perf_counter()
+                        for step in steps:
+                            result = getattr(db, step)()
+                            if isinstance(result, dict) and result.get("status") == "error":
+                                raise SchemaBootstrapError(f"{step}: {result['message']}")
+                        missing = _missing_objects(cur, objects)
+                        if missing:
+                            raise SchemaBootstrapError(
+                                f"migration {version} ({description}) did not create: {', '.join(missing)}"
+                            )
+                        duration_ms = round((time.perf_counter() - step_started) * 1000, 3)
+                        cur.execute(
+                            "INSERT INTO schema_migrations (version, description, duration_ms) VALUES (%s, %s, %s);",
+                            (version, description, duration_ms),
+                        )
+                        conn.commit()
+                        applied.append({"version": version, "description": description, "duration_ms": duration_ms})
+                        logger.info(f"Applied schema migration {version} ({description}) in {duration_ms} ms")
+                finally:
+                    conn.rollback()
+                    cur.execute("SELECT pg_advisory_unlock(%s);", (SCHEMA_LOCK_ID,))
+                    conn.commit()
+        except Exception as e:
+            conn.rollback()
+            return {"status": "error", "message": str(e), "applied": applied}
+
+    return {
+        "status": "success",
+        "version": SCHEMA_VERSION,
+        "applied": applied,
+        "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--status", action="store_true", help="show applied and pending migrations only")
+    args = parser.parse_args()
+
+    from query import LibraryDatabaseManager
+    with contextlib.redirect_stdout(sys.stderr):
+        # the create_* steps print progress; keep stdout for the JSON result
+        db = LibraryDatabaseManager()
+        result = schema_status() if args.status else bootstrap_schema(db)
+    json.dump(result, sys.stdout, indent=2, default=str)
+    sys.stdout.write("\n")
+    if result.get("status") == "error":
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,21 @@
+import os
+import re
+
+
+SEARCH_MAX_OFFSET = int(os.getenv("SEARCH_MAX_OFFSET", "1000"))
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def search_terms(term):
+    """Lower-cased word tokens of a user query; ISBN hyphens are dropped first."""
+    return _TOKEN.findall((term or "").replace("-", "").lower())
+
+
+def to_prefix_tsquery(term):
+    """'hobb tolk' -> 'hobb:* & tolk:*' so every word matches as a prefix.
+
+    Only \\w tokens survive, so the result is always a valid tsquery and user
+    input never reaches to_tsquery's operator syntax.
+    """
+    return " & ".join(f"{token}:*" for token in search_terms(term))
@@ -0,0 +1,47 @@
+"""JSON encoding for query results.
+
+Manager methods return rows with their driver types (date, datetime,
+Decimal) untouched; routes hand the result to ``json_response()``, which
+encodes it once, straight to bytes, with orjson (dates natively, Decimal as
+float through ``default``). Returning a Response skips FastAPI's
+``jsonable_encoder`` walk over every cell. Without orjson the standard
+library encoder produces the same JSON, only slower.
+"""
+import decimal
+import json
+from datetime import date, datetime
+
+from starlette.responses import Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(value):
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(obj):
+    """``obj`` as compact UTF-8 JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default)
+    return json.dumps(obj, default=_default, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+class JSONBytesResponse(Response):
+    """application/json response whose body is encoded by ``dumps`` (or passed through if already bytes)."""
+
+    media_type = "application/json"
+
+    def render(self, content):
+        return content if isinstance(content, bytes) else dumps(content)
+
+
+def json_response(result, status_code=200):
+    return JSONBytesResponse(result, status_code=status_code)